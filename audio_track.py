@@ -0,0 +1,61 @@
+import os
+import wave
+import subprocess
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from ffmpeg_encoder import ffmpeg_binary
+from tracing import span
+
+# The soundtrack of a video assembled once: every script line (TTS MP3 or draft WAV) is decoded a single
+# time to 16-bit mono PCM, padded or trimmed to the length of its segment and written back to back into
+# one WAV file. Both video backends read that file instead of decoding the lines again while encoding.
+AUDIO_SAMPLE_RATE = int(os.getenv("AUDIO_SAMPLE_RATE", "44100"))
+AUDIO_DECODE_WORKERS = int(os.getenv("AUDIO_DECODE_WORKERS", "4"))
+
+
+# Decode an audio file to a mono int16 array at the sample rate
+def decode_audio(path, sample_rate=AUDIO_SAMPLE_RATE):
+    command = [ffmpeg_binary(), "-loglevel", "error", "-i", path, "-f", "s16le", "-acodec", "pcm_s16le",
+               "-ac", "1", "-ar", str(sample_rate), "-"]
+    return np.frombuffer(subprocess.run(command, check=True, capture_output=True).stdout, dtype=np.int16)
+
+
+class MasterAudio:
+    def __init__(self, audio_files, sample_rate=AUDIO_SAMPLE_RATE, workers=AUDIO_DECODE_WORKERS):
+        self.sample_rate = sample_rate
+        with span("audio_decode", files=len(audio_files)):
+            with ThreadPoolExecutor(max_workers=max(1, min(workers, len(audio_files)))) as executor:
+                self.tracks = list(executor.map(lambda path: decode_audio(path, sample_rate), audio_files))
+
+    # Duration of every line in seconds, as decoded
+    @property
+    def durations(self):
+        return [len(track) / self.sample_rate for track in self.tracks]
+
+    # (start, end) of every line in the master track when line k lasts lengths[k] seconds
+    def boundaries(self, lengths=None):
+        spans, start = [], 0
+        for length in lengths or self.durations:
+            spans.append((start, start + length))
+            start += length
+        return spans
+
+    # Write the lines (all, or the indices in lines) back to back, line k padded with silence or trimmed to
+    # lengths[k] seconds; the start of every line is rounded to a whole sample so the total length doesn't
+    # drift from the video
+    def write(self, output_file, lengths=None, lines=None):
+        tracks = self.tracks if lines is None else [self.tracks[i] for i in lines]
+        ends = [round(end * self.sample_rate) for _, end in self.boundaries(lengths)]
+        pcm = np.zeros(ends[-1] if ends else 0, dtype=np.int16)
+        start = 0
+        for track, end in zip(tracks, ends):
+            count = min(len(track), end - start)
+            pcm[start:start + count] = track[:count]
+            start = end
+        with span("audio_master", seconds=len(pcm) / self.sample_rate):
+            with wave.open(output_file, "wb") as f:
+                f.setnchannels(1)
+                f.setsampwidth(2)
+                f.setframerate(self.sample_rate)
+                f.writeframes(pcm.tobytes())
+        return output_file
@@ -0,0 +1,192 @@
+import os
+import re
+import csv
+import sys
+import json
+import time
+import shutil
+import argparse
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Headless batch rendering of dealer videos from a CSV or JSONL job file, without Streamlit.
+#
+#   python batch_cli.py jobs.csv --out videos --jobs 3 --job-concurrency 4
+#
+# Each job has the fields dealer, vehicles (list, or comma separated), language (English/Hindi),
+# voice (name from frontend2.VOICES or a voice id) and captions (yes/no), plus an optional name.
+# CRM data, photos and cutouts of vehicles listed by several jobs are fetched and processed once.
+
+# Settings read at import time by the pipeline modules that size their pools per process
+CONCURRENCY_SETTINGS = ("DOWNLOAD_WORKERS", "TTS_CONCURRENCY", "REMBG_WORKERS", "VEHICLE_DATA_WORKERS",
+                        "RENDER_POOL_SIZE")
+TRUE_VALUES = ("1", "true", "yes", "y")
+
+
+def split_vehicles(value):
+    if isinstance(value, (list, tuple)):
+        return [str(vn).strip() for vn in value if str(vn).strip()]
+    return [vn.strip() for vn in re.split(r"[,;]", value or "") if vn.strip()]
+
+
+def normalize_job(raw, index):
+    dealer = (raw.get("dealer") or "").strip()
+    vehicles = split_vehicles(raw.get("vehicles"))
+    if not dealer or not vehicles:
+        raise ValueError(f"Job {index + 1} needs a dealer and at least one vehicle")
+    captions = raw.get("captions", True)
+    if not isinstance(captions, bool):
+        captions = str(captions).strip().lower() in TRUE_VALUES
+    name = raw.get("name") or f"{index + 1:03d}_{re.sub(r'[^A-Za-z0-9]+', '_', dealer).strip('_')}"
+    return {
+        "name": name,
+        "dealer": dealer,
+        "vehicles": vehicles,
+        "language": (raw.get("language") or "English").strip(),
+        "voice": (raw.get("voice") or "Vihan").strip(),
+        "captions": captions,
+    }
+
+
+# Jobs from a .csv (header row with the field names) or a .jsonl file (one object per line)
+def read_jobs(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith((".jsonl", ".json")):
+            raws = [json.loads(line) for line in f if line.strip()]
+        else:
+            raws = list(csv.DictReader(f))
+    return [normalize_job(raw, index) for index, raw in enumerate(raws)]
+
+
+# Fetch the CRM data and photos of every distinct vehicle of the batch once and segment them,
+# which fills the shared CRM disk cache and cutout cache; returns {vehicle number: image folder}
+def prepare_shared_assets(jobs, batch_dir):
+    import frontend2
+    from workspace import JobWorkspace
+    from vehicle_data import fetch_many, get_driveaway_data, get_video_images, get_banner_image
+
+    vehicle_numbers = list(dict.fromkeys(vn for job in jobs for vn in job["vehicles"]))
+    banner_vehicles = {job["vehicles"][0] for job in jobs}
+    print(f"Preparing {len(vehicle_numbers)} distinct vehicles for {len(jobs)} jobs")
+    vehicle_data = fetch_many(
+        lambda vn: (get_driveaway_data(vn), get_video_images(vn), get_banner_image(vn) if vn in banner_vehicles else None),
+        vehicle_numbers)
+
+    vehicle_links = [(vn, car_images['downloadLinks']) for vn, (_, car_images, _) in zip(vehicle_numbers, vehicle_data)
+                     if car_images and 'downloadLinks' in car_images]
+    shared = JobWorkspace(batch_dir, job_id="shared", keep=True)
+    folders = []
+    frontend2.download_all_images(vehicle_links, folders, shared)
+    frontend2.cutout_vehicle_images([folder for folder in folders if len(os.listdir(folder)) >= 8], shared)
+    return {vn: folder for (vn, _), folder in zip(vehicle_links, folders)}
+
+
+# Run one job in a pool process: script generation, then the video pipeline; returns its report entry
+def run_job(job, image_folders, batch_dir, output_dir):
+    import frontend2
+    from workspace import JobWorkspace
+    from vehicle_data import fetch_many, get_driveaway_data
+    from tracing import trace_job
+
+    report = {"name": job["name"], "dealer": job["dealer"], "vehicles": len(job["vehicles"]), "stages": {}}
+    start = time.perf_counter()
+    stage, stage_start = None, start
+
+    def progress(next_stage):
+        nonlocal stage, stage_start
+        now = time.perf_counter()
+        if stage is not None:
+            report["stages"][stage] = now - stage_start
+        stage, stage_start = next_stage, now
+
+    workspace = JobWorkspace(os.path.join(batch_dir, "jobs"), job_id=job["name"])
+    trace_id = f"batch-{time.strftime('%Y%m%d-%H%M%S')}-{job['name']}"
+    try:
+        with trace_job(trace_id):
+            progress("script")
+            car_infos = fetch_many(get_driveaway_data, job["vehicles"])
+            script = frontend2.generate_script(frontend2.build_script_prompt(job["dealer"], job["language"], car_infos))
+            params = {
+                "vehicle_numbers": job["vehicles"],
+                "script": script,
+                "voice_id": frontend2.VOICES.get(job["voice"], job["voice"]),
+                "captions": job["captions"],
+                "image_folders": {vn: image_folders[vn] for vn in job["vehicles"] if vn in image_folders},
+            }
+            video = frontend2.render_video_job(params, workspace, progress)
+            progress(None)
+        output_file = os.path.join(output_dir, f"{job['name']}.mp4")
+        shutil.copyfile(video, output_file)
+        report.update(status="ok", output=output_file, trace=trace_id)
+    except Exception as e:
+        traceback.print_exc()
+        report.update(status="failed", stage=stage, error=f"{type(e).__name__}: {e}")
+    finally:
+        workspace.close()
+    report["seconds"] = time.perf_counter() - start
+    return report
+
+
+def print_report(reports, elapsed):
+    stages = list(dict.fromkeys(stage for report in reports for stage in report["stages"]))
+    header = f"{'job':<32} {'status':<7} {'total s':>8} " + " ".join(f"{stage:>9}" for stage in stages)
+    print("\n" + header)
+    print("-" * len(header))
+    for report in reports:
+        cells = " ".join(f"{report['stages'].get(stage, 0):>9.1f}" for stage in stages)
+        print(f"{report['name'][:32]:<32} {report['status']:<7} {report['seconds']:>8.1f} {cells}")
+    failed = [report for report in reports if report["status"] != "ok"]
+    print(f"\n{len(reports) - len(failed)}/{len(reports)} videos rendered in {elapsed:.1f}s")
+    for report in failed:
+        print(f"FAILED {report['name']} during {report['stage']}: {report['error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render dealer videos from a CSV or JSONL job file")
+    parser.add_argument("job_file")
+    parser.add_argument("--out", default="videos", help="Folder for the rendered videos and report.json")
+    parser.add_argument("--jobs", type=int, default=2, help="Jobs rendered at the same time")
+    parser.add_argument("--job-concurrency", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Threads/processes each job may use for downloads, TTS, rembg and rendering")
+    args = parser.parse_args()
+
+    jobs = read_jobs(args.job_file)
+    os.makedirs(args.out, exist_ok=True)
+    batch_dir = os.path.abspath(os.path.join(args.out, ".batch"))
+
+    # Set before the pipeline modules are imported, the pool processes inherit the environment
+    for setting in CONCURRENCY_SETTINGS:
+        os.environ.setdefault(setting, str(args.job_concurrency))
+    os.environ.setdefault("VEHICLE_DATA_CACHE_DIR", os.path.join(batch_dir, "crm"))
+
+    start = time.perf_counter()
+    reports = []
+    try:
+        image_folders = prepare_shared_assets(jobs, batch_dir)
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=max(1, args.jobs), mp_context=context) as executor:
+            futures = {executor.submit(run_job, job, image_folders, batch_dir, args.out): job for job in jobs}
+            for future in as_completed(futures):
+                try:
+                    report = future.result()
+                except Exception as e:  # the pool process died, e.g. out of memory
+                    job = futures[future]
+                    report = {"name": job["name"], "dealer": job["dealer"], "vehicles": len(job["vehicles"]),
+                              "stages": {}, "status": "failed", "stage": None, "seconds": 0,
+                              "error": f"{type(e).__name__}: {e}"}
+                print(f"{report['name']}: {report['status']} in {report['seconds']:.1f}s")
+                reports.append(report)
+    finally:
+        shutil.rmtree(batch_dir, ignore_errors=True)
+    elapsed = time.perf_counter() - start
+
+    reports.sort(key=lambda report: report["name"])
+    with open(os.path.join(args.out, "report.json"), "w") as f:
+        json.dump({"seconds": elapsed, "jobs": reports}, f, indent=2)
+    print_report(reports, elapsed)
+    return 1 if any(report["status"] != "ok" for report in reports) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import frontend2
+from ffmpeg_encoder import ffmpeg_binary
+
+try:
+    import resource
+except ImportError:  # Windows, only the CPU time of this process is counted
+    resource = None
+
+# Compares the moviepy and ffmpeg video backends on synthetic jobs: wall time and CPU seconds
+# (this process plus ffmpeg children) to encode the same timeline for N vehicles
+TURNTABLE_VIEWS = 8
+SEGMENT_SECONDS = 6.0
+
+
+def cpu_seconds():
+    total = time.process_time()
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        total += usage.ru_utime + usage.ru_stime
+    return total
+
+
+def make_still(path, seed, size):
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(0, 255, size[0], dtype=np.uint8)[None, :, None]
+    pixels = np.broadcast_to(gradient, (size[1], size[0], 3)).copy()
+    pixels[:, :, seed % 3] = rng.integers(0, 255)
+    Image.fromarray(pixels).save(path)
+
+
+def make_audio(path, seconds, frequency):
+    subprocess.run([ffmpeg_binary(), "-y", "-loglevel", "error", "-f", "lavfi",
+                    "-i", f"sine=frequency={frequency}:duration={seconds}", "-c:a", "libmp3lame", path], check=True)
+
+
+# Same layout as a real job: intro card, 3 cards and a turntable per vehicle, closing card
+def make_job(folder, vehicles):
+    images, car_images, audio_files, script_list = [], [], [], []
+    for i in range(3 * vehicles + 2):
+        path = os.path.join(folder, f"{i}.png")
+        make_still(path, i, (1920, 1080))
+        images.append(path)
+    for v in range(vehicles):
+        turntable = os.path.join(folder, f"turntable_{v}")
+        os.makedirs(turntable)
+        for k in range(TURNTABLE_VIEWS):
+            make_still(os.path.join(turntable, f"{k + 1}.png"), v * TURNTABLE_VIEWS + k, (1280, 720))
+        car_images.append(turntable)
+    for i in range(vehicles + 2):
+        path = os.path.join(folder, f"audio_{i}.mp3")
+        make_audio(path, SEGMENT_SECONDS, 220 + 40 * i)
+        audio_files.append(path)
+        script_list.append(f"Segment {i} of the synthetic benchmark script.")
+    durations = [SEGMENT_SECONDS] * len(audio_files)
+    return frontend2.build_timeline(script_list, audio_files, durations, images, car_images)
+
+
+def run(backend, timeline, output_file, captions):
+    wall, cpu = time.perf_counter(), cpu_seconds()
+    if backend == "moviepy":
+        frontend2.encode_with_moviepy(timeline, output_file, captions)
+    else:
+        frontend2.encode_with_ffmpeg(timeline, output_file, captions)
+    return time.perf_counter() - wall, cpu_seconds() - cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the moviepy and ffmpeg video backends")
+    parser.add_argument("--vehicles", type=int, nargs="+", default=[5, 20])
+    parser.add_argument("--backends", nargs="+", default=["moviepy", "ffmpeg"], choices=["moviepy", "ffmpeg"])
+    parser.add_argument("--captions", action="store_true", help="Burn in subtitles")
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as folder:
+        for vehicles in args.vehicles:
+            job_folder = os.path.join(folder, f"job_{vehicles}")
+            os.makedirs(job_folder)
+            timeline = make_job(job_folder, vehicles)
+            for backend in args.backends:
+                output_file = os.path.join(job_folder, f"{backend}.mp4")
+                wall, cpu = run(backend, timeline, output_file, args.captions)
+                rows.append((vehicles, backend, wall, cpu, os.path.getsize(output_file) / 1024 ** 2))
+
+    print(f"\n{'vehicles':>8}  {'backend':<8}  {'wall s':>8}  {'cpu s':>8}  {'MB':>6}")
+    for vehicles, backend, wall, cpu, size in rows:
+        print(f"{vehicles:>8}  {backend:<8}  {wall:>8.1f}  {cpu:>8.1f}  {size:>6.1f}")
+
+
+if __name__ == "__main__":
+    main()
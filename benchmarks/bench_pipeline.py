@@ -0,0 +1,204 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from PIL import Image
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_services import FakeServices
+
+# Offline end-to-end benchmark: starts local stand-ins for the CRM, Groq and ElevenLabs, then runs
+# front.main (through Streamlit's AppTest) and the frontend2 pipeline for N vehicles. Every run is a
+# fresh child process with empty caches, so its peak RSS is its own; stage timings come from its trace.
+#
+#   python benchmarks/bench_pipeline.py --sizes 1 5 20 50 --out results.json
+#   python benchmarks/bench_pipeline.py --baseline results.json   # exit code 1 on a regression
+#
+# Background removal needs the rembg model (REMBG_MODEL) to be downloaded already.
+DEFAULT_SIZES = [1, 5, 20, 50]
+DEALER = "Benchmark Motors"
+
+
+def vehicle_numbers(count):
+    return [f"BM{i:02d}XY{1000 + i}" for i in range(count)]
+
+
+# Static images the pipeline expects on the designer's machine
+def make_assets(folder):
+    os.makedirs(folder, exist_ok=True)
+    paths = {}
+    for name, color in (("bg.png", (238, 243, 240)), ("3d_bg.png", (30, 34, 40)), ("closing.png", (0, 66, 84))):
+        paths[name] = os.path.join(folder, name)
+        Image.new("RGB", (1920, 1080), color).save(paths[name])
+    return {
+        "FRAME_BACKGROUND": paths["bg.png"],
+        "FRAME_BACKGROUND_3D": paths["3d_bg.png"],
+        "CLOSING_IMAGE": paths["closing.png"],
+    }
+
+
+# --- child process: one app, one size ---
+
+def run_frontend2(vehicles, captions):
+    import frontend2
+    from workspace import JobWorkspace
+    from tracing import span
+    from vehicle_data import fetch_many, get_driveaway_data
+
+    with span("script"):
+        car_infos = fetch_many(get_driveaway_data, vehicles)
+        script = frontend2.generate_script(frontend2.build_script_prompt(DEALER, "English", car_infos))
+    params = {"vehicle_numbers": vehicles, "script": script, "voice_id": frontend2.VOICES["Vihan"],
+              "captions": captions}
+    with JobWorkspace() as workspace:
+        frontend2.render_video_job(params, workspace, lambda stage: None)
+
+
+def run_front(vehicles, captions):
+    from streamlit.testing.v1 import AppTest
+    from tracing import span
+
+    app = AppTest.from_file(os.path.join(REPO, "front.py"), default_timeout=3600)
+
+    def click(label, stage):
+        with span(stage):
+            next(button for button in app.button if button.label == label).click().run()
+        if app.exception:
+            raise RuntimeError(app.exception[0].message)
+
+    with span("app_load"):
+        app.run()
+    app.text_input[0].input(DEALER)
+    app.text_area(key="vehicle_numbers_input").input(", ".join(vehicles))
+    app.run()
+    click("Generate Scripts", "generate_scripts")
+    click("Generate Audio Files", "generate_audio")
+
+
+def run_child(app, count, result_path, captions):
+    from tracing import trace_job
+
+    vehicles = vehicle_numbers(count)
+    with trace_job(f"bench-{app}-{count}") as tracer:
+        (run_front if app == "front" else run_frontend2)(vehicles, captions)
+    trace = tracer.to_dict("ok")
+    with open(result_path, "w") as f:
+        json.dump({
+            "app": app,
+            "vehicles": count,
+            "wall": trace["wall"],
+            "cpu": trace["cpu"],
+            "peak_rss": trace["peak_rss"],
+            "stages": {name: total["wall"] for name, total in trace["summary"].items() if "." not in name},
+        }, f)
+
+
+# --- parent process ---
+
+def run_one(services, assets, root, app, count, captions, warm):
+    run_root = os.path.join(root, f"{app}-{count}")
+    env = dict(os.environ, **services.environ(), **assets,
+               FRAME_ENGINE="native", JOB_WORKERS="0",
+               TTS_CACHE_DIR=os.path.join(run_root, "tts"), CUTOUT_CACHE_DIR=os.path.join(run_root, "cutouts"),
+               TRACE_DIR=os.path.join(run_root, "traces"), WORKSPACE_ROOT=os.path.join(run_root, "jobs"))
+    results = []
+    for attempt in range(2 if warm else 1):
+        result_path = os.path.join(run_root, f"result-{attempt}.json")
+        os.makedirs(run_root, exist_ok=True)
+        requests_before = dict(services.requests)
+        command = [sys.executable, os.path.abspath(__file__), "--child", app, str(count), result_path]
+        if captions:
+            command.append("--captions")
+        subprocess.run(command, env=env, cwd=run_root, check=True)
+        with open(result_path) as f:
+            result = json.load(f)
+        result["requests"] = {name: services.requests.get(name, 0) - requests_before.get(name, 0)
+                              for name in services.requests}
+        result["cache"] = "warm" if attempt else "cold"
+        results.append(result)
+    return results
+
+
+def print_results(results):
+    stages = list(dict.fromkeys(stage for result in results for stage in result["stages"]))
+    header = (f"{'app':<10} {'cache':<5} {'vehicles':>8} {'wall s':>8} {'cpu s':>8} {'RSS MB':>7} "
+              + " ".join(f"{stage[:12]:>12}" for stage in stages))
+    print("\n" + header)
+    print("-" * len(header))
+    for result in results:
+        cells = " ".join(f"{result['stages'].get(stage, 0):>12.2f}" for stage in stages)
+        print(f"{result['app']:<10} {result['cache']:<5} {result['vehicles']:>8} {result['wall']:>8.1f} "
+              f"{result['cpu']:>8.1f} {(result['peak_rss'] or 0) / 1024 ** 2:>7.0f} {cells}")
+
+
+# Stages that got slower than the baseline by more than the tolerance (and a small absolute floor)
+def regressions(results, baseline, tolerance, floor=0.5):
+    previous = {(r["app"], r["cache"], r["vehicles"]): r for r in baseline}
+    found = []
+    for result in results:
+        before = previous.get((result["app"], result["cache"], result["vehicles"]))
+        if before is None:
+            continue
+        pairs = [("total", result["wall"], before["wall"])]
+        pairs += [(stage, seconds, before["stages"][stage]) for stage, seconds in result["stages"].items()
+                  if stage in before["stages"]]
+        for stage, seconds, old in pairs:
+            if seconds > old * (1 + tolerance) and seconds - old > floor:
+                found.append(f"{result['app']} {result['cache']} {result['vehicles']} vehicles, {stage}: "
+                             f"{old:.2f}s -> {seconds:.2f}s")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end pipeline benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--apps", nargs="+", default=["frontend2", "front"], choices=["frontend2", "front"])
+    parser.add_argument("--captions", action="store_true", help="Burn in subtitles")
+    parser.add_argument("--warm", action="store_true", help="Run every size again with the caches filled")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every fake API call")
+    parser.add_argument("--out", help="Write the results as JSON")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--child", nargs=3, metavar=("APP", "VEHICLES", "RESULT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        app, count, result_path = args.child
+        run_child(app, int(count), result_path, args.captions)
+        return 0
+
+    services = FakeServices(latency=args.latency).start()
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as root:
+            assets = make_assets(os.path.join(root, "assets"))
+            for app in args.apps:
+                for count in args.sizes:
+                    print(f"Running {app} with {count} vehicles")
+                    start = time.perf_counter()
+                    results += run_one(services, assets, root, app, count, args.captions, args.warm)
+                    print(f"{app} with {count} vehicles took {time.perf_counter() - start:.1f}s")
+    finally:
+        services.stop()
+
+    print_results(results)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_services import FakeServices, CAR_SIDES
+
+# CPU cost of every background removal tier (bg_removal.REMBG_TIERS): each tier runs in a fresh child
+# process over the same car photos, so its model load time, images/second and peak RSS are its own.
+# One process is measured with each tier's own onnxruntime threads (REMBG_<TIER>_INTRA_OP_THREADS, see
+# bg_removal), or with every --threads count in turn to find the best one per tier. In the app a pool of W
+# workers splits REMBG_CORES between them, so compare with the per-worker share, not a whole machine.
+#
+#   python benchmarks/bench_rembg.py --photos path/to/car/photos --threads 2 4 8 16
+#   python benchmarks/bench_rembg.py --count 16 --tiers fast default --out rembg.json
+#
+# Without --photos, synthetic car photos of --photo-size are generated. The rembg models have to be
+# downloaded already (or downloadable) for the tiers that are run.
+DEFAULT_TIERS = ["fast", "default", "quality"]
+
+
+# Synthetic phone photos, the same every run
+def make_photos(folder, count, photo_size):
+    services = FakeServices(photo_size=photo_size)
+    paths = []
+    for i in range(count):
+        path = os.path.join(folder, f"photo_{i + 1}.jpg")
+        with open(path, "wb") as f:
+            f.write(services.photo(f"BM{i // len(CAR_SIDES):02d}XY{1000 + i}", CAR_SIDES[i % len(CAR_SIDES)]))
+        paths.append(path)
+    return paths
+
+
+def list_photos(folder):
+    return sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.lower().endswith(('.png', '.jpg', '.jpeg')))
+
+
+# --- child process: one tier ---
+
+def run_child(tier_name, photo_list, result_path, full_size):
+    import bg_removal
+    import compositor
+    from tracing import peak_rss
+
+    # A single process: tiers that leave the threads to the pool get all of REMBG_CORES
+    bg_removal._threads = bg_removal.REMBG_CORES
+
+    with open(photo_list) as f:
+        photos = json.load(f)
+    tier = bg_removal.get_tier(tier_name)
+    fit = None if full_size else compositor.CUTOUT_BOXES
+    output_folder = tempfile.mkdtemp()
+    jobs = [(path, os.path.join(output_folder, f"{i}.png")) for i, path in enumerate(photos)]
+
+    start = time.perf_counter()
+    bg_removal.tier_session(tier)
+    load = time.perf_counter() - start
+
+    # The first image warms up onnxruntime and isn't counted
+    bg_removal._remove_batch(jobs[:1], fit, tier_name)
+    start, cpu = time.perf_counter(), time.process_time()
+    outputs = bg_removal._remove_batch(jobs[1:], fit, tier_name)
+    wall, cpu = time.perf_counter() - start, time.process_time() - cpu
+    done = sum(output.path is not None for output in outputs)
+    with open(result_path, "w") as f:
+        json.dump({
+            "tier": tier_name,
+            "model": tier["model"],
+            "options": tier["options"],
+            "threads": [tier["intra_op_threads"] or bg_removal._threads, tier["inter_op_threads"]],
+            "images": done,
+            "failed": len(outputs) - done,
+            "load": load,
+            "wall": wall,
+            "cpu": cpu,
+            "images_per_second": done / wall if wall else 0,
+            "peak_rss": peak_rss(),
+        }, f)
+
+
+# --- parent process ---
+
+# threads/inter_threads: onnxruntime threads for the tier, None keeps its own setting
+def run_tier(tier, photo_list, root, threads, inter_threads, full_size):
+    result_path = os.path.join(root, f"result-{tier}-{threads}.json")
+    env = dict(os.environ)
+    if threads is not None:
+        env[f"REMBG_{tier.upper()}_INTRA_OP_THREADS"] = str(threads)
+    if inter_threads is not None:
+        env[f"REMBG_{tier.upper()}_INTER_OP_THREADS"] = str(inter_threads)
+    command = [sys.executable, os.path.abspath(__file__), "--child", tier, photo_list, result_path]
+    if full_size:
+        command.append("--full-size")
+    if subprocess.run(command, env=env).returncode:
+        print(f"Tier {tier} failed, see the output above")
+        return None
+    with open(result_path) as f:
+        return json.load(f)
+
+
+def print_results(results):
+    print("\nthreads: onnxruntime intra/inter-op threads of the one session measured")
+    header = (f"{'tier':<8} {'model':<10} {'threads':>7} {'images':>6} {'load s':>7} {'img/s':>7} "
+              f"{'s/img':>6} {'cpu s/img':>9} {'RSS MB':>7}")
+    print("\n" + header)
+    print("-" * len(header))
+    for result in results:
+        images = max(1, result["images"])
+        print(f"{result['tier']:<8} {result['model']:<10} {'/'.join(map(str, result['threads'])):>7} "
+              f"{result['images']:>6} {result['load']:>7.1f} {result['images_per_second']:>7.2f} "
+              f"{result['wall'] / images:>6.2f} {result['cpu'] / images:>9.2f} "
+              f"{(result['peak_rss'] or 0) / 1024 ** 2:>7.0f}")
+
+    best = {}
+    for result in results:
+        if result["images_per_second"] > best.get(result["tier"], {}).get("images_per_second", -1):
+            best[result["tier"]] = result
+    if any(sum(result["tier"] == tier for result in results) > 1 for tier in best):
+        print("\nBest threads per tier:")
+        for tier, result in best.items():
+            print(f"  {tier}: {result['threads'][0]} intra-op threads, {result['images_per_second']:.2f} img/s "
+                  f"(REMBG_{tier.upper()}_INTRA_OP_THREADS={result['threads'][0]})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Background removal throughput and memory per tier")
+    parser.add_argument("--tiers", nargs="+", default=DEFAULT_TIERS)
+    parser.add_argument("--photos", help="Folder of car photos, synthetic photos are generated without it")
+    parser.add_argument("--count", type=int, default=16, help="Number of synthetic photos")
+    parser.add_argument("--photo-size", default="4000x3000", help="Size of the synthetic photos")
+    parser.add_argument("--threads", type=int, nargs="+", default=[None],
+                        help="onnxruntime intra-op threads to try, each tier's own setting by default")
+    parser.add_argument("--inter-threads", type=int, help="onnxruntime inter-op threads, each tier's own by default")
+    parser.add_argument("--full-size", action="store_true",
+                        help="Cut out at full resolution like front.py instead of sized for the frames")
+    parser.add_argument("--out", help="Write the results as JSON")
+    parser.add_argument("--child", nargs=3, metavar=("TIER", "PHOTOS", "RESULT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(*args.child, args.full_size)
+        return 0
+
+    import bg_removal
+    for tier in args.tiers:
+        bg_removal.get_tier(tier)
+
+    results = []
+    with tempfile.TemporaryDirectory() as root:
+        if args.photos:
+            photos = list_photos(args.photos)
+        else:
+            photo_size = tuple(int(v) for v in args.photo_size.split("x"))
+            photos = make_photos(root, args.count, photo_size)
+        if len(photos) < 2:
+            print("Need at least two photos, the first one only warms up")
+            return 1
+        photo_list = os.path.join(root, "photos.json")
+        with open(photo_list, "w") as f:
+            json.dump(photos, f)
+        for tier in args.tiers:
+            for threads in args.threads:
+                print(f"Running tier {tier} on {len(photos)} photos with "
+                      f"{'its own' if threads is None else threads} threads")
+                result = run_tier(tier, photo_list, root, threads, args.inter_threads, args.full_size)
+                if result is not None:
+                    results.append(result)
+
+    print_results(results)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0 if len(results) == len(args.tiers) * len(args.threads) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
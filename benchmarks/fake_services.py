@@ -0,0 +1,234 @@
+import io
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+import subprocess
+from urllib.parse import urlsplit, parse_qs, quote, unquote
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from PIL import Image, ImageDraw
+
+# Local stand-ins for crm.nxcar.in, Groq and ElevenLabs on one HTTP server, so the pipeline can be
+# benchmarked offline. Payloads are deterministic: the same vehicle number always gets the same
+# details and photos, the same text always gets the same audio.
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+# The views fetchCarVideoImages returns, named like the CRM's "<side>_<n>.jpg" links
+CAR_SIDES = ["Front", "Front Left", "Left Side", "Back Left", "Back", "Back Right", "Right Side", "Front right"]
+WORDS_PER_SECOND = 2.5
+
+
+def _seed(*parts):
+    return int(hashlib.sha256("/".join(map(str, parts)).encode()).hexdigest()[:8], 16)
+
+
+class FakeServices:
+    def __init__(self, latency=0.0, photo_size=(1280, 960)):
+        with open(os.path.join(FIXTURES, "driveaway_data.json")) as f:
+            self.vehicles = json.load(f)
+        self.latency = latency
+        self.photo_size = photo_size
+        self.requests = {}
+        self._audio = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    # Environment that points the pipeline at this server
+    def environ(self):
+        return {
+            "CRM_BASE_URL": self.base_url,
+            "GROQ_BASE_URL": self.base_url,
+            "GROQ_API_KEY": "offline",
+            "ELEVENLABS_BASE_URL": self.base_url,
+            "ELEVENLABS_API_KEY": "offline",
+            "ELEVEN_LABS_API": "offline",
+        }
+
+    def start(self, host="127.0.0.1", port=0):
+        services = self
+
+        class Handler(_Handler):
+            pass
+
+        Handler.services = services
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def count(self, name):
+        with self._lock:
+            self.requests[name] = self.requests.get(name, 0) + 1
+
+    # --- CRM ---
+
+    def driveaway_data(self, vehicle_number):
+        car_info = json.loads(json.dumps(self.vehicles[_seed(vehicle_number) % len(self.vehicles)]))
+        car_info["rc_report_generate"]["regNo"] = vehicle_number
+        car_info["kilometers"] = str(10000 + _seed(vehicle_number, "km") % 90000)
+        return car_info
+
+    def video_images(self, vehicle_number):
+        return {"downloadLinks": [
+            f"{self.base_url}/photos/{quote(vehicle_number)}/{quote(side)}_{i + 1}.jpg"
+            for i, side in enumerate(CAR_SIDES)
+        ]}
+
+    def banner(self, vehicle_number):
+        image = Image.new("RGB", (1920, 1080), (0, 66, 84))
+        ImageDraw.Draw(image).text((80, 80), f"Dealer banner {vehicle_number}", fill="white")
+        output = io.BytesIO()
+        image.save(output, "PNG")
+        return output.getvalue()
+
+    # A car-like shape on a studio background, different for every vehicle and side
+    def photo(self, vehicle_number, side):
+        width, height = self.photo_size
+        seed = _seed(vehicle_number, side)
+        image = Image.new("RGB", (width, height), (225, 225, 220))
+        draw = ImageDraw.Draw(image)
+        body = (seed % 200 + 30, seed // 7 % 200 + 30, seed // 49 % 200 + 30)
+        draw.rounded_rectangle((width * 0.12, height * 0.45, width * 0.88, height * 0.72), 40, fill=body)
+        draw.polygon([(width * 0.3, height * 0.45), (width * 0.4, height * 0.3), (width * 0.65, height * 0.3),
+                      (width * 0.75, height * 0.45)], fill=body)
+        for x in (0.28, 0.72):
+            draw.ellipse((width * x - 70, height * 0.66, width * x + 70, height * 0.66 + 140), fill=(20, 20, 20))
+        draw.text((20, 20), f"{vehicle_number} {side}", fill=(90, 90, 90))
+        output = io.BytesIO()
+        image.save(output, "JPEG", quality=88)
+        return output.getvalue()
+
+    # --- Groq ---
+
+    def chat_completion(self, payload):
+        prompt = payload["messages"][-1]["content"]
+        cars = re.findall(r"Year: (.*?), Model: (.*?), Price: (.*?) rupees, Distance: (.*?) km traveled", prompt)
+        lines = ["Nexcar certified vehicles are here for you"]
+        lines += [f"Drive home the {year} {model} for just {price} rupees, with only {distance} km on the clock"
+                  for year, model, price, distance in cars]
+        lines.append("Every car is inspected by Nexcar, avail easy loans, insurance and warranty today")
+        return {
+            "id": f"chatcmpl-{_seed(prompt):x}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "fake"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "; ".join(lines)},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt.split()), "completion_tokens": 0, "total_tokens": 0},
+        }
+
+    # The same completion as server-sent events, a few words per chunk
+    def chat_completion_events(self, payload, words_per_chunk=3):
+        completion = self.chat_completion(payload)
+        words = completion["choices"][0]["message"]["content"].split(" ")
+        chunks = [" ".join(words[i:i + words_per_chunk]) + (" " if i + words_per_chunk < len(words) else "")
+                  for i in range(0, len(words), words_per_chunk)]
+        for content in chunks + [None]:
+            done = content is None
+            yield {
+                "id": completion["id"],
+                "object": "chat.completion.chunk",
+                "created": completion["created"],
+                "model": completion["model"],
+                "choices": [{"index": 0, "delta": {} if done else {"role": "assistant", "content": content},
+                             "finish_reason": "stop" if done else None}],
+            }
+
+    # --- ElevenLabs ---
+
+    # MP3 whose length follows the text, like real speech; generated once per duration
+    def speech(self, text, output_format):
+        seconds = round(max(1.0, len(text.split()) / WORDS_PER_SECOND), 1)
+        _, sample_rate, bitrate = (output_format or "mp3_22050_32").split("_")
+        key = (seconds, sample_rate, bitrate)
+        with self._lock:
+            audio = self._audio.get(key)
+        if audio is None:
+            from ffmpeg_encoder import ffmpeg_binary
+            audio = subprocess.run(
+                [ffmpeg_binary(), "-loglevel", "error", "-f", "lavfi", "-i",
+                 f"sine=frequency=220:sample_rate={sample_rate}:duration={seconds}",
+                 "-c:a", "libmp3lame", "-b:a", f"{bitrate}k", "-f", "mp3", "-"],
+                check=True, capture_output=True).stdout
+            with self._lock:
+                self._audio[key] = audio
+        return audio
+
+
+class _Handler(BaseHTTPRequestHandler):
+    services = None
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, body, content_type, status=200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_events(self, events):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for event in events:
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+            self.wfile.flush()
+            if self.services.latency:
+                time.sleep(self.services.latency / 10)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+    def _json_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_POST(self):
+        services = self.services
+        url = urlsplit(self.path)
+        payload = self._json_body()
+        if services.latency:
+            time.sleep(services.latency)
+        if url.path.startswith("/api/"):
+            endpoint = url.path[len("/api/"):]
+            services.count(endpoint)
+            vehicle_number = payload.get("vehiclenumber", "")
+            if endpoint == "driveaway_data":
+                return self._send(json.dumps(services.driveaway_data(vehicle_number)).encode(), "application/json")
+            if endpoint == "fetchCarVideoImages":
+                return self._send(json.dumps(services.video_images(vehicle_number)).encode(), "application/json")
+            if endpoint == "fetchBannerImage":
+                return self._send(services.banner(vehicle_number), "image/png")
+        elif url.path.endswith("/chat/completions"):
+            services.count("groq")
+            if payload.get("stream"):
+                return self._send_events(services.chat_completion_events(payload))
+            return self._send(json.dumps(services.chat_completion(payload)).encode(), "application/json")
+        elif url.path.startswith("/v1/text-to-speech/"):
+            services.count("tts")
+            output_format = parse_qs(url.query).get("output_format", [None])[0]
+            return self._send(services.speech(payload.get("text", ""), output_format), "audio/mpeg")
+        self._send(b"{}", "application/json", 404)
+
+    def do_GET(self):
+        parts = urlsplit(self.path).path.strip("/").split("/")
+        if len(parts) == 3 and parts[0] == "photos":
+            self.services.count("photo")
+            vehicle_number, name = unquote(parts[1]), unquote(parts[2])
+            side = name.rsplit("_", 1)[0]
+            return self._send(self.services.photo(vehicle_number, side), "image/jpeg")
+        self._send(b"", "text/plain", 404)
+
+    def log_message(self, *args):
+        pass
@@ -0,0 +1,234 @@
+import os
+import math
+import time
+import shutil
+import atexit
+import threading
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+from cutout_cache import get_cutout_cache
+
+# Background removal runs in a pool of worker processes, each holding a rembg model session per tier used
+REMBG_MODEL = os.getenv("REMBG_MODEL", "u2net")
+# Cores the pool of this process may use; job_queue.ensure_workers gives each job worker an equal share
+REMBG_CORES = int(os.getenv("REMBG_CORES", str(os.cpu_count() or 1)))
+REMBG_WORKERS = int(os.getenv("REMBG_WORKERS", str(REMBG_CORES)))
+REMBG_BATCH_SIZE = int(os.getenv("REMBG_BATCH_SIZE", "4"))
+# onnxruntime threads of every session; 0 intra-op threads splits the cores evenly between the workers.
+# A tier can have its own, e.g. REMBG_FAST_INTRA_OP_THREADS, and uses these when it hasn't.
+REMBG_INTRA_OP_THREADS = int(os.getenv("REMBG_INTRA_OP_THREADS", "0"))
+REMBG_INTER_OP_THREADS = int(os.getenv("REMBG_INTER_OP_THREADS", "1"))
+REMBG_TIER = os.getenv("REMBG_TIER", "default")
+
+
+def _tier_threads(tier_name):
+    return {
+        "intra_op_threads": int(os.getenv(f"REMBG_{tier_name.upper()}_INTRA_OP_THREADS", REMBG_INTRA_OP_THREADS)),
+        "inter_op_threads": int(os.getenv(f"REMBG_{tier_name.upper()}_INTER_OP_THREADS", REMBG_INTER_OP_THREADS)),
+    }
+
+
+# Speed/quality tiers: the model, extra rembg.remove options and the session threads.
+# benchmarks/bench_rembg.py measures images/second and peak memory of each.
+REMBG_TIERS = {
+    # u2netp is a 4.7 MB version of u2net, for previews
+    "fast": {"model": "u2netp", "options": {}, **_tier_threads("fast")},
+    "default": {"model": REMBG_MODEL, "options": {}, **_tier_threads("default")},
+    # The default model with the mask edges refined by alpha matting (pymatting), several times slower
+    "quality": {"model": REMBG_MODEL,
+                "options": {"alpha_matting": True, "alpha_matting_foreground_threshold": 240,
+                            "alpha_matting_background_threshold": 10, "alpha_matting_erode_size": 10},
+                **_tier_threads("quality")},
+}
+# With fit boxes, photos are decoded at reduced scale to about this long side before segmentation;
+# JPEGs are scaled while decoding (DCT scaling), so the full resolution is never held in memory
+REMBG_DECODE_SIDE = int(os.getenv("REMBG_DECODE_SIDE", "1920"))
+
+# path: the cutout, None when it failed; seconds and cpu: wall and CPU time spent on it in the worker
+# process (the pool outlives every job, so its CPU time never shows up as a finished child's), 0 when it
+# came from the cache or was shared with another job of the same photo
+Cutout = namedtuple("Cutout", "path seconds cpu")
+
+# Sessions of the current worker process by (model, intra-op, inter-op threads), and the intra-op threads
+# of tiers that leave them to the pool
+_sessions = {}
+_threads = 1
+
+
+def get_tier(name):
+    if name not in REMBG_TIERS:
+        raise ValueError(f"Unknown background removal tier {name!r}, expected one of {', '.join(REMBG_TIERS)}")
+    return REMBG_TIERS[name]
+
+
+# Model session of a tier in this process, created on first use
+def tier_session(tier):
+    import onnxruntime as ort
+    from rembg import new_session
+    # Split the cores between the workers instead of every session spinning up one thread per core
+    key = (tier["model"], tier["intra_op_threads"] or _threads, tier["inter_op_threads"])
+    if key not in _sessions:
+        sess_opts = ort.SessionOptions()
+        sess_opts.intra_op_num_threads = key[1]
+        sess_opts.inter_op_num_threads = key[2]
+        _sessions[key] = new_session(tier["model"], sess_opts=sess_opts)
+    return _sessions[key]
+
+
+# Loads the model of the pool's default tier up front, other tiers are loaded when first asked for
+def _init_worker(tier_name, threads):
+    global _threads
+    _threads = threads
+    tier_session(get_tier(tier_name))
+
+
+# Decode a photo with its long side reduced to about max_side (never below it), 0 decodes it as it is
+def load_photo(image_path, max_side=0):
+    image = Image.open(image_path)
+    scale = max_side / max(image.size) if max_side else 1
+    if scale < 1:
+        if image.format == "JPEG":
+            image.draft("RGB", (math.ceil(image.width * scale), math.ceil(image.height * scale)))
+        elif scale <= 0.5:
+            image = image.reduce(int(1 / scale))
+    return image.convert("RGBA")
+
+
+# Crop a cutout to its visible pixels, read straight from the alpha channel
+def trim_image(image):
+    bbox = image.getchannel("A").getbbox()
+    if bbox:
+        return image.crop(bbox)  # Crop the image based on the bounding box
+    return image
+
+
+# Scale a cutout down to the largest size it is drawn at, fitted (contain) into any of the (width, height)
+# boxes; it is never scaled up
+def fit_cutout(image, boxes):
+    scale = max(min(width / image.width, height / image.height) for width, height in boxes)
+    if scale >= 1:
+        return image
+    return image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.LANCZOS)
+
+
+# Runs inside a worker: cut out and trim each (image_path, output_path) pair into a Cutout.
+# With fit boxes the photo is decoded at reduced scale and the cutout resampled once to what the frames need.
+def _remove_batch(jobs, fit=None, tier_name=REMBG_TIER):
+    from rembg import remove
+    tier = get_tier(tier_name)
+    session = tier_session(tier)
+    outputs = []
+    for image_path, output_path in jobs:
+        start, cpu = time.perf_counter(), time.process_time()
+        try:
+            input_image = load_photo(image_path, REMBG_DECODE_SIDE if fit else 0)
+            output_image = trim_image(remove(input_image, session=session, **tier["options"]))
+            if fit:
+                output_image = fit_cutout(output_image, fit)
+            output_image.save(output_path, "PNG", compress_level=1 if fit else 6)
+        except Exception as e:
+            print(f"Failed to remove background for {image_path}. Reason: {e}")
+            output_path = None
+        outputs.append(Cutout(output_path, time.perf_counter() - start, time.process_time() - cpu))
+    return outputs
+
+
+class BackgroundRemover:
+    def __init__(self, workers=REMBG_WORKERS, tier=REMBG_TIER, batch_size=REMBG_BATCH_SIZE, cache=None):
+        get_tier(tier)
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.cache = cache or get_cutout_cache()
+        self.tier = tier
+        threads = max(1, REMBG_CORES // self.workers)
+        # spawn keeps the workers independent of the threads running in the Streamlit process
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(tier, threads),
+        )
+
+    # Everything that changes the cutout pixels is part of the cache key
+    def settings(self, tier_name, fit=None):
+        tier = get_tier(tier_name)
+        settings = {"model": tier["model"], "trim": "bbox", **tier["options"]}
+        if fit:
+            settings.update(decode=REMBG_DECODE_SIDE, fit=fit)
+        return settings
+
+    # Run cutout jobs through the worker processes, outputs are returned in order
+    def _run(self, jobs, fit=None, tier=None):
+        batches = [jobs[i:i + self.batch_size] for i in range(0, len(jobs), self.batch_size)]
+        futures = [self._executor.submit(_remove_batch, batch, fit, tier or self.tier) for batch in batches]
+        outputs = []
+        for batch, future in zip(batches, futures):
+            try:
+                outputs.extend(future.result())
+            except Exception as e:
+                print(f"Background removal worker failed. Reason: {e}")
+                outputs.extend([Cutout(None, 0.0, 0.0)] * len(batch))
+        return outputs
+
+    # Remove backgrounds for a list of (image_path, output_path) pairs, a Cutout per pair in order.
+    # Cached cutouts are copied straight to their output; each distinct source is segmented only once.
+    # fit: (width, height) boxes the cutouts are drawn in, cutouts are made no larger than they need to be.
+    # tier: a REMBG_TIERS name, the remover's own tier by default.
+    def remove_batch(self, jobs, fit=None, tier=None):
+        jobs = list(jobs)
+        fit = tuple(tuple(box) for box in fit) if fit else None
+        tier = tier or self.tier
+        settings = self.settings(tier, fit)
+        outputs = [Cutout(None, 0.0, 0.0)] * len(jobs)
+        pending = {}  # cache key -> indexes of the jobs waiting for that cutout
+        for i, (image_path, output_path) in enumerate(jobs):
+            try:
+                key = self.cache.key(image_path, settings)
+            except OSError as e:
+                print(f"Failed to read {image_path}. Reason: {e}")
+                continue
+            cached_path = self.cache.get(key)
+            if cached_path is not None:
+                shutil.copyfile(cached_path, output_path)
+                outputs[i] = Cutout(output_path, 0.0, 0.0)
+            else:
+                pending.setdefault(key, []).append(i)
+
+        keys = list(pending)
+        results = self._run([jobs[pending[key][0]] for key in keys], fit, tier)
+        for key, result in zip(keys, results):
+            if result.path is None:
+                continue
+            self.cache.put(key, result.path)
+            for i in pending[key]:
+                if jobs[i][1] != result.path:
+                    shutil.copyfile(result.path, jobs[i][1])
+                outputs[i] = Cutout(jobs[i][1], 0.0, 0.0)
+            outputs[pending[key][0]] = result
+
+        stats = self.cache.stats()
+        print(f"Cutout cache: {stats['hits']} hits, {stats['misses']} misses, {stats['evictions']} evictions")
+        return outputs
+
+    def close(self):
+        self._executor.shutdown(cancel_futures=True)
+
+
+_remover = None
+_remover_lock = threading.Lock()
+
+
+def get_background_remover():
+    global _remover
+    with _remover_lock:
+        if _remover is None:
+            _remover = BackgroundRemover()
+            atexit.register(_remover.close)
+        return _remover
+
+
+# Function to remove the background of many images at once across all cores
+def remove_backgrounds(jobs, fit=None, tier=None):
+    return get_background_remover().remove_batch(jobs, fit, tier)
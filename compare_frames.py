@@ -0,0 +1,115 @@
+import os
+import sys
+import argparse
+import tempfile
+import numpy as np
+from PIL import Image, ImageDraw
+import compositor
+import frontend2
+
+# Pixel-diff harness for the two frame engines: renders sample car_info records through the native
+# compositor and through the HTML templates in headless Chrome, then reports how far apart they are.
+#
+#   python compare_frames.py --cutout car_no_bg.png --out frame_diffs --max-mean-diff 12
+
+SAMPLE_CAR_INFOS = [
+    {
+        "rc_report_generate": {
+            "vehicleManufacturerName": "MARUTI SUZUKI INDIA LTD",
+            "model": "CELERIO VXI",
+            "normsType": "BHARAT STAGE VI",
+            "regNo": "DL8CAF1234",
+            "regAuthority": "DELHI",
+            "regDate": "12/03/2019",
+            "vehicleClass": "Motor Car(LMV)",
+            "vehicleColour": "SILKY SILVER",
+        },
+        "makeYear": "03/2019",
+        "kilometers": "42000",
+        "ownership": 1,
+        "colorOfCar": "Silver",
+        "fuelType": "Petrol",
+        "listPrice": "4,25,000",
+        "offerPrice": "",
+    },
+    {
+        "rc_report_generate": {
+            "vehicleManufacturerName": "HYUNDAI MOTOR INDIA LTD",
+            "model": "CRETA 1.6 CRDI AUTO SX+",
+            "normsType": "BHARAT STAGE IV",
+            "regNo": "HR26DK5678",
+            "regAuthority": "GURGAON",
+            "regDate": "21/07/2018",
+            "vehicleClass": "Motor Car(LMV)",
+            "vehicleColour": "POLAR WHITE",
+        },
+        "makeYear": "07/2018",
+        "kilometers": "70000",
+        "ownership": 2,
+        "colorOfCar": "White",
+        "fuelType": "Diesel",
+        "listPrice": "8,75,000",
+        "offerPrice": "8,25,000",
+    },
+]
+
+
+# Simple car silhouette on a transparent background, used when no real cutout is given
+def synthetic_cutout(path):
+    image = Image.new("RGBA", (1600, 640), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    draw.rounded_rectangle([40, 240, 1560, 520], radius=80, fill=(180, 20, 30, 255))
+    draw.polygon([(380, 250), (560, 60), (1080, 60), (1280, 250)], fill=(150, 15, 25, 255))
+    for x in (360, 1240):
+        draw.ellipse([x - 120, 420, x + 120, 640], fill=(20, 20, 20, 255))
+    image.save(path)
+    return path
+
+
+def diff_stats(native, html, threshold=32):
+    diff = np.abs(native.astype(np.int16) - html.astype(np.int16)).max(axis=2)
+    return {
+        "mean": float(diff.mean()),
+        "max": int(diff.max()),
+        "changed": float((diff > threshold).mean() * 100),
+    }, diff
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the native and HTML frame engines pixel by pixel")
+    parser.add_argument("--cutout", help="background-removed car PNG (a synthetic one is drawn if omitted)")
+    parser.add_argument("--out", default="frame_diffs", help="folder for side-by-side and diff images")
+    parser.add_argument("--max-mean-diff", type=float, default=12.0, help="fail when a frame's mean diff exceeds this")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.out):
+        os.makedirs(args.out)
+    cutout = os.path.abspath(args.cutout or synthetic_cutout(os.path.join(args.out, "cutout.png")))
+
+    cases = []
+    for i, car_info in enumerate(SAMPLE_CAR_INFOS):
+        for name in ("frame2", "frame3", "frame4"):
+            cases.append((f"car{i}_{name}", name, (car_info, cutout)))
+    cases.append(("frame5", "frame5", (cutout,)))
+
+    failed = False
+    with tempfile.TemporaryDirectory() as temp_dir:
+        html_jobs = [(frontend2.HTML_FRAMES[name](*frame_args), os.path.join(temp_dir, f"{label}.png"))
+                     for label, name, frame_args in cases]
+        frontend2.html_to_images(html_jobs)
+
+        print(f"{'frame':<16}{'mean':>8}{'max':>6}{'changed %':>12}")
+        for (label, name, frame_args), (_, html_path) in zip(cases, html_jobs):
+            native = compositor.render_frame(name, *frame_args)
+            html = np.array(Image.open(html_path).convert("RGB").resize(compositor.FRAME_SIZE))
+            stats, diff = diff_stats(native, html)
+            print(f"{label:<16}{stats['mean']:>8.2f}{stats['max']:>6}{stats['changed']:>12.2f}")
+            Image.fromarray(np.hstack([native, html])).save(os.path.join(args.out, f"{label}_side_by_side.png"))
+            Image.fromarray(diff.astype(np.uint8)).save(os.path.join(args.out, f"{label}_diff.png"))
+            failed = failed or stats["mean"] > args.max_mean_diff
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
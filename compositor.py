@@ -0,0 +1,276 @@
+import os
+import io
+import math
+import time
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+try:
+    import cairosvg
+except ImportError:
+    cairosvg = None
+
+# Native Pillow/NumPy versions of the frame2-frame5 HTML cards. The layout constants below mirror the
+# boxes Chrome computes for the CSS in frontend2 at 1920x1080; compare_frames.py diffs the two engines.
+
+FRAME_SIZE = (1920, 1080)
+BACKGROUND_IMAGE = os.getenv("FRAME_BACKGROUND", "C:/Users/hp/NXcar/Video/bg.png")
+BACKGROUND_3D_IMAGE = os.getenv("FRAME_BACKGROUND_3D", "C:/Users/hp/NXcar/Video/3d_bg.svg")
+
+TEAL = (0, 128, 128)
+WHITE = (255, 255, 255)
+OLIVE = (147, 147, 20)
+LINE_HEIGHT = 1.33  # Chrome's "normal" line height for Segoe UI and its fallbacks
+
+# Boxes (x, y, width, height) the cutouts are fitted into (object-fit: contain) and the canvas regions
+# they are clipped to. .image of frame4 is scaled 2x around its centre, which maps the 480x600 img box
+# onto 960x1200.
+FRAME2_CUTOUT, FRAME2_CLIP = (-850, 413, 3744, 600), (-850, 413, 1646, 1003)
+FRAME3_CUTOUT, FRAME3_CLIP = (-750, 387, 3358, 600), (-750, 387, 1489, 987)
+FRAME4_CUTOUT, FRAME4_CLIP = (770, 20, 960, 1200), (770, 20, 1730, 820)
+FRAME5_CUTOUT, FRAME5_CLIP = (480, 610, 960, 450), (480, 610, 1440, 1080)
+# (width, height) of every cutout box; a cutout is never drawn larger than it fits in one of them
+CUTOUT_BOXES = tuple(box[2:] for box in (FRAME2_CUTOUT, FRAME3_CUTOUT, FRAME4_CUTOUT, FRAME5_CUTOUT))
+
+# Bold fonts tried in order, the first one found is used for every card
+FONT_CANDIDATES = (
+    "segoeuib.ttf",
+    "arialbd.ttf",
+    "DejaVuSans-Bold.ttf",
+    "LiberationSans-Bold.ttf",
+)
+
+
+@lru_cache(maxsize=None)
+def load_font(size):
+    for name in FONT_CANDIDATES:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size)
+
+
+# Scale an image to cover the frame like CSS background-size: cover
+def _cover(image, size, centered=True):
+    scale = max(size[0] / image.width, size[1] / image.height)
+    resized = image.resize((math.ceil(image.width * scale), math.ceil(image.height * scale)), Image.LANCZOS)
+    left = (resized.width - size[0]) // 2 if centered else 0
+    top = (resized.height - size[1]) // 2 if centered else 0
+    return resized.crop((left, top, left + size[0], top + size[1]))
+
+
+# Decode a background once per process, frames copy the cached array
+@lru_cache(maxsize=8)
+def load_background(path, size=FRAME_SIZE, centered=True):
+    if path.lower().endswith(".svg"):
+        if cairosvg is None:
+            raise RuntimeError(f"cairosvg is required to rasterize {path}")
+        image = Image.open(io.BytesIO(cairosvg.svg2png(url=path, output_width=size[0])))
+    else:
+        image = Image.open(path)
+    background = np.array(_cover(image.convert("RGB"), size, centered))
+    background.setflags(write=False)
+    return background
+
+
+# A layer is a (premultiplied RGB, alpha) pair of uint8 arrays
+def _layer(image):
+    data = np.array(image.convert("RGBA").convert("RGBa"))
+    data.setflags(write=False)
+    return data[..., :3], data[..., 3:]
+
+
+# Premultiplied-alpha "over" of a layer onto the canvas at (x, y), limited to the clip rectangle
+def _blend(canvas, layer, x, y, clip=None):
+    premultiplied, alpha = layer
+    height, width = alpha.shape[:2]
+    clip_left, clip_top, clip_right, clip_bottom = clip or (0, 0, canvas.shape[1], canvas.shape[0])
+    x0, y0 = max(x, clip_left, 0), max(y, clip_top, 0)
+    x1 = min(x + width, clip_right, canvas.shape[1])
+    y1 = min(y + height, clip_bottom, canvas.shape[0])
+    if x0 >= x1 or y0 >= y1:
+        return
+    source = (slice(y0 - y, y1 - y), slice(x0 - x, x1 - x))
+    region = canvas[y0:y1, x0:x1]
+    blended = premultiplied[source] + (region * (255 - alpha[source].astype(np.uint16)) + 127) // 255
+    region[...] = np.minimum(blended, 255)
+
+
+# Pre-rasterized text box, optionally with a (rounded) background and border
+@lru_cache(maxsize=512)
+def text_layer(text, font_size, color, background=None, size=None, padding=(0, 0), radius=0,
+               corners=None, align="center"):
+    font = load_font(font_size)
+    text = text.upper()
+    if size is None:
+        size = (math.ceil(font.getlength(text)) + 2 * padding[1], round(font_size * LINE_HEIGHT) + 2 * padding[0])
+    image = Image.new("RGBA", size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    if background is not None:
+        draw.rounded_rectangle([0, 0, size[0] - 1, size[1] - 1], radius=radius, fill=background, corners=corners)
+    if align == "center":
+        draw.text((size[0] / 2, size[1] / 2), text, font=font, fill=color, anchor="mm")
+    else:
+        draw.text((padding[1], size[1] / 2), text, font=font, fill=color, anchor="lm")
+    return _layer(image)
+
+
+# Cutout scaled like CSS object-fit: contain inside a box, returned with its offset in the box
+@lru_cache(maxsize=32)
+def _contain_layer(path, mtime, box_width, box_height):
+    image = Image.open(path).convert("RGBA").convert("RGBa")
+    scale = min(box_width / image.width, box_height / image.height)
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    image = image.resize(size, Image.LANCZOS)
+    return _layer(image), ((box_width - size[0]) // 2, (box_height - size[1]) // 2)
+
+
+def _place_cutout(canvas, image_path, box, clip):
+    x, y, width, height = box
+    layer, (offset_x, offset_y) = _contain_layer(image_path, os.path.getmtime(image_path), width, height)
+    _blend(canvas, layer, x + offset_x, y + offset_y, clip)
+
+
+# Full-width teal strip with the items spread like justify-content: space-around
+@lru_cache(maxsize=64)
+def _band_layer(texts, font_size=30, height=64):
+    font = load_font(font_size)
+    texts = [text.upper() for text in texts]
+    widths = [font.getlength(text) for text in texts]
+    gap = (FRAME_SIZE[0] - sum(widths)) / len(texts)
+    image = Image.new("RGBA", (FRAME_SIZE[0], height), TEAL + (255,))
+    draw = ImageDraw.Draw(image)
+    x = gap / 2
+    for text, width in zip(texts, widths):
+        draw.text((x, height / 2), text, font=font, fill=WHITE, anchor="lm")
+        x += width + gap
+    return _layer(image)
+
+
+# Bordered price box of frame3, taller when an offer price is shown
+@lru_cache(maxsize=64)
+def _price_box_layer(list_price, offer_price, width=431):
+    font = load_font(30)
+    line = round(30 * LINE_HEIGHT)
+    rows = [("list price", TEAL), (f"Rs. {list_price}", OLIVE)]
+    if offer_price:
+        rows += [None, ("Offer price", TEAL), (f"Rs. {offer_price}", OLIVE)]
+    height = 2 * 14 + sum(line if row else 42 for row in rows)
+    image = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    draw.rounded_rectangle([0, 0, width - 1, height - 1], radius=16, outline=TEAL, width=2)
+    y = 14
+    for row in rows:
+        if row is None:
+            draw.rectangle([52, y + 20, width - 53, y + 21], fill=TEAL)
+            y += 42
+            continue
+        text, color = row
+        draw.text((52, y + line / 2), text.upper(), font=font, fill=color, anchor="lm")
+        y += line
+    return _layer(image)
+
+
+def render_frame2(car_info, image):
+    rc = car_info['rc_report_generate']
+    canvas = load_background(BACKGROUND_IMAGE).copy()
+    heading = text_layer(f"{rc['vehicleManufacturerName']}, {rc['model']}", 50, TEAL)
+    _blend(canvas, heading, (FRAME_SIZE[0] - heading[1].shape[1]) // 2, 76)
+    _place_cutout(canvas, image, box=FRAME2_CUTOUT, clip=FRAME2_CLIP)
+    tabs = [rc['normsType'], f"model: {car_info['makeYear'].split('/')[1]}", f"Distance:{car_info['kilometers']} km"]
+    for i, text in enumerate(tabs):
+        _blend(canvas, text_layer(text, 30, WHITE, background=TEAL, size=(737, 76), radius=8), 1200, 171 + i * 88)
+    return canvas
+
+
+def render_frame3(car_info, image):
+    canvas = load_background(BACKGROUND_IMAGE).copy()
+    band = (f"{car_info['ownership']} owner", str(car_info['colorOfCar']), str(car_info['fuelType']))
+    _blend(canvas, _band_layer(band), 0, 93)
+    _place_cutout(canvas, image, box=FRAME3_CUTOUT, clip=FRAME3_CLIP)
+    offer_price = car_info.get("offerPrice")
+    _blend(canvas, _price_box_layer(str(car_info['listPrice']), str(offer_price) if offer_price else None),
+           1489, 282 if offer_price else 343)
+    return canvas
+
+
+def render_frame4(car_info, image):
+    rc = car_info['rc_report_generate']
+    canvas = load_background(BACKGROUND_IMAGE).copy()
+    heading = text_layer("vechile information", 30, WHITE, background=TEAL, padding=(12, 20), radius=12,
+                         corners=(False, True, True, False))
+    _blend(canvas, heading, 0, 0)
+    columns = [
+        (0, [("Vehicle Number : ", rc['regNo']), ("Registration Authority : ", rc['regAuthority']),
+             ("Registration Date : ", rc['regDate']), ("Vehicle Class : ", rc['vehicleClass']),
+             ("Model : ", rc['model'])]),
+        (960, [("Vehicle Manufacturer Name :", rc['vehicleManufacturerName']),
+               ("Vehicle Colour : ", rc['vehicleColour'])]),
+    ]
+    for x, fields in columns:
+        for row, (label, value) in enumerate(fields):
+            y = 114 + row * 103
+            _blend(canvas, text_layer(label, 25, TEAL, align="left"), x, y)
+            _blend(canvas, text_layer(str(value), 25, TEAL, align="left"), x + 480, y)
+    _place_cutout(canvas, image, box=FRAME4_CUTOUT, clip=FRAME4_CLIP)
+    return canvas
+
+
+def render_frame5(image):
+    canvas = load_background(BACKGROUND_3D_IMAGE, centered=False).copy()
+    _place_cutout(canvas, image, box=FRAME5_CUTOUT, clip=FRAME5_CLIP)
+    return canvas
+
+
+FRAME_RENDERERS = {
+    "frame2": render_frame2,
+    "frame3": render_frame3,
+    "frame4": render_frame4,
+    "frame5": render_frame5,
+}
+
+
+# Render a frame by template name, returns an RGB array of FRAME_SIZE
+def render_frame(name, *args):
+    return FRAME_RENDERERS[name](*args)
+
+
+def save_frame(frame, output_path):
+    image = Image.fromarray(frame)
+    if output_path.lower().endswith(".png"):
+        image.save(output_path, compress_level=1)
+    else:
+        image.save(output_path, quality=95)
+    return output_path
+
+
+# Render a batch of (name, args, output_path) jobs on a thread pool, failed jobs come back as None.
+# With a frame store the frames are kept in it under output_path instead of being saved. timings, if
+# given, is filled with output_path -> (wall, CPU seconds of the rendering thread) for every job.
+def render_batch(jobs, workers=None, store=None, timings=None):
+    def render_one(job):
+        name, args, output_path = job
+        start, cpu = time.perf_counter(), time.thread_time()
+        try:
+            frame = render_frame(name, *args)
+            if store is not None:
+                store.put(output_path, frame)
+                return output_path
+            save_frame(frame, output_path)
+            print(f"Image saved successfully: {output_path}")
+            return output_path
+        except Exception as e:
+            print(f"Native render of {name} failed for {output_path}. Reason: {e}")
+            return None
+        finally:
+            if timings is not None:
+                timings[output_path] = (time.perf_counter() - start, time.thread_time() - cpu)
+
+    jobs = list(jobs)
+    if not jobs:
+        return []
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        return list(executor.map(render_one, jobs))
@@ -0,0 +1,35 @@
+import os
+import json
+import hashlib
+import threading
+from disk_lru import DiskLRU
+
+# On-disk cache of background-removed cutouts, keyed by the source image bytes and the rembg settings.
+# get(key) gives the cached PNG or None, put(key, cutout_path) copies one in (see disk_lru.DiskLRU).
+CUTOUT_CACHE_DIR = os.getenv("CUTOUT_CACHE_DIR", os.path.join(".cache", "cutouts"))
+CUTOUT_CACHE_MAX_BYTES = int(os.getenv("CUTOUT_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+
+
+class CutoutCache(DiskLRU):
+    def __init__(self, directory=CUTOUT_CACHE_DIR, max_bytes=CUTOUT_CACHE_MAX_BYTES):
+        DiskLRU.__init__(self, directory, ".png", max_bytes)
+
+    # Content address of a source image under the given segmentation settings
+    def key(self, image_path, settings):
+        digest = hashlib.sha256(json.dumps(settings, sort_keys=True).encode())
+        with open(image_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cutout_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = CutoutCache()
+        return _cache
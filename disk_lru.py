@@ -0,0 +1,123 @@
+import os
+import time
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+# Size-bounded directory of cache files, evicted least recently used first. The sizes and the LRU order
+# are kept in memory: the directory is walked once when first used and again every DISK_LRU_RESCAN seconds
+# (to see what other processes sharing it added or removed), gets and puts only update the index.
+DISK_LRU_RESCAN = float(os.getenv("DISK_LRU_RESCAN", "600"))
+
+
+class DiskLRU:
+    # Entries are files named <key><suffix> in <directory>/<key[:2]>; companions are the suffixes of side
+    # files (e.g. ".json") removed together with an entry. expired(path), if given, is asked about every
+    # entry when the directory is walked, expired ones are removed.
+    def __init__(self, directory, suffix, max_bytes, companions=(), expired=None):
+        self.directory = directory
+        self.suffix = suffix
+        self.max_bytes = max_bytes
+        self.companions = tuple(companions)
+        self.expired = expired
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = None  # path -> size, least recently used first
+        self._scanned = 0
+        self._lock = threading.Lock()
+        if not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}{self.suffix}")
+
+    # Build the index from the directory when it is missing or older than DISK_LRU_RESCAN, under the lock
+    def _index(self):
+        if self._entries is not None and time.time() - self._scanned < DISK_LRU_RESCAN:
+            return self._entries
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for file in files:
+                if not file.endswith(self.suffix):
+                    continue
+                path = os.path.join(root, file)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if self.expired is not None and self.expired(path):
+                    self._remove(path)
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        self._entries = OrderedDict((path, size) for _, size, path in sorted(entries))
+        self.bytes = sum(self._entries.values())
+        self._scanned = time.time()
+        return self._entries
+
+    def _remove(self, path):
+        for stale in (path,) + tuple(path[:-len(self.suffix)] + suffix for suffix in self.companions):
+            try:
+                os.remove(stale)
+            except FileNotFoundError:
+                pass
+
+    # Path of the cached file or None; a hit refreshes its place in the LRU order, on disk too
+    def get(self, key):
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+                entries = self._index()
+                if path in entries:
+                    self.bytes -= entries.pop(path)
+            return None
+        with self._lock:
+            self.hits += 1
+            entries = self._index()
+            if path in entries:
+                entries.move_to_end(path)
+            else:
+                entries[path] = os.path.getsize(path)
+                self.bytes += entries[path]
+        return path
+
+    # Copy a file into the cache under key (atomically, through a temp file next to it), then evict the
+    # least recently used entries over max_bytes; returns the cached path
+    def put(self, key, source_path):
+        path = self.path(key)
+        folder = os.path.dirname(path)
+        if not os.path.exists(folder):
+            os.makedirs(folder, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+        os.close(fd)
+        shutil.copyfile(source_path, temp_path)
+        os.replace(temp_path, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            entries = self._index()
+            self.bytes += size - entries.pop(path, 0)
+            entries[path] = size
+            while self.bytes > self.max_bytes and len(entries) > 1:
+                stale, stale_size = entries.popitem(last=False)
+                self._remove(stale)
+                self.bytes -= stale_size
+                self.evictions += 1
+        return path
+
+    # Drop an entry and its side files
+    def discard(self, key):
+        path = self.path(key)
+        self._remove(path)
+        with self._lock:
+            entries = self._index()
+            if path in entries:
+                self.bytes -= entries.pop(path)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
@@ -0,0 +1,119 @@
+import os
+import time
+import random
+import threading
+from collections import namedtuple
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+
+# Concurrent image downloader: a bounded thread pool, one keep-alive session per host, bodies streamed to disk
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "16"))
+DOWNLOAD_CONNECT_TIMEOUT = float(os.getenv("DOWNLOAD_CONNECT_TIMEOUT", "5"))
+DOWNLOAD_READ_TIMEOUT = float(os.getenv("DOWNLOAD_READ_TIMEOUT", "30"))
+DOWNLOAD_RETRIES = int(os.getenv("DOWNLOAD_RETRIES", "3"))
+CHUNK_SIZE = 64 * 1024
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+DownloadResult = namedtuple("DownloadResult", "url path bytes seconds error")
+
+
+class ImageDownloader:
+    def __init__(self, workers=DOWNLOAD_WORKERS, timeout=(DOWNLOAD_CONNECT_TIMEOUT, DOWNLOAD_READ_TIMEOUT),
+                 retries=DOWNLOAD_RETRIES):
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.retries = retries
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    # One session per host so connections are reused across every image on that host
+    def _session(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._sessions[host] = session
+            return session
+
+    @staticmethod
+    def _discard(temp_path):
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+    # Stream one URL to path, retrying timeouts, dropped connections and 429/5xx responses. Any other
+    # failure (e.g. the disk) fails this URL only, never the batch.
+    def fetch(self, url, path):
+        start = time.perf_counter()
+        temp_path = f"{path}.part"
+        for attempt in range(self.retries + 1):
+            try:
+                size = 0
+                with self._session(url).get(url, stream=True, timeout=self.timeout) as response:
+                    if response.status_code in RETRY_STATUSES and attempt < self.retries:
+                        raise requests.HTTPError(f"{response.status_code} response", response=response)
+                    response.raise_for_status()
+                    with open(temp_path, "wb") as handler:
+                        for chunk in response.iter_content(CHUNK_SIZE):
+                            handler.write(chunk)
+                            size += len(chunk)
+                os.replace(temp_path, path)
+                return DownloadResult(url, path, size, time.perf_counter() - start, None)
+            except requests.RequestException as e:
+                status = e.response.status_code if e.response is not None else None
+                retryable = status is None or status in RETRY_STATUSES
+                if not retryable or attempt == self.retries:
+                    self._discard(temp_path)
+                    return DownloadResult(url, path, 0, time.perf_counter() - start, e)
+                # Exponential backoff with jitter before the next attempt
+                time.sleep(0.5 * 2 ** attempt + random.uniform(0, 0.25))
+            except (OSError, ValueError) as e:
+                # Not a network error, e.g. the file couldn't be written (disk full, folder gone), so no retry
+                print(f"Failed to save {url} to {path}: {e}")
+                self._discard(temp_path)
+                return DownloadResult(url, path, 0, time.perf_counter() - start, e)
+
+    # Download (url, path) pairs concurrently, results are returned in the same order
+    def download_all(self, tasks):
+        tasks = list(tasks)
+        if not tasks:
+            return []
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(tasks))) as executor:
+            results = list(executor.map(lambda task: self.fetch(*task), tasks))
+        elapsed = time.perf_counter() - start
+
+        total_bytes = 0
+        for result in results:
+            if result.error is None:
+                total_bytes += result.bytes
+                rate = result.bytes / result.seconds / 1024 if result.seconds else 0
+                print(f"Fetched {result.path}: {result.bytes} bytes in {result.seconds * 1000:.0f} ms ({rate:.0f} KB/s)")
+        failed = sum(result.error is not None for result in results)
+        print(f"Downloaded {len(results) - failed}/{len(results)} images, {total_bytes / 1024 ** 2:.1f} MB "
+              f"in {elapsed:.2f}s ({total_bytes / 1024 ** 2 / elapsed if elapsed else 0:.1f} MB/s)")
+        return results
+
+
+_downloader = None
+_downloader_lock = threading.Lock()
+
+
+def get_downloader():
+    global _downloader
+    with _downloader_lock:
+        if _downloader is None:
+            _downloader = ImageDownloader()
+        return _downloader
+
+
+# Function to download many (url, path) pairs at once with the shared downloader
+def download_files(tasks):
+    return get_downloader().download_all(tasks)
@@ -0,0 +1,150 @@
+import os
+import shutil
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from tracing import span
+
+# Encodes a timeline of stills, audio files and timed overlays with a single ffmpeg invocation; each
+# distinct still passes through Python once, no video frame does
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY")
+# Segments encoded at the same time by encode_segments, each libx264 gets an equal share of the cores
+ENCODE_WORKERS = int(os.getenv("ENCODE_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+
+def ffmpeg_binary():
+    if FFMPEG_BINARY:
+        return FFMPEG_BINARY
+    try:
+        import imageio_ffmpeg  # ships with moviepy
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except (ImportError, RuntimeError):
+        return shutil.which("ffmpeg") or "ffmpeg"
+
+
+# shots: [(key, duration)] shown back to back, load_frame(key) returns the RGB array of size for each.
+# Each still is piped to ffmpeg once as raw video and held on screen by retiming, nothing is compressed
+# or written to disk on the way.
+# audio_files: played back to back as the soundtrack
+# overlays: [(png_path, start, end)] full-frame RGBA images composited over [start, end), or
+# (png_path, start, end, x, y) for a smaller image placed with its top left corner at (x, y)
+def encode_frames(shots, load_frame, audio_files, output_file, overlays=(), fps=30, size=(1920, 1080),
+                  codec="libx264", preset="medium", audio_codec="aac", threads=None):
+    width, height = size
+    durations = [duration for _, duration in shots]
+    inputs = ["-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-framerate", "1", "-i", "-"]
+
+    def add_input(path):
+        inputs.extend(["-i", path])
+        return inputs.count("-i") - 1
+
+    # Frame N starts at the sum of the durations before it and fps clones it until the next one arrives.
+    # The last still is sent a second time to mark the end, otherwise fps would drop it.
+    starts = "+".join(["0"] + [f"{duration:.6f}*gte(N,{k + 1})" for k, duration in enumerate(durations)])
+    filters = [
+        f"[0:v]settb=AVTB,setpts='({starts})/TB',fps={fps},trim=duration={sum(durations):.6f},"
+        f"setsar=1,format=yuv420p[vcat]"
+    ]
+
+    def feed(stdin):
+        for key, _ in shots + shots[-1:]:
+            frame = load_frame(key)
+            stdin.write(memoryview(frame).cast("B") if frame.flags.c_contiguous else frame.tobytes())
+
+    _run(inputs, filters, "vcat", add_input, audio_files, output_file, overlays, fps, codec, preset, audio_codec,
+         feed=feed, threads=threads)
+    return output_file
+
+
+# Length of a segment of the given duration once cut to whole frames
+def segment_length(duration, fps=30):
+    return max(1, round(duration * fps)) / fps
+
+
+# Encode each segment to its own video-only file on a pool of ffmpeg processes. segments: [(shots, overlays)]
+# with overlay times relative to the segment. Every segment is cut to a whole number of frames and encoded
+# with the same parameters, so the H.264 streams can be joined by concat_segments without re-encoding.
+def encode_segments(segments, load_frame, segment_files, fps=30, size=(1920, 1080), codec="libx264",
+                    preset="medium", workers=ENCODE_WORKERS):
+    workers = max(1, min(workers, len(segments)))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+
+    def encode_one(i):
+        shots, overlays = segments[i]
+        duration = sum(duration for _, duration in shots)
+        shots = shots[:-1] + [(shots[-1][0], shots[-1][1] + segment_length(duration, fps) - duration)]
+        with span("encode.segment", segment=i):
+            encode_frames(shots, load_frame, [], segment_files[i], overlays, fps=fps, size=size, codec=codec,
+                          preset=preset, threads=threads)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(encode_one, range(len(segments))))
+    return segment_files
+
+
+# Join video-only segment files with stream copy and add the soundtrack, one audio file as long as the
+# segments together (see audio_track.MasterAudio). The audio is encoded once, which avoids an AAC priming
+# gap at every join.
+def concat_segments(segment_files, audio_file, output_file, audio_codec="aac"):
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+        for path in segment_files:
+            f.write("file '{}'\n".format(os.path.abspath(path).replace("'", "'\\''")))
+        concat_list = f.name
+    command = [
+        ffmpeg_binary(), "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", concat_list,
+        "-i", audio_file, "-map", "0:v", "-map", "1:a",
+        "-c:v", "copy", "-c:a", audio_codec, "-movflags", "+faststart",
+        output_file,
+    ]
+    try:
+        with span("encode.concat"):
+            subprocess.run(command, check=True)
+    finally:
+        os.unlink(concat_list)
+    return output_file
+
+
+# Overlays, soundtrack and output settings shared by both encoders; feed writes the stdin input if any.
+# Without audio files the output is video only.
+def _run(inputs, filters, video_label, add_input, audio_files, output_file, overlays, fps, codec, preset,
+         audio_codec, feed=None, threads=None):
+    for k, (path, start, end, *position) in enumerate(overlays):
+        index = add_input(path)
+        x, y = position or (0, 0)
+        filters.append(f"[{video_label}][{index}:v]overlay={x}:{y}:enable='between(t,{start:.3f},{end:.3f})'[ov{k}]")
+        video_label = f"ov{k}"
+    filters.append(f"[{video_label}]format=yuv420p[vout]")
+
+    audio_inputs = [add_input(path) for path in audio_files]
+    audio_options = ["-an"]
+    if audio_inputs:
+        filters.append("".join(f"[{index}:a]" for index in audio_inputs) + f"concat=n={len(audio_inputs)}:v=0:a=1[aout]")
+        audio_options = ["-map", "[aout]", "-c:a", audio_codec]
+
+    # The graph grows with the number of shots, so it goes through a file rather than the command line
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+        f.write(";\n".join(filters))
+        filter_script = f.name
+    command = [
+        ffmpeg_binary(), "-y", "-loglevel", "error", *inputs,
+        "-filter_complex_script", filter_script,
+        "-map", "[vout]", "-c:v", codec, "-preset", preset, "-pix_fmt", "yuv420p", "-r", str(fps),
+        *(["-threads", str(threads)] if threads else []),
+        *audio_options, "-movflags", "+faststart",
+        output_file,
+    ]
+    try:
+        if feed is None:
+            subprocess.run(command, check=True)
+            return
+        process = subprocess.Popen(command, stdin=subprocess.PIPE)
+        try:
+            feed(process.stdin)
+        except BrokenPipeError:
+            pass  # ffmpeg exited early, its return code says why
+        finally:
+            process.stdin.close()
+        if process.wait():
+            raise subprocess.CalledProcessError(process.returncode, command)
+    finally:
+        os.unlink(filter_script)
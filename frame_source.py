@@ -0,0 +1,53 @@
+import os
+import bisect
+import threading
+from collections import OrderedDict
+from moviepy.editor import VideoClip
+
+# A moviepy clip over a list of (image path, duration) stills that decodes each image only when the
+# writer reaches its time range. Decoded frames live in a small LRU, so memory stays flat however
+# many vehicles (stills) the video has.
+FRAME_CACHE_SIZE = int(os.getenv("FRAME_CACHE_SIZE", "4"))
+
+
+class FrameLRU:
+    def __init__(self, load_frame, capacity=FRAME_CACHE_SIZE):
+        self.load_frame = load_frame
+        self.capacity = max(1, capacity)
+        self.decodes = 0
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        with self._lock:
+            frame = self._frames.get(path)
+            if frame is not None:
+                self._frames.move_to_end(path)
+                return frame
+        frame = self.load_frame(path)
+        frame.setflags(write=False)  # shared by every video frame of the still
+        with self._lock:
+            self.decodes += 1
+            self._frames[path] = frame
+            while len(self._frames) > self.capacity:
+                self._frames.popitem(last=False)
+        return frame
+
+
+class StillsClip(VideoClip):
+    # shots: [(image path, duration)] shown back to back; load_frame(path) returns an RGB array of the video size
+    def __init__(self, shots, load_frame, cache_size=FRAME_CACHE_SIZE):
+        self.shots = [(path, duration) for path, duration in shots if duration > 0]
+        if not self.shots:
+            raise ValueError("StillsClip needs at least one shot")
+        self.frames = FrameLRU(load_frame, cache_size)
+        self._ends = []
+        end = 0
+        for _, duration in self.shots:
+            end += duration
+            self._ends.append(end)
+        VideoClip.__init__(self, make_frame=self._make_frame, duration=end)
+
+    def _make_frame(self, t):
+        index = min(bisect.bisect_right(self._ends, t), len(self.shots) - 1)
+        return self.frames.get(self.shots[index][0])
@@ -0,0 +1,116 @@
+import os
+import threading
+import cv2
+import numpy as np
+from PIL import Image
+
+# Rendered frames of a job kept as read-only RGB arrays of the video size, keyed by the path the frame
+# would have on disk, and handed to the video backends without a PNG round trip. Frames past the memory
+# budget, and every frame when FRAME_STORE_PERSIST is set (for debugging), are written to their path
+# with fast PNG compression. Paths the store doesn't hold are decoded from disk when asked for.
+# Frames the encoder announced with expect are dropped from memory once it has read them, so the budget
+# bounds the job's memory whatever the number of vehicles.
+FRAME_STORE_PERSIST = os.getenv("FRAME_STORE_PERSIST", "").lower() in ("1", "true", "yes")
+FRAME_STORE_MEMORY_MB = int(os.getenv("FRAME_STORE_MEMORY_MB", "256"))
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+
+# Letterbox an RGB array into the target size, keeping its aspect ratio
+def fit_frame(frame, size=(1920, 1080)):
+    h, w = frame.shape[:2]
+    if (w, h) == tuple(size):
+        return frame
+    scale = min(size[0] / w, size[1] / h)
+    new_w, new_h = max(1, int(w * scale)), max(1, int(h * scale))
+    canvas = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+    y_offset, x_offset = (size[1] - new_h) // 2, (size[0] - new_w) // 2
+    canvas[y_offset:y_offset + new_h, x_offset:x_offset + new_w] = cv2.resize(
+        frame, (new_w, new_h), interpolation=cv2.INTER_AREA)
+    return canvas
+
+
+# Decode an image file straight to an RGB frame of the video size
+def decode_frame(path, size=(1920, 1080)):
+    with Image.open(path) as image:
+        return fit_frame(np.asarray(image.convert("RGB")), size)
+
+
+def save_frame(frame, path):
+    folder = os.path.dirname(path)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder, exist_ok=True)
+    if path.lower().endswith(".png"):
+        Image.fromarray(frame).save(path, compress_level=1)
+    else:
+        Image.fromarray(frame).save(path, quality=95)
+    return path
+
+
+class FrameStore:
+    def __init__(self, size=(1920, 1080), persist=FRAME_STORE_PERSIST, memory_mb=FRAME_STORE_MEMORY_MB):
+        self.size = tuple(size)
+        self.persist = persist
+        self.memory_limit = memory_mb * 1024 ** 2
+        self.memory = 0
+        self._frames = {}
+        self._uses = {}  # path -> reads announced by expect and not released yet
+        self._lock = threading.Lock()
+
+    # Keep a rendered frame (RGB array) under the path it would be saved to
+    def put(self, path, frame):
+        frame = fit_frame(np.ascontiguousarray(frame[..., :3]), self.size)
+        frame.setflags(write=False)
+        with self._lock:
+            in_memory = self.memory + frame.nbytes <= self.memory_limit
+            if in_memory:
+                self._frames[path] = frame
+                self.memory += frame.nbytes
+        if self.persist or not in_memory:
+            save_frame(frame, path)
+        return path
+
+    def get(self, path):
+        frame = self._frames.get(path)
+        if frame is None:
+            frame = decode_frame(path, self.size)
+            frame.setflags(write=False)
+        return frame
+
+    # Paths that are going to be read, once per entry (see release)
+    def expect(self, paths):
+        with self._lock:
+            for path in paths:
+                self._uses[path] = self._uses.get(path, 0) + 1
+
+    # One expected read of the path is done; after the last one the frame is dropped from memory. A frame
+    # that is dropped and wasn't written to disk can't be read again.
+    def release(self, path):
+        with self._lock:
+            uses = self._uses.get(path)
+            if uses is None:
+                return
+            if uses > 1:
+                self._uses[path] = uses - 1
+                return
+            del self._uses[path]
+            frame = self._frames.pop(path, None)
+            if frame is not None:
+                self.memory -= frame.nbytes
+
+    # Whether the frame is held in memory
+    def __contains__(self, path):
+        return path in self._frames
+
+    # Image paths in a folder: frames kept for it and files on disk, unsorted
+    def paths(self, folder):
+        with self._lock:
+            paths = {path for path in self._frames if os.path.dirname(path) == folder}
+        if os.path.isdir(folder):
+            paths.update(os.path.join(folder, f) for f in os.listdir(folder) if f.lower().endswith(IMAGE_EXTENSIONS))
+        return list(paths)
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self._uses.clear()
+            self.memory = 0
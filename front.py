@@ -1,13 +1,15 @@
 import xlsxwriter
-import requests
 import os
 import streamlit as st
-from PIL import Image, ImageChops
-from rembg import remove
+from bg_removal import remove_backgrounds
+from downloader import download_files
+from tts_cache import get_tts_cache
+from tts_scheduler import get_tts_scheduler
+from vehicle_data import get_driveaway_data, get_video_images, fetch_many
+from workspace import session_workspace
 from dotenv import load_dotenv
 from groq import Groq
 from elevenlabs import VoiceSettings
-from elevenlabs.client import ElevenLabs
 import shutil
 import re
 
@@ -25,77 +27,44 @@ def clear_old_files(folder_path):
             except Exception as e:
                 print(f"Failed to delete {file_path}. Reason: {e}")
 
-def download_and_save_images(vehicle_number, image_links):
-    folder_name = f"car/{vehicle_number}"
+# Function to map a vehicle's image links to the files they are saved as, after clearing the old ones
+def image_download_tasks(vehicle_number, image_links, workspace):
+    folder_name = workspace.folder("car", vehicle_number)
     clear_old_files(folder_name)
-    if not os.path.exists(folder_name):
-        os.makedirs(folder_name)
     image_mapping = {
         "Front Left": "1",
         "Left Side": "2",
         "Right Side": "3",
         "Front right": "4"
     }
+    tasks = []
     for link in image_links:
-        try:
-            car_side = link.split('/')[-1].split('_')[0].replace('%20', ' ')
-            if car_side in image_mapping:
-                image_number = image_mapping[car_side]
-                image_name = f"{image_number}.png"
-                image_path = os.path.join(folder_name, image_name)
-                img_data = requests.get(link).content
-                with open(image_path, 'wb') as handler:
-                    handler.write(img_data)
-                remove_background(image_path)
-                print(f"Downloaded and saved {image_name} for {car_side}")
-            else:
-                print(f"Skipping unrecognized car side: {car_side}")
-        except Exception as e:
-            print(f"Error processing link: {link}, Error: {e}")
-
-def trim_image(image):
-    transparent_bg = Image.new("RGBA", image.size, (0, 0, 0, 0))
-    bbox = ImageChops.difference(image, transparent_bg).getbbox()
-    if bbox:
-        return image.crop(bbox)
-    return image
-
-def remove_background(image_path):
-    input_image = Image.open(image_path).convert("RGBA")
-    output_image = remove(input_image)
-    output_image = trim_image(output_image)
-    output_image.save(image_path, "PNG")
-    return image_path
+        car_side = link.split('/')[-1].split('_')[0].replace('%20', ' ')
+        if car_side in image_mapping:
+            image_name = f"{image_mapping[car_side]}.png"
+            tasks.append((link, os.path.join(folder_name, image_name)))
+        else:
+            print(f"Skipping unrecognized car side: {car_side}")
+    return tasks
+
+# Function to download the images of every (vehicle_number, image_links) pair concurrently
+def download_all_vehicle_images(vehicle_links, workspace):
+    tasks = []
+    for vehicle_number, image_links in vehicle_links:
+        tasks += image_download_tasks(vehicle_number, image_links, workspace)
+    saved_paths = []
+    for result in download_files(tasks):
+        if result.error is not None:
+            print(f"Error processing link: {result.url}, Error: {result.error}")
+        else:
+            saved_paths.append(result.path)
+    return saved_paths
 
 def rc_detail(car_number):
-    url = "https://crm.nxcar.in/api/driveaway_data"
-    payload = {
-        "vehiclenumber": car_number
-    }
-    headers = {
-        "Content-Type": "application/json"
-    }
-    response = requests.post(url, json=payload, headers=headers)
-    if response.status_code == 200:
-        return response.json()
-    else:
-        print(f"Error: {response.status_code}")
-        return None
+    return get_driveaway_data(car_number)
 
 def get_info(car_number):
-    url = "https://crm.nxcar.in/api/fetchCarVideoImages"
-    payload = {
-        "vehiclenumber": car_number
-    }
-    headers = {
-        "Content-Type": "application/json"
-    }
-    response = requests.post(url, json=payload, headers=headers)
-    if response.status_code == 200:
-        return response.json()
-    else:
-        print(f"Error: {response.status_code}")
-        return None
+    return get_video_images(car_number)
 
 def generate_script(prompt):
     client = Groq(api_key=os.getenv("GROQ_API_KEY"))
@@ -113,24 +82,31 @@ def generate_script(prompt):
     return response.choices[0].message.content.strip()
 
 def text_to_speech(text, filename, voice_id):
-    client = ElevenLabs(api_key=os.getenv("ELEVEN_LABS_API"))
-    response = client.text_to_speech.convert(
+    model_id = "eleven_multilingual_v2"
+    output_format = "mp3_22050_32"
+    voice_settings = VoiceSettings(
+        stability=0.50,
+        similarity_boost=.30,
+        style=0.15,
+        use_speaker_boost=True,
+    )
+    cache = get_tts_cache()
+    key = cache.key(text, voice_id, model_id, output_format, voice_settings)
+    cached = cache.get(key)
+    if cached is not None:
+        shutil.copyfile(cached[0], filename)
+        return cached[1]
+    audio = get_tts_scheduler(os.getenv("ELEVEN_LABS_API")).convert(
         voice_id=voice_id,
         optimize_streaming_latency="0",
-        output_format="mp3_22050_32",
+        output_format=output_format,
         text=text,
-        model_id="eleven_multilingual_v2",
-        voice_settings=VoiceSettings(
-            stability=0.50,
-            similarity_boost=.30,
-            style=0.15,
-            use_speaker_boost=True,
-        ),
+        model_id=model_id,
+        voice_settings=voice_settings,
     )
     with open(filename, "wb") as f:
-        for chunk in response:
-            if chunk:
-                f.write(chunk)
+        f.write(audio)
+    return cache.put(key, filename, output_format)[1]
 
 def main():
     st.title("Nxcar Vehicle Promotion Script Generator")
@@ -153,7 +129,9 @@ def main():
 
     if st.button("Generate Scripts"):
         if 'scripts_generated' not in st.session_state or not st.session_state['scripts_generated']:
-            workbook = xlsxwriter.Workbook('dealer_cars.xlsx')
+            # Every run starts a new job with its own workspace, the previous one is removed
+            workspace = session_workspace(st.session_state, new=True)
+            workbook = xlsxwriter.Workbook(workspace.path('dealer_cars.xlsx'))
             worksheet = workbook.add_worksheet()
             columns = [
                 'Dealer Name', 'Make', 'Model Variant', 'Year', 'Distance',
@@ -164,12 +142,17 @@ def main():
                 worksheet.write(0, col_num, header)
             row_index = 1
             scripts = {}
-            for vehiclenumber in vehicle_numbers:
-                car_info = get_info(vehiclenumber)
+            vehicle_links = []
+            # Fetch the image links and RC details of all vehicles in parallel
+            vehicle_data = fetch_many(lambda vn: (get_info(vn), rc_detail(vn)), vehicle_numbers)
+            for vehiclenumber, (car_info, _) in zip(vehicle_numbers, vehicle_data):
                 if car_info and 'downloadLinks' in car_info:
                     print(f"Vehicle: {vehiclenumber}")
-                    download_and_save_images(vehiclenumber, car_info['downloadLinks'])
-                car_info = rc_detail(vehiclenumber)
+                    vehicle_links.append((vehiclenumber, car_info['downloadLinks']))
+            downloaded_images = download_all_vehicle_images(vehicle_links, workspace)
+            # Remove the backgrounds of all vehicles' photos together, in place
+            remove_backgrounds([(image_path, image_path) for image_path in downloaded_images])
+            for vehiclenumber, (_, car_info) in zip(vehicle_numbers, vehicle_data):
                 if car_info:
                     make = car_info.get('rc_report_generate', {}).get('vehicleManufacturerName', 'N/A')
                     model_variant = car_info.get('rc_report_generate', {}).get('model', 'N/A')
@@ -181,19 +164,18 @@ def main():
                     owner = str(car_info.get('ownership', 'N/A')) + " Owner"
                     colour = car_info.get('rc_report_generate', {}).get('vehicleColour', 'N/A')
                     fuel = car_info.get("fuelType", 'N/A')
+                    image_paths = [
+                        workspace.path("car", vehiclenumber, "2.png"),
+                        workspace.path("car", vehiclenumber, "3.png"),
+                        workspace.path("car", vehiclenumber, "4.png")
+                    ]
                     data = [
                         dealer_name, make, model_variant, year, distance,
-                        reg_date, list_price, offer_price, owner, colour, fuel,
-                        f"car/{vehiclenumber}/2.png", f"car/{vehiclenumber}/3.png", f"car/{vehiclenumber}/4.png"
-                    ]
+                        reg_date, list_price, offer_price, owner, colour, fuel
+                    ] + image_paths
                     for col_num, value in enumerate(data):
                         if col_num < len(columns) - 3:
                             worksheet.write(row_index, col_num, value)
-                    image_paths = [
-                        f"car/{vehiclenumber}/2.png",
-                        f"car/{vehiclenumber}/3.png",
-                        f"car/{vehiclenumber}/4.png"
-                    ]
                     for i, path in enumerate(image_paths, start=11):
                         if os.path.exists(path):
                             worksheet.insert_image(row_index, i, path)
@@ -223,29 +205,33 @@ def main():
         st.session_state['scripts'] = updated_scripts
 
         if st.button("Generate Audio Files") and not st.session_state.get('audio_generated', False):
-            output_folder = "output_audio"
-            if not os.path.exists(output_folder):
-                os.makedirs(output_folder)
-            else:
-                clear_old_files(output_folder)
-            for vehiclenumber, script in updated_scripts.items():
-                car_info = rc_detail(vehiclenumber)
+            output_folder = session_workspace(st.session_state).folder("output_audio")
+            clear_old_files(output_folder)
+            # Served from the vehicle data cache filled during script generation
+            car_details = fetch_many(rc_detail, updated_scripts)
+            tts_jobs = []
+            for (vehiclenumber, script), car_info in zip(updated_scripts.items(), car_details):
                 model_variant = car_info.get('rc_report_generate', {}).get('model', vehiclenumber) if car_info else vehiclenumber
                 clean_variant = re.sub(r'[\\/]', '', model_variant)
                 tts_filename = f"{output_folder}/{clean_variant}_script.mp3"
-                text_to_speech(script, tts_filename, voice_id="bUTE2M5LdnqaUCd5tJB3")
+                tts_jobs.append((script, tts_filename))
             intro_filename = f"{output_folder}/intro_script.mp3"
-            text_to_speech(st.session_state['intro_script'], intro_filename, voice_id="bUTE2M5LdnqaUCd5tJB3")
+            tts_jobs.append((st.session_state['intro_script'], intro_filename))
+            # Synthesize the intro and every vehicle script concurrently
+            get_tts_scheduler(os.getenv("ELEVEN_LABS_API")).map(
+                lambda job: text_to_speech(job[0], job[1], voice_id="bUTE2M5LdnqaUCd5tJB3"), tts_jobs)
             st.session_state['audio_generated'] = True
             st.success("Audio files generated successfully.")
 
     # Ensure the download button for the Excel file is always visible after scripts are generated
     if 'scripts_generated' in st.session_state and st.session_state['scripts_generated']:
-        with open("dealer_cars.xlsx", "rb") as f:
-            st.download_button("Download Excel File", f, file_name="dealer_cars.xlsx")
+        excel_path = session_workspace(st.session_state).path("dealer_cars.xlsx")
+        if os.path.exists(excel_path):
+            with open(excel_path, "rb") as f:
+                st.download_button("Download Excel File", f, file_name="dealer_cars.xlsx")
 
     if st.session_state.get('audio_generated', False):
-        output_folder = "output_audio"
+        output_folder = session_workspace(st.session_state).folder("output_audio")
         for file in os.listdir(output_folder):
             if file.endswith(".mp3"):
                 with open(os.path.join(output_folder, file), "rb") as f:
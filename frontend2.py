@@ -1,121 +1,195 @@
 import os
 import streamlit as st
-import requests
 from elevenlabs import VoiceSettings
-from elevenlabs.client import ElevenLabs
 import moviepy.editor as mp
 from dotenv import load_dotenv
 from groq import Groq
-import textwrap
 import re
-from PIL import Image, ImageDraw, ImageFont, ImageChops
-import cv2
+from PIL import Image
 import numpy as np
-import io
+import time
+import json
 import tempfile
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
-from rembg import remove
+import subprocess
+from bg_removal import remove_backgrounds, REMBG_TIER, REMBG_DECODE_SIDE
+from downloader import download_files
+from audio_track import MasterAudio
+from ffmpeg_encoder import encode_segments, concat_segments, segment_length, ffmpeg_binary, ENCODE_WORKERS
+from frame_source import StillsClip
+from frame_store import FrameStore
+from subtitles import caption_band, caption_at, burn_caption, caption_style
+from segment_cache import get_segment_cache, file_digest
+from turntable import turntable_shots, frame_uses, TurntableLoader, TURNTABLE_VIEW_CACHE, TURNTABLE_BLEND
+from tts_cache import get_tts_cache, audio_duration
+from tts_scheduler import get_tts_scheduler
+from vehicle_data import get_driveaway_data, get_video_images, get_banner_image, fetch_many
 import shutil
+from renderer_pool import get_renderer_pool
+from job_queue import get_job_queue, ensure_workers
+from tracing import span, add_span, load_trace
+import compositor
+
+try:
+    import pyttsx3  # optional local voice for preview drafts
+except ImportError:
+    pyttsx3 = None
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Function to get car information from the API
-def carscope_details(car_number):
-    url = "https://crm.nxcar.in/api/driveaway_data"
-    payload = {"vehiclenumber": car_number}
-    headers = {"Content-Type": "application/json"}
-    response = requests.post(url, json=payload, headers=headers)
-    
-    if response.status_code == 200:
-        return response.json()
-    else:
-        st.error(f"Error: Received {response.status_code} status code")
-        return None
-
-# Function to get car information from the API
-def fetch_images(car_number):
-    url = "https://crm.nxcar.in/api/fetchCarVideoImages"
-    payload = {
-        "vehiclenumber": car_number
-    }   
-    headers = {
-        "Content-Type": "application/json"
-    }
-    response = requests.post(url, json=payload, headers=headers)
-    if response.status_code == 200:
-        data = response.json()
-        return data
-    else:
-        print(f"Error: {response.status_code}")
-        return None
-    
+# Frame engine: "native" composites the cards with Pillow/NumPy, "html" screenshots the templates in Chrome
+FRAME_ENGINE = os.getenv("FRAME_ENGINE", "native")
 
-def banner_image(car_number):
-    output_folder = r"video_images"
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
-    url = "https://crm.nxcar.in/api/fetchBannerImage"
-    payload = {
-        "vehiclenumber": car_number
-    }   
-    headers = {
-        "Content-Type": "application/json"
-    }
-    response = requests.post(url, json=payload, headers=headers)
-    if response.status_code == 200:
-        image_data = response.content
-        if image_data:
-            output_image_path = r"video_images\1.png"
-            with open(output_image_path, 'wb') as file:
-                file.write(image_data)
-            print(f"Image saved at {output_image_path}")
-    else:
-        print(f"Error: {response.status_code}")
-        return None
+# Video backend: "ffmpeg" encodes the stills in one ffmpeg run, "moviepy" renders them frame by frame
+VIDEO_BACKEND = os.getenv("VIDEO_BACKEND", "ffmpeg")
 
-def generate_script(prompt):
-    client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+# Closing card shown with the last line of the script
+CLOSING_IMAGE = os.getenv("CLOSING_IMAGE", r"C:\Users\hp\NXcar\Video\image_2\image22.png")
+
+# Preview renders: small frames, few of them and the fastest x264 preset, to check timing and captions
+PREVIEW_SIZE = tuple(int(v) for v in os.getenv("PREVIEW_SIZE", "640x360").split("x"))
+PREVIEW_FPS = int(os.getenv("PREVIEW_FPS", "12"))
+PREVIEW_PRESET = os.getenv("PREVIEW_PRESET", "ultrafast")
+# Background removal tier of previews (see bg_removal.REMBG_TIERS), full renders use REMBG_TIER
+REMBG_PREVIEW_TIER = os.getenv("REMBG_PREVIEW_TIER", "fast")
+DRAFT_WORDS_PER_SECOND = 2.5
+
+# Stages a video job reports while it runs in a worker, in order
+VIDEO_JOB_STAGES = ["queued", "fetch", "tts", "download", "frames", "encode", "done"]
+
+# Function to get a vehicle's details and image links from the API, either one is None when it can't be fetched
+def fetch_vehicle(car_number):
+    return get_driveaway_data(car_number), get_video_images(car_number)
+
+def banner_image(car_number, workspace):
+    output_folder = workspace.folder("video_images")
+    image_data = get_banner_image(car_number)
+    if image_data:
+        output_image_path = os.path.join(output_folder, "1.png")
+        with open(output_image_path, 'wb') as file:
+            file.write(image_data)
+        print(f"Image saved at {output_image_path}")
+
+def script_messages(prompt):
     system_prompt = {
         "role": "system",
         "content": "You are a helpful assistant. You generate concise and clear scripts for vehicle promotions."
     }
-    chat_history = [system_prompt, {"role": "user", "content": prompt}]
-    
+    return [system_prompt, {"role": "user", "content": prompt}]
+
+def generate_script(prompt):
+    client = Groq(api_key=os.getenv("GROQ_API_KEY"))
     response = client.chat.completions.create(
         model="llama3-70b-8192",
-        messages=chat_history,
+        messages=script_messages(prompt),
         max_tokens=500,
         temperature=1.3
     )
 
     return response.choices[0].message.content.strip()
 
-def trim_image(image, target_size=(3840, 2160)):
-    bbox = ImageChops.difference(image, Image.new(image.mode, image.size, (0, 0, 0, 0))).getbbox()
-    if bbox:
-        return image.crop(bbox)  # Crop the image based on the bounding box
-    return image
-
-# Function to extract the 7th and 8th images and generate frames (using frame2, frame3, and frame4)
-def process_vehicle_images(vehicle_folders, car_infos):
-    output_folder = r"video_images"
+# Function to generate the script as a stream of text chunks, in the order Groq writes them
+def generate_script_stream(prompt):
+    client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+    stream = client.chat.completions.create(
+        model="llama3-70b-8192",
+        messages=script_messages(prompt),
+        max_tokens=500,
+        temperature=1.3,
+        stream=True
+    )
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+# Function to voice a script line in the background while the rest of the script is still being written.
+# The audio only fills the TTS cache, so "Create Video" finds it there if the line is kept as it is.
+def speculative_speech(text, voice_id):
+    fd, filename = tempfile.mkstemp(suffix=".mp3")
+    os.close(fd)
+    try:
+        with span("tts.speculative"):
+            text_to_speech(text, filename, voice_id)
+    except Exception as e:
+        print(f"Speculative TTS failed for '{text[:40]}'. Reason: {e}")
+    finally:
+        os.remove(filename)
+
+# Pass the script chunks through unchanged and send every finished ';' line to speculative_speech
+def speculate_tts(chunks, voice_id):
+    scheduler = get_tts_scheduler(os.getenv("ELEVENLABS_API_KEY"))
+    pending = ""
+    for chunk in chunks:
+        yield chunk
+        pending += chunk
+        *lines, pending = pending.split(';')
+        for line in lines:
+            if line.strip():
+                scheduler.submit(speculative_speech, line.strip(), voice_id)
+    if pending.strip():
+        scheduler.submit(speculative_speech, pending.strip(), voice_id)
+
+# Function to remove the background from every view of every vehicle in one batch, with the given
+# bg_removal tier (REMBG_TIER by default)
+def cutout_vehicle_images(vehicle_folders, workspace, tier=None):
+    cutout_folder = workspace.folder("cutouts")
+    removal_jobs, job_keys = [], []
+    for vehicle_folder in vehicle_folders:
+        vehicle_cutout_folder = os.path.join(cutout_folder, os.path.basename(vehicle_folder))
+        if not os.path.exists(vehicle_cutout_folder):
+            os.makedirs(vehicle_cutout_folder)
+        for file in os.listdir(vehicle_folder):
+            if file.lower().endswith(('.png', '.jpg', '.jpeg')):
+                # Each cutout gets its own file so all frames can be rendered together later
+                cutout_path = os.path.join(vehicle_cutout_folder, f"{os.path.splitext(file)[0]}.png")
+                removal_jobs.append((os.path.join(vehicle_folder, file), cutout_path))
+                job_keys.append((vehicle_folder, file))
+
+    cutouts = {vehicle_folder: {} for vehicle_folder in vehicle_folders}
+    # Cutouts are only drawn inside the frame templates, so they are made no larger than those need.
+    # The stage's CPU time leaves out the worker pool, the per-vehicle spans carry what the workers spent.
+    with span("rembg", images=len(removal_jobs)):
+        results = remove_backgrounds(removal_jobs, fit=compositor.CUTOUT_BOXES, tier=tier)
+    timings = {vehicle_folder: [0.0, 0.0, 0] for vehicle_folder in vehicle_folders}
+    for (vehicle_folder, file), result in zip(job_keys, results):
+        cutouts[vehicle_folder][file] = result.path
+        timings[vehicle_folder][0] += result.seconds
+        timings[vehicle_folder][1] += result.cpu
+        timings[vehicle_folder][2] += result.path is None
+    for vehicle_folder, (seconds, cpu, failed) in timings.items():
+        add_span("rembg.vehicle", seconds, cpu, vehicle=folder_vehicle(vehicle_folder),
+                 images=len(cutouts[vehicle_folder]), failed=failed)
+    return cutouts
+
+# Function to extract the 7th and 8th images and generate frames (using frame2, frame3, and frame4).
+# Returns the folder of turntable views for each vehicle, the downloaded photos are left untouched.
+# With a frame store the rendered frames are kept in it under their paths instead of being saved.
+def process_vehicle_images(vehicle_folders, car_infos, workspace, frames=None, tier=None):
+    output_folder = workspace.folder("video_images")
+    turntable_root = workspace.folder("turntables")
+    turntable_folders = []
     # Check if output folder exists, if not, create it
     
     
     
     image_counter = 2  # Start the image naming from 1
+    frame_jobs = []  # (template, args, output path) for every frame of every vehicle, rendered as one batch
+    job_vehicles = []  # vehicle folder of each frame job
     if len(vehicle_folders)==0:
         print("Vehicle images list is null")
+
+    # Segment the views of all vehicles concurrently; the 7th and 8th cutouts are reused for frame2-4
+    all_cutouts = cutout_vehicle_images([folder for folder in vehicle_folders if len(os.listdir(folder)) >= 8],
+                                        workspace, tier)
+
     for vehicle_folder, car_info in zip(vehicle_folders, car_infos):
         print(f"Processing vehicle folder: {vehicle_folder}")
         
         # List all files in the current vehicle folder
         files = sorted(os.listdir(vehicle_folder), key=natural_sort_key)
         print(f"Found {len(files)} files in folder: {vehicle_folder}")
+        cutouts = all_cutouts.get(vehicle_folder, {})
+        turntable_folder = vehicle_folder
         
         # Ensure there are at least 8 images per vehicle
         if len(files) >= 8:
@@ -125,32 +199,29 @@ def process_vehicle_images(vehicle_folders, car_infos):
 
             print(f"7th Image Path: {seventh_image_path}, 8th Image Path: {eighth_image_path}")
 
-            # Remove background from the 8th image and process through frame2 and frame3
-            eighth_image_no_bg = remove_background(eighth_image_path)
+            # Process the 8th image cutout through frame2 and frame3
+            eighth_image_no_bg = cutouts.get(files[7])
 
             if eighth_image_no_bg is not None:
                 print(f"Processing 8th image for {vehicle_folder} through frame2")
-                frame2_html = frame2(car_info, eighth_image_no_bg)
                 output_image_2 = os.path.join(output_folder, f"{image_counter}.png")
-                html_to_image(frame2_html, output_image_2)
+                frame_jobs.append(("frame2", (car_info, eighth_image_no_bg), output_image_2))
                 image_counter += 1
 
                 print(f"Processing 8th image for {vehicle_folder} through frame3")
-                frame3_html = frame3(car_info, eighth_image_no_bg)
                 output_image_3 = os.path.join(output_folder, f"{image_counter}.png")
-                html_to_image(frame3_html, output_image_3)
+                frame_jobs.append(("frame3", (car_info, eighth_image_no_bg), output_image_3))
                 image_counter += 1
             else:
                 print(f"Failed to remove background for 8th image: {eighth_image_path}")
 
-            # Remove background from the 7th image and process through frame4
-            seventh_image_no_bg = remove_background(seventh_image_path)
+            # Process the 7th image cutout through frame4
+            seventh_image_no_bg = cutouts.get(files[6])
 
             if seventh_image_no_bg is not None:
                 print(f"Processing 7th image for {vehicle_folder} through frame4")
-                frame4_html = frame4(car_info, seventh_image_no_bg)
                 output_image_4 = os.path.join(output_folder, f"{image_counter}.png")
-                html_to_image(frame4_html, output_image_4)
+                frame_jobs.append(("frame4", (car_info, seventh_image_no_bg), output_image_4))
                 image_counter += 1
             else:
                 print(f"Failed to remove background for 7th image: {seventh_image_path}")
@@ -158,31 +229,49 @@ def process_vehicle_images(vehicle_folders, car_infos):
             print(f"Processed {vehicle_folder} - 7th and 8th images")
 
             # Process all images in the folder using frame5 (3D perspective)
-            # images_3d = "3d_images" 
-            # if not os.path.exists(images_3d):
-            #     os.makedirs(images_3d)
+            turntable_folder = os.path.join(turntable_root, os.path.basename(vehicle_folder))
+            if not os.path.exists(turntable_folder):
+                os.makedirs(turntable_folder)
             for file in files:
                 image_path = os.path.join(vehicle_folder, file)
-                if image_path.lower().endswith(('.png', '.jpg', '.jpeg')):
-                    image_no_bg = remove_background(image_path)
+                if file in cutouts:
+                    image_no_bg = cutouts[file]
                     if image_no_bg is not None:
                         print(f"Processing {file} through frame5 for 3D perspective")
-                        frame5_html = frame5(image_no_bg)
-                        output_image_5 = os.path.join(vehicle_folder, f"{file}")
-                        html_to_image(frame5_html, output_image_5)
+                        output_image_5 = os.path.join(turntable_folder, f"{file}")
+                        frame_jobs.append(("frame5", (image_no_bg,), output_image_5))
                     else:
                         print(f"Failed to remove background for image: {image_path}")
         else:
             print(f"Skipping {vehicle_folder} - not enough images (found {len(files)} images).")
-
-    last_image(output_folder, image_counter)
-
-
-def last_image(output_folder, count):
+        turntable_folders.append(turntable_folder)
+        job_vehicles += [vehicle_folder] * (len(frame_jobs) - len(job_vehicles))
+
+    # Render the frames of all vehicles together so they are worked on in parallel
+    timings = {}
+    with span("render", frames=len(frame_jobs)):
+        render_frames(frame_jobs, frames, timings)
+    vehicle_timings = {}
+    for (_, _, output_path), vehicle_folder in zip(frame_jobs, job_vehicles):
+        seconds, cpu = timings.get(output_path, (0.0, 0.0))
+        totals = vehicle_timings.setdefault(vehicle_folder, [0.0, 0.0, 0])
+        totals[0] += seconds
+        totals[1] += cpu
+        totals[2] += 1
+    for vehicle_folder, (seconds, cpu, count) in vehicle_timings.items():
+        add_span("render.vehicle", seconds, cpu, vehicle=folder_vehicle(vehicle_folder), frames=count)
+    last_image(output_folder, image_counter, frames)
+    return turntable_folders
+
+
+def last_image(output_folder, count, frames=None):
     output_path = os.path.join(output_folder, f"{count}.png")
-    input_path = r"C:\Users\hp\NXcar\Video\image_2\image22.png"
+    input_path = CLOSING_IMAGE
     image = Image.open(input_path)
-    
+    if frames is not None:
+        frames.put(output_path, np.asarray(image.convert("RGB")))
+        return
+
     # Save the image to the output path
     image.save(output_path)
     
@@ -193,42 +282,9 @@ def natural_sort_key(s):
     return [int(c) if c.isdigit() else c for c in re.split(r'(\d+)', s)]
 
 
-def html_to_image(html_code, output_path, width=1920, height=1080):
-    # Create a temporary HTML file
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.html', delete=False) as f:
-        f.write(html_code)
-        temp_html_path = f.name
-
-    # Set up Chrome options
-    chrome_options = Options()
-    chrome_options.add_argument("--headless")  # Run in headless mode
-    chrome_options.add_argument(f"--window-size={width},{height}")
-
-    # Set up the Chrome driver
-    service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=chrome_options)
-
-    try:
-        # Load the HTML file
-        driver.get(f"file://{temp_html_path}")
-
-        # Set the viewport size
-        driver.set_window_size(width, height)
-
-        # Capture the screenshot
-        screenshot = driver.get_screenshot_as_png()
-
-        # Convert the screenshot to an image
-        image = Image.open(io.BytesIO(screenshot))
-
-        # Save the image
-        image.save(output_path)
-        print(f"Image saved successfully: {output_path}")
-
-    finally:
-        # Close the browser and remove the temporary file
-        driver.quit()
-        os.unlink(temp_html_path)
+# Function to render a batch of (html_code, output_path) frames in parallel
+def html_to_images(jobs, store=None, timings=None):
+    return get_renderer_pool().render_batch(jobs, store, timings)
 
 def frame2(car_info,image):
     html_template = f"""
@@ -684,53 +740,28 @@ def frame5(image):
     """
     return html_template
 
-# Function to remove the background from images after they are downloaded
-def create_subtitle(text, start, end, video_size):
-    font_size = 30
-    font = ImageFont.truetype("arial.ttf", font_size)
-    
-    img = Image.new('RGBA', video_size, (0, 0, 0, 0))
-    draw = ImageDraw.Draw(img)
-    
-    max_width = video_size[0] - 40
-    lines = textwrap.wrap(text, width=int(max_width / (font_size * 0.6)))
-    
-    total_text_height = sum([draw.textbbox((0, 0), line, font=font)[3] for line in lines])
-    background_height = int(1.5 * total_text_height)
-    
-    background_top = video_size[1] - background_height - 10
-    background_bottom = video_size[1] - 10
-    draw.rectangle([(0, background_top), (video_size[0], background_bottom)], fill="black")
-    
-    y_text = background_top + (background_height - total_text_height) // 2
-    for line in lines:
-        line_width, line_height = draw.textbbox((0, 0), line, font=font)[2:]
-        text_position = ((video_size[0] - line_width) // 2, y_text)
-        draw.text(text_position, line, font=font, fill="white")
-        y_text += line_height
-    
-    return mp.ImageClip(np.array(img)).set_duration(end - start).set_start(start).set_end(end).set_position(("center", "bottom"))
-
-
-def remove_background(image_path):
-    output_path = "C:/Users/hp/NXcar/Video/image_no_bg.png"
-    input_image = Image.open(image_path)
-    # Remove the background
-    output_image = remove(input_image)
-    output_image = trim_image(output_image)
-    # Save the output image
-    output_image.save(output_path)
-    return output_path
-
-# Function to download images from the given URL and save them with specific names
-def download_images(vehicle_number, image_links, folder_list):
-    folder_name = f"images_{vehicle_number}"  # Folder for the specific vehicle number
-
-    # Create folder if it doesn't exist
-    if not os.path.exists(folder_name):
-        os.makedirs(folder_name)
-
-    folder_list.append(folder_name)
+HTML_FRAMES = {
+    "frame2": frame2,
+    "frame3": frame3,
+    "frame4": frame4,
+    "frame5": frame5,
+}
+
+# Function to render (template, args, output_path) frame jobs with the configured engine; timings, if given,
+# gets output_path -> (wall, CPU seconds) of each frame
+def render_frames(frame_jobs, store=None, timings=None):
+    html_jobs = frame_jobs
+    if FRAME_ENGINE == "native":
+        results = compositor.render_batch(frame_jobs, store=store, timings=timings)
+        # Anything the native engine can't draw (e.g. an SVG background without cairosvg) falls back to Chrome
+        html_jobs = [job for job, result in zip(frame_jobs, results) if result is None]
+    return html_to_images([(HTML_FRAMES[name](*args), output_path) for name, args, output_path in html_jobs], store,
+                          timings)
+
+
+# Function to map a vehicle's image links to the files they are saved as
+def image_download_tasks(vehicle_number, image_links, workspace):
+    folder_name = workspace.folder(f"images_{vehicle_number}")  # Folder for the specific vehicle number
 
     # Map the car sides to the corresponding image names
     image_mapping = {
@@ -744,115 +775,269 @@ def download_images(vehicle_number, image_links, folder_list):
         "Front right": "8"
     }
 
+    tasks = []
     for link in image_links:
-        try:
-            # Extract the car side from the URL
-            car_side = link.split('/')[-1].split('_')[0].replace('%20', ' ')
-            if car_side in image_mapping:
-                image_number = image_mapping[car_side]
-                image_name = f"{image_number}.jpg"
-                image_path = os.path.join(folder_name, image_name)
-
-                # Download the image and save it
-                img_data = requests.get(link).content
-                with open(image_path, 'wb') as handler:
-                    handler.write(img_data)
-                print(f"Downloaded and saved {image_name} for {car_side}")
-
-            else:
-                print(f"Skipping unrecognized car side: {car_side}")
-
-        except Exception as e:
-            print(f"Error processing link: {link}, Error: {e}")
+        # Extract the car side from the URL
+        car_side = link.split('/')[-1].split('_')[0].replace('%20', ' ')
+        if car_side in image_mapping:
+            image_name = f"{image_mapping[car_side]}.jpg"
+            tasks.append((link, os.path.join(folder_name, image_name)))
+        else:
+            print(f"Skipping unrecognized car side: {car_side}")
+    return folder_name, tasks
+
+# Function to get the vehicle number back from a folder made by image_download_tasks, for trace spans
+def folder_vehicle(vehicle_folder):
+    name = os.path.basename(vehicle_folder)
+    return name[len("images_"):] if name.startswith("images_") else name
+
+# Function to download the images of every (vehicle_number, image_links) pair of a job concurrently
+def download_all_images(vehicle_links, folder_list, workspace):
+    tasks, task_vehicles = [], []
+    for vehicle_number, image_links in vehicle_links:
+        folder_name, vehicle_tasks = image_download_tasks(vehicle_number, image_links, workspace)
+        folder_list.append(folder_name)
+        tasks += vehicle_tasks
+        task_vehicles += [vehicle_number] * len(vehicle_tasks)
+
+    for vehicle_number, result in zip(task_vehicles, download_files(tasks)):
+        add_span("download.image", result.seconds, vehicle=vehicle_number, bytes=result.bytes,
+                 failed=result.error is not None)
+        if result.error is not None:
+            print(f"Error processing link: {result.url}, Error: {result.error}")
         
 
-# Function to create subtitles for the video
-def resize_image(image, target_size=(1920, 1080)):
-    h, w = image.shape[:2]
-    aspect = w / h
-
-    # Calculate new dimensions to fit within the target size while maintaining aspect ratio
-    if aspect > target_size[0] / target_size[1]:
-        new_w = target_size[0]
-        new_h = int(target_size[0] / aspect)
-    else:
-        new_h = target_size[1]
-        new_w = int(target_size[1] * aspect)
-
-    resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_AREA)
+# Function to lay out the video. Each script segment gets its text, audio file, duration and the shots
+# shown while it plays: ("image", path, duration) or ("turntable", vehicle image folder, duration).
+# segments optionally adds the cache "key" and "manifest" of every segment, and the "cached" file of those
+# encoded before; no images are rendered for a cached vehicle, so it takes no cards or turntable.
+def build_timeline(script_list, audio_files, audio_durations, images, car_images, segments=None):
+    segments = segments or [{}] * len(script_list)
+    timeline = []
 
-    # Create a canvas of the target size
-    canvas = np.zeros((target_size[1], target_size[0], 3), dtype=np.uint8)
+    def add(i, shots):
+        timeline.append(dict(segments[i], text=script_list[i], audio=audio_files[i], duration=audio_durations[i],
+                             shots=shots))
 
-    # Center the resized image on the canvas
-    y_offset = (target_size[1] - new_h) // 2
-    x_offset = (target_size[0] - new_w) // 2
-
-    # Ensure the new height and width fit within the target size
-    canvas[y_offset:y_offset + new_h, x_offset:x_offset + new_w] = resized
-
-    return canvas
-
-
-# Function for creating a 3D video from images
-def video_3d(image_folder, output_file, fps=30, video_duration=None):
-    images = sorted(
-        [os.path.join(image_folder, f) for f in os.listdir(image_folder) if f.endswith(('.jpg', '.jpeg', '.png'))],
-        key=natural_sort_key
-    )
+    # First image plays with the intro
+    add(0, [("image", images[0], audio_durations[0])])
 
-    if not images:
-        print("No images found in the specified folder.")
-        return None
-
-    print(f"Total images found: {len(images)}")
+    # Middle segments: three info cards and the 3D turntable per vehicle, splitting the audio in four
+    rendered = 0
+    for i in range(1, len(script_list) - 1):
+        if segments[i].get("cached"):
+            add(i, [])
+            continue
+        segment_duration = audio_durations[i] / 4
+        shots = []
+        for j in range(4):
+            if j == 3:
+                shots.append(("turntable", car_images[rendered], segment_duration))
+            else:
+                img_index = 3 * rendered + j + 1
+                shots.append(("image", images[img_index], segment_duration))
+        rendered += 1
+        add(i, shots)
+
+    # Last image plays with the closing line
+    add(len(script_list) - 1, [("image", images[-1], audio_durations[-1])])
+    return timeline
+
+# Function to get the (start, end) and text of every segment's caption
+def timeline_subtitles(timeline):
+    subtitles, current_time = [], 0
+    for segment in timeline:
+        subtitles.append(((current_time, current_time + segment["duration"]), segment["text"]))
+        current_time += segment["duration"]
+    return subtitles
+
+# Function to check that an image can be decoded, reading only its header
+def readable_image(image_path):
+    try:
+        with Image.open(image_path):
+            return True
+    except OSError:
+        return False
 
+# Function to list the readable views of a vehicle for the turntable, in order
+def turntable_images(image_folder, frames=None):
+    if frames is not None:
+        images = sorted(frames.paths(image_folder), key=natural_sort_key)
+    else:
+        images = sorted(
+            [os.path.join(image_folder, f) for f in os.listdir(image_folder) if f.endswith(('.jpg', '.jpeg', '.png'))],
+            key=natural_sort_key
+        )
     valid_images = []
-    for i, image_path in enumerate(images):
-        frame = cv2.imread(image_path)
-        if frame is None:
-            print(f"Warning: Unable to read the image file: {image_path}")
-        else:
+    for image_path in images:
+        if (frames is not None and image_path in frames) or readable_image(image_path):
             valid_images.append(image_path)
+        else:
+            print(f"Warning: Unable to read the image file: {image_path}")
+    return valid_images
+
+# Function to turn every timeline segment into the (key, duration) stills shown back to back; a key is an
+# image path or a turntable Blend of two views, TurntableLoader gives the frame of either
+def segment_shots(timeline, frames=None, fps=30):
+    segments = []
+    for index, segment in enumerate(timeline):
+        shots, pending = [], 0
+        with span("clip_build", segment=index):
+            for kind, source, duration in segment["shots"]:
+                if kind == "turntable":
+                    views = turntable_images(source, frames)
+                    if not views:
+                        print(f"No valid images found in {source}.")
+                    # A smooth rotation through the views, closing the loop on the first one
+                    new_shots = turntable_shots(views, duration, fps) if views else []
+                elif (frames is not None and source in frames) or readable_image(source):
+                    new_shots = [(source, duration)]
+                else:
+                    print(f"Error: Unable to read the image file: {source}")
+                    new_shots = []
+                if not new_shots:
+                    # Keep the previous image on screen so the video stays in sync with the audio
+                    if shots:
+                        shots[-1] = (shots[-1][0], shots[-1][1] + duration)
+                    else:
+                        pending += duration
+                    continue
+                shots += new_shots
+                if pending:
+                    # Time of unreadable images at the start of the segment goes to the first one shown
+                    shots[0] = (shots[0][0], shots[0][1] + pending)
+                    pending = 0
+        if not shots and segments and segments[-1]:
+            shots = [(segments[-1][-1][0], segment["duration"])]
+        segments.append(shots)
+    return segments
+
+# Function to flatten the timeline into the stills of the whole video
+def timeline_shots(timeline, frames=None, fps=30):
+    return [shot for shots in segment_shots(timeline, frames, fps) for shot in shots]
+
+# Function to encode the timeline with moviepy, frame by frame in Python. master is the decoded audio of the
+# timeline's segments, decoded here when not given.
+def encode_with_moviepy(timeline, output_file, captions, fps=30, frames=None, master=None):
+    frames = frames or FrameStore()
+    master = master or MasterAudio([segment["audio"] for segment in timeline])
+    fd, audio_file = tempfile.mkstemp(suffix=".wav", dir=os.path.dirname(os.path.abspath(output_file)))
+    os.close(fd)
+    master.write(audio_file, [segment["duration"] for segment in timeline])
+    audio = mp.AudioFileClip(audio_file)
+
+    # One lazy clip for all stills: each image is decoded when the writer reaches it, and only a few
+    # decoded frames are held at a time
+    loader = TurntableLoader(frames.get)
+    final_clip = StillsClip(timeline_shots(timeline, frames, fps), loader.get).set_audio(audio)
+
+    # Draw the caption band into each frame as it is written, the rest of the frame is left alone
+    if captions:
+        subtitles = timeline_subtitles(timeline)
+        starts = [start for (start, _), _ in subtitles]
 
-    if len(valid_images) == 0:
-        print("No valid images found after filtering.")
-        return None
-
-    # Try to read the first image to get size
-    first_image = cv2.imread(valid_images[0])
-    height, width, layers = first_image.shape
-
-    video_clips = []
-    segment_duration = video_duration / (len(valid_images) + 1)
-
-    for i, image_path in enumerate(valid_images):
-        img = cv2.imread(image_path)
-        if img is None:
-            print(f"Error: Unable to read the image file: {image_path}")
-            continue
-
-        img_rgb = cv2.cvtColor(resize_image(img), cv2.COLOR_BGR2RGB)
-        video_clips.append(mp.ImageClip(img_rgb).set_duration(segment_duration))
-
-    # Append the first image at the end to create the 3D loop effect
-    img = cv2.imread(valid_images[0])
-    if img is None:
-        print(f"Error: Unable to read the image file: {valid_images[0]}")
-        return None
-    img_rgb = cv2.cvtColor(resize_image(img), cv2.COLOR_BGR2RGB)
-    video_clips.append(mp.ImageClip(img_rgb).set_duration(segment_duration))
+        def draw_caption(get_frame, t):
+            text = caption_at(subtitles, t, starts)
+            return burn_caption(get_frame(t), text) if text else get_frame(t)
 
-    final_clip = mp.concatenate_videoclips(video_clips)
-    return final_clip
+        final_clip = final_clip.fl(draw_caption, apply_to=[])
 
-# Function to create a video with images, audio, and optional 3D video generation
-def create_video_from_images_and_audio(script, output_file,car_images, voice_id, captions, fps=30):
-    image_folder = r"video_images"
+    # Write output video file, the master track is read from the WAV and closed before it is removed
+    try:
+        with span("encode", backend="moviepy"):
+            final_clip.write_videofile(output_file, fps=fps, audio_codec="aac", codec="libx264")
+    finally:
+        loader.close()
+        audio.close()
+        os.remove(audio_file)
+
+# Function to encode the timeline with ffmpeg: the intro, every vehicle and the outro are encoded in parallel
+# and joined with stream copy; each distinct still is piped to ffmpeg once. Segments encoded before are
+# taken from the segment cache, new ones with a key are added to it. master: see encode_with_moviepy.
+def encode_with_ffmpeg(timeline, output_file, captions, fps=30, video_size=(1920, 1080), frames=None,
+                       preset="medium", master=None):
+    frames = frames or FrameStore(video_size)
+    all_shots = segment_shots(timeline, frames, fps)
+    cache = get_segment_cache()
+
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(output_file))) as folder:
+        segment_files, kept, lengths, todo = [], [], [], []
+        with span("subtitles"):
+            for i, (segment, shots) in enumerate(zip(timeline, all_shots)):
+                if not segment.get("cached") and not shots:
+                    continue
+                segment_files.append(segment.get("cached") or os.path.join(folder, f"segment_{i}.mp4"))
+                kept.append(i)
+                lengths.append(segment_length(segment["duration"], fps))
+                if segment.get("cached"):
+                    continue
+                # Each segment carries its own caption band, placed at the bottom for the whole segment
+                overlays = []
+                if captions:
+                    subtitle_path = os.path.join(folder, f"subtitle_{i}.png")
+                    band, band_top = caption_band(segment["text"], video_size)
+                    Image.fromarray(band).save(subtitle_path, compress_level=1)
+                    overlays.append((subtitle_path, 0, segment["duration"], 0, band_top))
+                todo.append((segment, shots, overlays, segment_files[-1]))
+
+        with span("encode", backend="ffmpeg", segments=len(todo), reused=len(segment_files) - len(todo)):
+            # Segments are encoded side by side, so the loader keeps the views of as many vehicles. Every
+            # frame is dropped from the store once read, a turntable's views once its last blend is; the
+            # last shot of a segment is read twice.
+            loader = TurntableLoader(frames.get, TURNTABLE_VIEW_CACHE * ENCODE_WORKERS, frames.release)
+            for _, shots, _, _ in todo:
+                frames.expect(frame_uses(shots + shots[-1:]))
+                loader.expect(shots + shots[-1:])
+            try:
+                encode_segments([(shots, overlays) for _, shots, overlays, _ in todo], loader.get,
+                                [path for _, _, _, path in todo], fps=fps, size=video_size, preset=preset)
+            finally:
+                loader.close()
+            for segment, _, _, path in todo:
+                if segment.get("key"):
+                    cache.put(segment["key"], path, segment.get("manifest"))
+
+        # Every line of the soundtrack lasts exactly as long as its segment's whole frames
+        master = master or MasterAudio([segment["audio"] for segment in timeline])
+        audio_file = master.write(os.path.join(folder, "master.wav"), lengths, kept)
+        concat_segments(segment_files, audio_file, output_file)
+
+# Function to synthesize every line of the script concurrently, files stay in script order;
+# returns the audio files and their durations. The draft voice is local and doesn't call ElevenLabs.
+def synthesize_script(script_list, voice_id, workspace, draft=False):
+    audio_folder = workspace.folder("temp_audio")
+    if draft:
+        audio_files = [os.path.join(audio_folder, f"draft_{i}.wav") for i in range(len(script_list))]
+        with span("tts", segments=len(script_list), draft=True):
+            return audio_files, [draft_speech(text, audio_file) for text, audio_file in zip(script_list, audio_files)]
+
+    audio_files = [os.path.join(audio_folder, f"audio_{i}.mp3") for i in range(len(script_list))]
+    def synthesize(job):
+        segment, (text, audio_file) = job
+        with span("tts.segment", segment=segment):
+            return text_to_speech(text, audio_file, voice_id)
+
+    with span("tts", segments=len(script_list)):
+        audio_durations = get_tts_scheduler(os.getenv("ELEVENLABS_API_KEY")).map(
+            synthesize, enumerate(zip(script_list, audio_files)))
+    return audio_files, audio_durations
+
+# Function to create a video with images, audio, and optional 3D video generation.
+# audio: (audio files, durations) when the script was already synthesized; segments: see build_timeline.
+# A preview is encoded with ffmpeg at PREVIEW_SIZE and PREVIEW_FPS with a fast preset, optionally voiced by
+# the local draft voice.
+def create_video_from_images_and_audio(script, output_file,car_images, voice_id, captions, workspace, fps=30,
+                                       backend=None, progress=None, frames=None, audio=None, segments=None,
+                                       preview=False, draft_voice=False):
+    image_folder = workspace.folder("video_images")
     script_list = [item.strip() for item in script.split(';')]
+    video_size, preset = (1920, 1080), "medium"
+    if preview:
+        video_size, fps, preset, backend = PREVIEW_SIZE, PREVIEW_FPS, PREVIEW_PRESET, "ffmpeg"
 
-    images = sorted([os.path.join(image_folder, f) for f in os.listdir(image_folder)
-                     if f.lower().endswith(('.png', '.jpg', '.jpeg'))], key=natural_sort_key)
+    # Frames rendered by process_vehicle_images are taken from the store, anything else from the folder
+    frames = frames or FrameStore(video_size)
+    images = sorted(frames.paths(image_folder), key=natural_sort_key)
 
     if not images:
         print("No images found in the specified folder.")
@@ -862,128 +1047,371 @@ def create_video_from_images_and_audio(script, output_file,car_images, voice_id,
     #     print("Error: Mismatch between number of images and script segments.")
     #     return
 
-    if not os.path.exists("temp_audio"):
-        os.makedirs("temp_audio")
+    audio_folder = workspace.folder("temp_audio")
+    if audio is None:
+        if progress:
+            progress("tts")
+        audio = synthesize_script(script_list, voice_id, workspace, draft=draft_voice)
+    audio_files, _ = audio
+
+    # Decode every line once; the segment boundaries follow the decoded audio
+    master = MasterAudio(audio_files)
+    audio_durations = master.durations
+    timeline = build_timeline(script_list, audio_files, audio_durations, images, car_images, segments)
+    if progress:
+        progress("encode")
+    if (backend or VIDEO_BACKEND) == "moviepy":
+        encode_with_moviepy(timeline, output_file, captions, fps, frames, master)
+    else:
+        encode_with_ffmpeg(timeline, output_file, captions, fps, video_size, frames, preset, master)
 
-    audio_files = []
-    for i, text in enumerate(script_list):
-        audio_file = f"temp_audio/audio_{i}.mp3"
-        text_to_speech(text, audio_file, voice_id)
-        audio_files.append(audio_file)
+    cleanup_temp_files(audio_files, audio_folder)
+    print(f"Video created successfully: {output_file}")
 
-    video_clips, subtitles, current_time = [], [], 0
+# Function to describe what every segment of the video is made from, for the segment cache. Vehicle segments
+# line up with car_infos and vehicle_links only when every vehicle has details, photos and a script line;
+# otherwise they get no manifest and are always rendered. Photos are identified by their download links.
+def segment_manifests(script_list, audio_durations, voice_id, captions, car_infos, vehicle_links, workspace,
+                      fps=30, tier=REMBG_TIER, video_size=(1920, 1080), preset="medium"):
+    common = {
+        "voice_id": voice_id,
+        "captions": captions and caption_style(),
+        "fps": fps,
+        "video_size": list(video_size),
+        "preset": preset,
+        "frame_engine": FRAME_ENGINE,
+        "card_font": getattr(compositor.load_font(40), "path", None),
+        "backgrounds": [file_digest(compositor.BACKGROUND_IMAGE), file_digest(compositor.BACKGROUND_3D_IMAGE)],
+    }
 
-    # Process first image
-    img = cv2.imread(images[0])
-    if img is None:
-        print(f"Error: Unable to read the image file: {images[0]}")
-        return
+    def manifest(kind, i, **inputs):
+        return dict(common, kind=kind, text=script_list[i], duration=round(audio_durations[i], 3), **inputs)
+
+    last = len(script_list) - 1
+    manifests = [manifest("intro", 0, banner=file_digest(workspace.path("video_images", "1.png")))]
+    vehicles_line_up = len(car_infos) == len(vehicle_links) == last - 1
+    for i in range(1, last):
+        if vehicles_line_up:
+            vehiclenumber, links = vehicle_links[i - 1]
+            manifests.append(manifest("vehicle", i, vehicle=vehiclenumber, car_info=car_infos[i - 1], images=links,
+                                      cutouts=tier, cutout_boxes=compositor.CUTOUT_BOXES,
+                                      cutout_decode_side=REMBG_DECODE_SIDE, turntable_blend=TURNTABLE_BLEND))
+        else:
+            manifests.append(None)
+    manifests.append(manifest("outro", last, closing=file_digest(CLOSING_IMAGE)))
+    return manifests
+
+# Function to run the video pipeline of a job in a worker process, reporting each stage; returns the video path.
+# params: vehicle_numbers, script, voice_id, captions and optionally image_folders {vehicle number: folder},
+# preview and draft_voice (see create_video_from_images_and_audio), rembg_tier (see bg_removal.REMBG_TIERS)
+def render_video_job(params, workspace, progress):
+    vehiclenumbers = params["vehicle_numbers"]
+
+    progress("fetch")
+    vehicle_folders = []
+    car_infos = []
+    vehicle_links = []
+    with span("fetch", vehicles=len(vehiclenumbers)):
+        banner_image(vehiclenumbers[0], workspace)
+        vehicle_data = fetch_many(fetch_vehicle, vehiclenumbers)
+    for vehiclenumber, (car_info, car_images) in zip(vehiclenumbers, vehicle_data):
+        if car_info:
+            car_infos.append(car_info)
+        else:
+            print(f"Error: could not fetch details for {vehiclenumber}")
+        if car_images and 'downloadLinks' in car_images:
+            print(f"Vehicle: {vehiclenumber}")
+            vehicle_links.append((vehiclenumber, car_images['downloadLinks']))
+        else:
+            print(f"No image found for vehicle {vehiclenumber}")
+
+    # Speech comes first, the length of every segment is part of its manifest
+    progress("tts")
+    script_list = [item.strip() for item in params["script"].split(';')]
+    preview = params.get("preview", False)
+    tier = params.get("rembg_tier") or (REMBG_PREVIEW_TIER if preview else REMBG_TIER)
+    audio = synthesize_script(script_list, params["voice_id"], workspace, draft=preview and params.get("draft_voice"))
+
+    # Segments encoded earlier from the same inputs (e.g. before a script edit) are reused as they are,
+    # only the vehicles of the other segments are downloaded, segmented and rendered
+    segments = [{} for _ in script_list]
+    if VIDEO_BACKEND == "ffmpeg" and not preview and len(script_list) > 1:
+        cache = get_segment_cache()
+        manifests = segment_manifests(script_list, audio[1], params["voice_id"], params["captions"], car_infos,
+                                      vehicle_links, workspace, tier=tier)
+        for segment, manifest in zip(segments, manifests):
+            if manifest is not None:
+                segment.update(key=cache.key(manifest), manifest=manifest)
+                segment["cached"] = cache.get(segment["key"])
+        with open(workspace.path("manifest.json"), "w") as f:
+            json.dump([{"key": segment.get("key"), "reused": bool(segment.get("cached")),
+                        "inputs": segment.get("manifest")} for segment in segments], f, indent=1)
+    reused = {i - 1 for i, segment in enumerate(segments[1:-1], 1) if segment.get("cached")}
+    vehicle_links = [link for k, link in enumerate(vehicle_links) if k not in reused]
+    car_infos = [car_info for k, car_info in enumerate(car_infos) if k not in reused]
+
+    # Download the images of all vehicles at once; folders already downloaded for the batch are reused
+    progress("download")
+    shared_folders = params.get("image_folders", {})
+    downloaded_folders = []
+    with span("download"):
+        download_all_images([(vn, links) for vn, links in vehicle_links if vn not in shared_folders],
+                            downloaded_folders, workspace)
+    downloaded_folders = iter(downloaded_folders)
+    for vehiclenumber, _ in vehicle_links:
+        vehicle_folders.append(shared_folders.get(vehiclenumber) or next(downloaded_folders))
+
+    # Rendered frames stay in memory as RGB arrays until the video is encoded
+    progress("frames")
+    frames = FrameStore(PREVIEW_SIZE if preview else (1920, 1080))
+    turntable_folders = process_vehicle_images(vehicle_folders, car_infos, workspace, frames, tier)
+
+    output_file = workspace.path("preview_video.mp4" if preview else "output_video.mp4")
+    try:
+        create_video_from_images_and_audio(params["script"], output_file, turntable_folders, params["voice_id"],
+                                           params["captions"], workspace, progress=progress, frames=frames,
+                                           audio=audio, segments=segments, preview=preview)
+    finally:
+        frames.clear()
+    if not os.path.exists(output_file):
+        raise RuntimeError("No video was created, see the worker log")
+    return output_file
 
-    img_rgb = cv2.cvtColor(resize_image(img), cv2.COLOR_BGR2RGB)
-    audio = mp.AudioFileClip(audio_files[0])
-    video_clips.append(mp.ImageClip(img_rgb).set_duration(audio.duration).set_audio(audio))
-    subtitles.append(((current_time, current_time + audio.duration), script_list[0]))
-    current_time += audio.duration
+# Cleanup temporary audio files
+def cleanup_temp_files(audio_files, audio_folder):
+    for audio_file in audio_files:
+        try:
+            os.remove(audio_file)
+        except PermissionError:
+            print(f"Could not remove {audio_file}. It may still be in use.")
+    try:
+        os.rmdir(audio_folder)
+    except OSError:
+        print(f"Could not remove {audio_folder} directory. It may not be empty.")
 
-    # Process middle images and audio
-    for i in range(1, len(script_list) - 1):
-        audio = mp.AudioFileClip(audio_files[i])
-        segment_duration = audio.duration / 4
+def text_to_speech(text, filename, voice_id):
+    model_id = "eleven_multilingual_v2"  # use the turbo model for low latency
+    output_format = "mp3_22050_32"
+    voice_settings = VoiceSettings(
+        stability=0.50,
+        similarity_boost=.30,
+        style=0.15,
+        use_speaker_boost=True,
+    )
 
-        for j in range(4):
-            img_index = 3 * (i - 1) + j + 1
-            img = cv2.imread(images[img_index])
-            if img is None:
-                print(f"Error: Unable to read the image file: {images[img_index]}")
-                continue
+    # Unchanged segments are served from the audio cache without calling ElevenLabs
+    cache = get_tts_cache()
+    key = cache.key(text, voice_id, model_id, output_format, voice_settings)
+    scheduler = get_tts_scheduler(os.getenv("ELEVENLABS_API_KEY"))
+
+    # Speech goes into the cache first. A request for the same text that is already running (the speculative
+    # one started while the script streamed), here or in another process, is waited for instead of repeated.
+    def synthesize():
+        while True:
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+            if cache.reserve(key):
+                break
+            cache.wait(key)
+        try:
+            # Rate-limited, retried request over the shared ElevenLabs client
+            audio = scheduler.convert(
+                voice_id=voice_id,
+                optimize_streaming_latency="0",
+                output_format=output_format,
+                text=text,
+                model_id=model_id,
+                voice_settings=voice_settings,
+            )
+            fd, temp_path = tempfile.mkstemp(suffix=".mp3")
+            with os.fdopen(fd, "wb") as f:
+                f.write(audio)
+            try:
+                return cache.put(key, temp_path, output_format)
+            finally:
+                os.remove(temp_path)
+        finally:
+            cache.release(key)
+
+    audio_path, duration = scheduler.once(key, synthesize)
+    shutil.copyfile(audio_path, filename)
+    # Returns the duration of the audio in seconds
+    return duration
+
+# Function to voice a line locally for previews: pyttsx3 when it is installed, otherwise silence as long as
+# the line would take to read. Returns the duration in seconds.
+def draft_speech(text, filename):
+    if pyttsx3 is not None:
+        try:
+            engine = pyttsx3.init()
+            engine.save_to_file(text, filename)
+            engine.runAndWait()
+        except (RuntimeError, OSError) as e:  # no speech driver on this machine
+            print(f"Draft voice unavailable, using silence. Reason: {e}")
+        if os.path.exists(filename) and os.path.getsize(filename) > 0:
+            return audio_duration(filename)
+    duration = max(1.0, len(text.split()) / DRAFT_WORDS_PER_SECOND)
+    subprocess.run([ffmpeg_binary(), "-y", "-loglevel", "error", "-f", "lavfi", "-i",
+                    "anullsrc=r=22050:cl=mono", "-t", f"{duration:.3f}", filename], check=True)
+    return duration
+
+
+# Voice options (display name and corresponding voice_id)
+VOICES = {
+    "Harry": "SOYHLrjzK2X1ezoPC6cr",
+    "Thomas": "GBv7mTt0atIp3Br8iCZE",
+    "Shrey": "IMzcdjL6UK1gZxag6QAU",
+    "Raju": "zT03pEAEi0VHKciJODfn",
+    "Leo": "IvLWq57RKibBrqZGpQrC",
+    "Niraj": "zgqefOY5FPQ3bB7OZTVR",
+    "Ranga": "d0grukerEzs069eKIauC",
+    "Amit": "Sxk6njaoa7XLsAFT7WcN",
+    "Aakash": "Uyx98Ek4uMNmWN7E28CD",
+    "Anoop": "WyjIvPRJbxeuLCf0u23f",
+    "Danish": "xZp4zaaBzoWhWxxrcAij",
+    "Sachin": "XRdIKD2HKD2sMJjeC483",
+    "Anand": "fKe9ZDqkOtN9VMLdbWJ5",
+    "Faiq": "yDPEFTzp1EjwJuP2mt1k",
+    "Vihan": "bUTE2M5LdnqaUCd5tJB3",
+    "God": "ttpam6l3Fgkia7uX33b6",
+    "Sohaib": "kLuXkg0zRFuSas1JFmMT",
+    "Suhan": "JYesEroFZfIV2tXHwRem",
+    "Kunal": "Qxb5zQvEo3DYQK2HNnXm",
+    "Manu": "MUMZpJj46Atf8HF4CyAx",
+    "Praveen": "v4ZRRmjvcrgAdi5qkWtZ",
+    "Guru": "HP3OkBOPWanmqpjL7XVM"
+}
+
+# Function to build the script prompt for the dealer's vehicles in the selected language
+def build_script_prompt(dealer_name, lang, car_infos):
+    # Initialize empty lists for car data
+    distance, year, model, price = [], [], [], []
+    for car_info in car_infos:
+        if car_info:
+            distance.append(car_info.get("kilometers", ""))
+            model.append(car_info["rc_report_generate"]["model"])
+            if car_info["offerPrice"]:
+                price.append(car_info["offerPrice"])
+            else:
+                price.append(car_info["listPrice"])
+            year.append(car_info["makeYear"].split('/')[1])
+     
+    # Create a formatted string for LLM prompt
+    informative_c = []
+    for i in range(len(model)):
+        car_details = f"Year: {year[i]}, Model: {model[i]}, Price: {price[i]} rupees, Distance: {distance[i]} km traveled"
+        informative_c.append(car_details)
+
+    informative_c_paragraph = "\n".join(informative_c)
+
+    # Prepare the prompt based on language
+    if lang == "English":
+        # Improved Prompt for English Script Generation
+        prompt = f"""You are a creative marketing scriptwriter with a deep understanding of the second-hand car market. Your task is to craft an engaging and persuasive script that will capture the attention of potential customers who are looking for reliable, certified pre-owned vehicles. The script should follow these guidelines:
+
+        Start with the dealer's name, like '{dealer_name} presents Nexcar certified vehicles;'.
+        Provide a separate line for each car, detailing the car's model, year, price, distance traveled, and any unique selling points.
+        Use a semicolon (;) to separate each line.
+        Write in full sentences that are clear, concise, and compelling.
+        Make the script engaging by using formats like ₹8.25 lakhs and 70 thousand km.
+        Include subtle calls to action in each line to encourage potential buyers.
+        Emphasize the quality, value, and certification of these vehicles, making it clear that they are excellent choices for savvy buyers.
+        End with a strong closing line highlighting the quality of the vehicles and encouraging customers to take advantage of the available services.
+        The tone should be enthusiastic yet professional, aimed at building trust and excitement among potential buyers.
+        Do not include any phrases like 'Here is the script:' or similar introductions.
+        For example: 'Experience the thrill of driving a 2018 CRETA 1.6 CRDI AUTO SX+, packed with modern features and priced at just ₹8.25 lakhs, with only 70 thousand km on the clock;'.
+
+        Here is the information you need to include:
+        {informative_c_paragraph}
+
+        Your goal is to make this script engaging, persuasive, and trust-building, effectively conveying the value of each vehicle to potential buyers.
+        """
 
-            if j == 3:
-                # Call the 3D video function when j == 3
-                print(f"Generating 3D video for segment {i} with j = 3")
+    else:
+        prompt = f"""### **Prompt for Direct Hinglish Script Generation (More Engaging and Appealing):**
 
-                # Generate 3D video using images in the current vehicle folder
-                image_folder_for_3d = car_images[i-1]  # Folder where images are stored
-                duration_for_3d = segment_duration  # Duration for this segment in the main video
+        "You are a creative marketing expert specializing in the Indian used car market. Your task is to craft an engaging and appealing script in Hinglish that will captivate potential buyers.
 
-                # Create 3D video and append it to the main video clips
-                video_3d_clip = video_3d(image_folder_for_3d, output_file, fps=fps, video_duration=duration_for_3d)
-                video_3d_clip = video_3d_clip.set_audio(audio.subclip(j * segment_duration, (j + 1) * segment_duration))
-                video_clips.append(video_3d_clip)
-            else:
-                # Process regular image and audio
-                img_rgb = cv2.cvtColor(resize_image(img), cv2.COLOR_BGR2RGB)
-                audio_part = audio.subclip(j * segment_duration, (j + 1) * segment_duration)
-                video_clips.append(mp.ImageClip(img_rgb).set_duration(segment_duration).set_audio(audio_part))
-
-        subtitles.append(((current_time, current_time + audio.duration), script_list[i]))
-        current_time += audio.duration
-
-    # Process last image
-    img = cv2.imread(images[-1])
-    if img is None:
-        print(f"Error: Unable to read the image file: {images[-1]}")
-        return
+        **Instructions:**
 
-    img_rgb = cv2.cvtColor(resize_image(img), cv2.COLOR_BGR2RGB)
-    audio = mp.AudioFileClip(audio_files[-1])
-    video_clips.append(mp.ImageClip(img_rgb).set_duration(audio.duration).set_audio(audio))
-    subtitles.append(((current_time, current_time + audio.duration), script_list[-1]))
+        - The script should start with the dealer's name, "{dealer_name} lekar aaye hain aapke liye Nexcar certified gaadiyan;" and end with the fixed line, "Yeh gaadiyan Nexcar dwara inspect ki gayi hain aur bilkul badiya condition mein hain, aapke liye taiyaar. Avail kariye easy drive-away car loans, comprehensive insurance, extended warranty, aur RC transfer services Nexcar approved cars par. Aaj hi apni sapno ki gaadi ghar le jayein!"
+        
+        - **Content Structure:**
+        - After the opening line, create compelling descriptions of each car that not only mention the car's name, price, distance traveled, and age but also include a catchy or emotional element that resonates with the buyer.
+        - **Use an informal, conversational tone** that reflects excitement and a sense of urgency, encouraging the buyer to act quickly.
+        - Use phrases like "sirf," "kam chalne wali," "ekdam mast condition mein," etc., to make the script feel more relatable and persuasive.
+        - Mention the price and distance in a way that sounds attractive, e.g., "₹8.25 lakhs" as "sirf 8.25 lakhs mein" and "70 thousand km" as "70 hazaar km chali hui."
+        - Each car description should be separated by a semicolon (;) and flow smoothly to the next without extra commentary.
 
-    # Concatenate all clips
-    final_clip = mp.concatenate_videoclips(video_clips)
 
-    # Create subtitle clips and overlay on final clip
-    if captions:
-        subtitle_clips = [create_subtitle(text, start, end, final_clip.size) for (start, end), text in subtitles]
-        final_clip = mp.CompositeVideoClip([final_clip] + subtitle_clips)
+        **Car Details to Include:**
+        {informative_c_paragraph}
 
-    # Write output video file
-    final_clip.write_videofile(output_file, fps=fps, audio_codec="aac", codec="libx264")
+        **Output Expectations:**
+        - The final script should be engaging, concise, and designed to appeal to Hinglish-speaking customers.
+        - The tone should be lively and persuasive, creating a sense of urgency and excitement about the cars.
+        - Do not include phrases like "Here is the script:", "Here is the generated Hinglish script for the vehicle promotion:" in the output."
 
-    cleanup_temp_files(audio_files)
-    print(f"Video created successfully: {output_file}")
+        Remember to follow these instructions closely.
+        """
 
-# Cleanup temporary audio files
-def cleanup_temp_files(audio_files):
-    for audio_file in audio_files:
-        try:
-            os.remove(audio_file)
-        except PermissionError:
-            print(f"Could not remove {audio_file}. It may still be in use.")
-    try:
-        os.rmdir("temp_audio")
-    except OSError:
-        print("Could not remove temp_audio directory. It may not be empty.")
+    return prompt
 
-def text_to_speech(text, filename, voice_id):
-    # Initialize the ElevenLabs client
-    client = ElevenLabs(api_key=os.getenv("ELEVENLABS_API_KEY"))
-
-    response = client.text_to_speech.convert(
-        voice_id=voice_id,
-        optimize_streaming_latency="0",
-        output_format="mp3_22050_32",
-        text=text,
-        model_id="eleven_multilingual_v2",  # use the turbo model for low latency
-        voice_settings=VoiceSettings(
-            stability=0.50,
-            similarity_boost=.30,
-            style=0.15,
-            use_speaker_boost=True,
-        ),
-    )
-    save_file_path = filename
-    # Generating a unique file name for the output MP3 file
-    # Writing the audio stream to the file
-    with open(save_file_path, "wb") as f:
-        for chunk in response:
-            if chunk:
-                f.write(chunk)
+# Function to show where the time of a finished job went, per stage, from its trace
+def show_timing_panel(job_id):
+    trace = load_trace(job_id)
+    if trace is None:
+        return
+    with st.expander(f"Timing breakdown ({trace['wall']:.1f}s, {trace['cpu']:.1f}s CPU)"):
+        # Top-level stages only, per-image and per-segment spans are summed inside them
+        stages = {name: total for name, total in trace["summary"].items() if "." not in name}
+        st.bar_chart({"seconds": {name: total["wall"] for name, total in stages.items()}})
+        st.table([{
+            "stage": name,
+            "wall s": round(total["wall"], 2),
+            "cpu s": round(total["cpu"], 2),
+            "spans": total["count"],
+            "peak RSS MB": round(total["peak_rss"] / 1024 ** 2),
+        } for name, total in stages.items()])
+
+# Function to remove the files of a video job once its video was downloaded, and forget the job
+def collect_video_job(job_id):
+    get_job_queue().collect(job_id)
+    st.session_state.pop('video_job', None)
+    st.query_params.pop("job", None)
+
+# Function to show the progress of a video job, and the video with a download button once it is ready
+def show_video_job(job_id):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        st.error(f"Video job {job_id} not found.")
+        return
+    if job["status"] == "failed":
+        st.error(f"Video generation failed during {job['stage']}: {job['error']}")
+        return
+    if job["status"] == "done":
+        output_file = job["result"]
+        if not os.path.exists(output_file):
+            st.error("The video of this job has expired, please create it again.")
+            return
+        st.video(output_file)
+        with open(output_file, "rb") as f:
+            st.download_button("Download Video", f, file_name=os.path.basename(output_file), mime="video/mp4",
+                               on_click=collect_video_job, args=(job_id,))
+        show_timing_panel(job_id)
+        return
 
+    stage = job["stage"]
+    st.progress(VIDEO_JOB_STAGES.index(stage) / (len(VIDEO_JOB_STAGES) - 1), text=f"Generating video... ({stage})")
+    # Poll until the worker is done
+    time.sleep(1)
+    st.rerun()
 
 # Streamlit front-end
 def main():
     st.title("Nexcar Video Script Generator")
+    ensure_workers()
 
     # Input vehicle numbers
     dealer_name = st.text_input("Enter Dealer Name")
@@ -996,114 +1424,31 @@ def main():
     # Option for captions
     captions = st.radio("Include Captions?", ('Yes', 'No')) == 'Yes'
 
-    # Voice options (display name and corresponding voice_id)
-    voices = {
-        "Harry": "SOYHLrjzK2X1ezoPC6cr",
-        "Thomas": "GBv7mTt0atIp3Br8iCZE",
-        "Shrey": "IMzcdjL6UK1gZxag6QAU",
-        "Raju": "zT03pEAEi0VHKciJODfn",
-        "Leo": "IvLWq57RKibBrqZGpQrC",
-        "Niraj": "zgqefOY5FPQ3bB7OZTVR",
-        "Ranga": "d0grukerEzs069eKIauC",
-        "Amit": "Sxk6njaoa7XLsAFT7WcN",
-        "Aakash": "Uyx98Ek4uMNmWN7E28CD",
-        "Anoop": "WyjIvPRJbxeuLCf0u23f",
-        "Danish": "xZp4zaaBzoWhWxxrcAij",
-        "Sachin": "XRdIKD2HKD2sMJjeC483",
-        "Anand": "fKe9ZDqkOtN9VMLdbWJ5",
-        "Faiq": "yDPEFTzp1EjwJuP2mt1k",
-        "Vihan": "bUTE2M5LdnqaUCd5tJB3",
-        "God": "ttpam6l3Fgkia7uX33b6",
-        "Sohaib": "kLuXkg0zRFuSas1JFmMT",
-        "Suhan": "JYesEroFZfIV2tXHwRem",
-        "Kunal": "Qxb5zQvEo3DYQK2HNnXm",
-        "Manu": "MUMZpJj46Atf8HF4CyAx",
-        "Praveen": "v4ZRRmjvcrgAdi5qkWtZ",
-        "Guru": "HP3OkBOPWanmqpjL7XVM"
-    }
 
     # Select Voice
-    selected_voice_name = st.radio("Select Voice for the Video", list(voices.keys()))
+    selected_voice_name = st.radio("Select Voice for the Video", list(VOICES.keys()))
 
     # Get corresponding voice_id
-    voice_id = voices[selected_voice_name]
+    voice_id = VOICES[selected_voice_name]
 
-    if st.button("Generate Script"):
-        banner_image(vehiclenumbers[0])
-        # Fetch car details
-        # Initialize empty lists for car data
-        distance, year, model, price = [], [], [], []
-        for vehiclenumber in vehiclenumbers:
-            car_info = carscope_details(vehiclenumber)
-            if car_info:
-                distance.append(car_info.get("kilometers", ""))
-                model.append(car_info["rc_report_generate"]["model"])
-                if car_info["offerPrice"]:
-                    price.append(car_info["offerPrice"])
-                else:
-                    price.append(car_info["listPrice"])
-                year.append(car_info["makeYear"].split('/')[1])
-         
-        # Create a formatted string for LLM prompt
-        informative_c = []
-        for i in range(len(vehiclenumbers)):
-            car_details = f"Year: {year[i]}, Model: {model[i]}, Price: {price[i]} rupees, Distance: {distance[i]} km traveled"
-            informative_c.append(car_details)
-
-        informative_c_paragraph = "\n".join(informative_c)
-
-        # Prepare the prompt based on language
-        if lang == "English":
-    # Improved Prompt for English Script Generation
-            prompt = f"""You are a creative marketing scriptwriter with a deep understanding of the second-hand car market. Your task is to craft an engaging and persuasive script that will capture the attention of potential customers who are looking for reliable, certified pre-owned vehicles. The script should follow these guidelines:
-
-            Start with the dealer's name, like '{dealer_name} presents Nexcar certified vehicles;'.
-            Provide a separate line for each car, detailing the car's model, year, price, distance traveled, and any unique selling points.
-            Use a semicolon (;) to separate each line.
-            Write in full sentences that are clear, concise, and compelling.
-            Make the script engaging by using formats like ₹8.25 lakhs and 70 thousand km.
-            Include subtle calls to action in each line to encourage potential buyers.
-            Emphasize the quality, value, and certification of these vehicles, making it clear that they are excellent choices for savvy buyers.
-            End with a strong closing line highlighting the quality of the vehicles and encouraging customers to take advantage of the available services.
-            The tone should be enthusiastic yet professional, aimed at building trust and excitement among potential buyers.
-            Do not include any phrases like 'Here is the script:' or similar introductions.
-            For example: 'Experience the thrill of driving a 2018 CRETA 1.6 CRDI AUTO SX+, packed with modern features and priced at just ₹8.25 lakhs, with only 70 thousand km on the clock;'.
-
-            Here is the information you need to include:
-            {informative_c_paragraph}
-
-            Your goal is to make this script engaging, persuasive, and trust-building, effectively conveying the value of each vehicle to potential buyers.
-            """
+    # Show the script as it is written and start voicing each line as soon as it is finished
+    stream_script = st.checkbox("Stream the script and start the voice-over early", value=True)
 
+    if st.button("Generate Script"):
+        # Fetch car details of all vehicles in parallel, the image links are warmed for "Create Video"
+        vehicle_data = fetch_many(fetch_vehicle, vehiclenumbers)
+        for vehiclenumber, (car_info, _) in zip(vehiclenumbers, vehicle_data):
+            if car_info is None:
+                st.error(f"Error: could not fetch details for {vehiclenumber}")
+        prompt = build_script_prompt(dealer_name, lang, [car_info for car_info, _ in vehicle_data])
+        if stream_script:
+            placeholder = st.empty()
+            with placeholder.container():
+                script = st.write_stream(speculate_tts(generate_script_stream(prompt), voice_id)).strip()
+            placeholder.empty()
         else:
-            prompt = f"""### **Prompt for Direct Hinglish Script Generation (More Engaging and Appealing):**
-
-            "You are a creative marketing expert specializing in the Indian used car market. Your task is to craft an engaging and appealing script in Hinglish that will captivate potential buyers.
-
-            **Instructions:**
-
-            - The script should start with the dealer's name, "{dealer_name} lekar aaye hain aapke liye Nexcar certified gaadiyan;" and end with the fixed line, "Yeh gaadiyan Nexcar dwara inspect ki gayi hain aur bilkul badiya condition mein hain, aapke liye taiyaar. Avail kariye easy drive-away car loans, comprehensive insurance, extended warranty, aur RC transfer services Nexcar approved cars par. Aaj hi apni sapno ki gaadi ghar le jayein!"
-            
-            - **Content Structure:**
-            - After the opening line, create compelling descriptions of each car that not only mention the car's name, price, distance traveled, and age but also include a catchy or emotional element that resonates with the buyer.
-            - **Use an informal, conversational tone** that reflects excitement and a sense of urgency, encouraging the buyer to act quickly.
-            - Use phrases like "sirf," "kam chalne wali," "ekdam mast condition mein," etc., to make the script feel more relatable and persuasive.
-            - Mention the price and distance in a way that sounds attractive, e.g., "₹8.25 lakhs" as "sirf 8.25 lakhs mein" and "70 thousand km" as "70 hazaar km chali hui."
-            - Each car description should be separated by a semicolon (;) and flow smoothly to the next without extra commentary.
-
-
-            **Car Details to Include:**
-            {informative_c_paragraph}
-
-            **Output Expectations:**
-            - The final script should be engaging, concise, and designed to appeal to Hinglish-speaking customers.
-            - The tone should be lively and persuasive, creating a sense of urgency and excitement about the cars.
-            - Do not include phrases like "Here is the script:", "Here is the generated Hinglish script for the vehicle promotion:" in the output."
-
-            Remember to follow these instructions closely.
-            """
-        with st.spinner("Generating script..."):
-            script = generate_script(prompt)
+            with st.spinner("Generating script..."):
+                script = generate_script(prompt)
 
         # Display the generated script
         st.session_state['script'] = script
@@ -1114,30 +1459,26 @@ def main():
         st.subheader("Generated Script")
         updated_script = st.text_area("Edit Script Below", st.session_state['script'], height=200, key='script_area')
 
-        if st.button("Create Video"):
-            with st.spinner('Generating video...'):
-                # Create 
-                vehicle_folders = []
-                car_infos = []
-                for vehiclenumber in vehiclenumbers:
-                    car_info = carscope_details(vehiclenumber)
-                    if car_info:
-                        car_infos.append(car_info)
-                    car_images = fetch_images(vehiclenumber)
-                    if car_images and 'downloadLinks' in car_images:
-                        print(f"Vehicle: {vehiclenumber}")           
-                        # Step 1: Download the images
-                        download_images(vehiclenumber, car_images['downloadLinks'], vehicle_folders)
-
-                    else:
-                        st.write("No image found for this vehicle.")
-
-                output_file = "output_video.mp4"
-                process_vehicle_images(vehicle_folders, car_infos)
-                create_video_from_images_and_audio(updated_script, output_file,vehicle_folders, voice_id, captions)
-            
-            # Show the video
-            st.video(output_file)
+        draft_voice = st.checkbox("Use a draft voice for previews (no ElevenLabs credits)")
+        create_column, preview_column = st.columns(2)
+        create = create_column.button("Create Video")
+        preview = preview_column.button("Preview", help="Low resolution render to check timing and captions")
+        if create or preview:
+            # Rendering runs in a worker process, the job id is kept in the URL so a refresh can pick it up
+            job_id = get_job_queue().submit("video", {
+                "vehicle_numbers": vehiclenumbers,
+                "script": updated_script,
+                "voice_id": voice_id,
+                "captions": captions,
+                "preview": preview,
+                "draft_voice": preview and draft_voice,
+            })
+            st.session_state['video_job'] = job_id
+            st.query_params["job"] = job_id
+
+    job_id = st.session_state.get('video_job') or st.query_params.get("job")
+    if job_id:
+        show_video_job(job_id)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,254 @@
+import os
+import sys
+import json
+import time
+import uuid
+import atexit
+import sqlite3
+import argparse
+import importlib
+import threading
+import traceback
+import multiprocessing
+from contextlib import closing
+from workspace import JobWorkspace, WORKSPACE_ROOT, cleanup_stale_workspaces, remove_workspace
+from tracing import trace_job
+
+# Local job queue in SQLite: the UI submits jobs and polls them, worker processes claim and run them
+# outside the UI process. A running job keeps a heartbeat; jobs whose worker died are queued again, up to
+# JOB_MAX_ATTEMPTS runs, after which they fail instead of taking down worker after worker.
+# The workspace of a finished job is kept until its video is collected or it expires (WORKSPACE_MAX_AGE).
+JOB_QUEUE_DB = os.getenv("JOB_QUEUE_DB", os.path.join(".cache", "jobs.sqlite3"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_LEASE = float(os.getenv("JOB_LEASE", "120"))  # seconds without heartbeat before a job is taken over
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_SWEEP_INTERVAL = float(os.getenv("JOB_SWEEP_INTERVAL", "600"))  # seconds between sweeps of expired workspaces
+
+# Job kinds and the "module:function" that runs them as fn(params, workspace, progress) -> result
+JOB_HANDLERS = {
+    "video": "frontend2:render_video_job",
+}
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT,
+    result TEXT,
+    error TEXT,
+    worker TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    heartbeat REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created);
+"""
+
+
+class JobQueue:
+    def __init__(self, path=JOB_QUEUE_DB, lease=JOB_LEASE, max_attempts=JOB_MAX_ATTEMPTS):
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max_attempts
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder, exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+
+    # One short-lived connection per call, so the queue can be used from any thread or process
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        return closing(db)
+
+    def submit(self, kind, params):
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = uuid.uuid4().hex
+        with self._connect() as db:
+            db.execute("INSERT INTO jobs (id, kind, params, status, stage, created) VALUES (?, ?, ?, ?, ?, ?)",
+                       (job_id, kind, json.dumps(params), QUEUED, QUEUED, time.time()))
+        return job_id
+
+    # Job as a dict (params and result decoded), or None
+    def get(self, job_id):
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    # Atomically take the oldest queued job, or a running one whose worker stopped sending heartbeats;
+    # those already run max_attempts times are marked failed instead
+    def claim(self, worker_id):
+        now = time.time()
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished = ? "
+                "WHERE status = ? AND heartbeat < ? AND attempts >= ?",
+                (FAILED, f"The worker stopped responding on each of {self.max_attempts} attempts", now, RUNNING,
+                 now - self.lease, self.max_attempts),
+            )
+            row = db.execute(
+                "SELECT id FROM jobs WHERE status = ? OR (status = ? AND heartbeat < ?) ORDER BY created LIMIT 1",
+                (QUEUED, RUNNING, now - self.lease),
+            ).fetchone()
+            if row is None:
+                db.execute("COMMIT")
+                return None
+            db.execute(
+                "UPDATE jobs SET status = ?, worker = ?, attempts = attempts + 1, started = ?, heartbeat = ? "
+                "WHERE id = ?",
+                (RUNNING, worker_id, now, now, row["id"]),
+            )
+            db.execute("COMMIT")
+        return self.get(row["id"])
+
+    def heartbeat(self, job_id, stage=None):
+        with self._connect() as db:
+            if stage is None:
+                db.execute("UPDATE jobs SET heartbeat = ? WHERE id = ?", (time.time(), job_id))
+            else:
+                db.execute("UPDATE jobs SET heartbeat = ?, stage = ? WHERE id = ?", (time.time(), stage, job_id))
+
+    def finish(self, job_id, result):
+        with self._connect() as db:
+            db.execute("UPDATE jobs SET status = ?, stage = ?, result = ?, finished = ? WHERE id = ?",
+                       (DONE, DONE, json.dumps(result), time.time(), job_id))
+
+    def fail(self, job_id, error):
+        with self._connect() as db:
+            db.execute("UPDATE jobs SET status = ?, error = ?, finished = ? WHERE id = ?",
+                       (FAILED, error, time.time(), job_id))
+
+    # The output of a finished job was handed to the user: its workspace, video included, is removed
+    def collect(self, job_id):
+        job = self.get(job_id)
+        if job is not None and job["status"] in (DONE, FAILED):
+            remove_workspace(job["id"])
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
+
+
+def _handler(kind):
+    module_name, function_name = JOB_HANDLERS[kind].split(":")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+# Run one claimed job in its own workspace (named after the job, kept for the download if it succeeds)
+def run_job(queue, job):
+    workspace = JobWorkspace(WORKSPACE_ROOT, job_id=job["id"], keep=True)
+    stop = threading.Event()
+
+    # Heartbeats continue during long stages such as encoding
+    def beat():
+        while not stop.wait(queue.lease / 4):
+            queue.heartbeat(job["id"])
+
+    beater = threading.Thread(target=beat, daemon=True)
+    beater.start()
+    try:
+        # The trace is written under the job id, where the UI picks it up for the timing panel
+        with trace_job(job["id"]):
+            result = _handler(job["kind"])(job["params"], workspace, lambda stage: queue.heartbeat(job["id"], stage))
+        queue.finish(job["id"], result)
+        print(f"Job {job['id']} done")
+    except Exception as e:
+        traceback.print_exc()
+        queue.fail(job["id"], f"{type(e).__name__}: {e}")
+        workspace.close()
+    finally:
+        stop.set()
+        beater.join()
+
+
+def run_worker(poll_interval=JOB_POLL_INTERVAL, once=False):
+    queue = get_job_queue()
+    worker_id = f"{os.uname().nodename if hasattr(os, 'uname') else 'local'}:{os.getpid()}"
+    print(f"Worker {worker_id} waiting for jobs")
+    swept = 0
+    while True:
+        # Workspaces of jobs that were never collected, and of sessions that did not exit cleanly
+        if time.time() - swept > JOB_SWEEP_INTERVAL:
+            cleanup_stale_workspaces(WORKSPACE_ROOT)
+            swept = time.time()
+        job = queue.claim(worker_id)
+        if job is not None:
+            print(f"Worker {worker_id} running {job['kind']} job {job['id']}")
+            run_job(queue, job)
+        elif once:
+            return
+        else:
+            time.sleep(poll_interval)
+
+
+_workers = []
+_workers_lock = threading.Lock()
+
+
+@atexit.register
+def _stop_workers():
+    for process in _workers:
+        process.terminate()
+    for process in _workers:
+        process.join(5)
+
+
+# Target of the processes started by ensure_workers, environ is set before any job module is imported
+def _worker_main(environ):
+    os.environ.update(environ)
+    run_worker()
+
+
+# Start worker processes next to the UI once per process; JOB_WORKERS=0 leaves it to `python job_queue.py`.
+# Workers are not daemonic because they start the background removal pool themselves. Each one's pool
+# gets an equal share of the cores (bg_removal.REMBG_CORES), so together they don't oversubscribe them.
+def ensure_workers(count=JOB_WORKERS):
+    environ = {"REMBG_CORES": os.getenv("REMBG_CORES") or str(max(1, (os.cpu_count() or 1) // max(1, count)))}
+    with _workers_lock:
+        _workers[:] = [process for process in _workers if process.is_alive()]
+        context = multiprocessing.get_context("spawn")
+        while len(_workers) < count:
+            process = context.Process(target=_worker_main, args=(environ,), daemon=False)
+            process.start()
+            _workers.append(process)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run video job workers")
+    parser.add_argument("--workers", type=int, default=max(1, JOB_WORKERS))
+    parser.add_argument("--once", action="store_true", help="Exit when the queue is empty")
+    args = parser.parse_args()
+    if args.workers == 1 or args.once:
+        run_worker(once=args.once)
+        return
+    ensure_workers(args.workers)
+    for process in _workers:
+        process.join()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+import os
+import io
+import time
+import queue
+import atexit
+import tempfile
+import threading
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from webdriver_manager.chrome import ChromeDriverManager
+
+# Number of warm Chrome instances kept alive and how many frames each one renders before it is recycled
+RENDER_POOL_SIZE = int(os.getenv("RENDER_POOL_SIZE", "4"))
+RENDER_MAX_RENDERS = int(os.getenv("RENDER_MAX_RENDERS", "50"))
+
+
+# Resolve the chromedriver binary once per process instead of once per frame
+@lru_cache(maxsize=None)
+def chromedriver_path():
+    return ChromeDriverManager().install()
+
+
+class ChromeRendererPool:
+    def __init__(self, size=RENDER_POOL_SIZE, max_renders=RENDER_MAX_RENDERS, width=1920, height=1080):
+        self.size = max(1, size)
+        self.max_renders = max(1, max_renders)
+        self.width = width
+        self.height = height
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._render_counts = {}
+        self._started = 0
+        self._closed = False
+
+    # Start a new headless browser sized to the frame
+    def _start_driver(self):
+        chrome_options = Options()
+        chrome_options.add_argument("--headless")
+        chrome_options.add_argument(f"--window-size={self.width},{self.height}")
+        chrome_options.add_argument("--hide-scrollbars")
+        service = Service(chromedriver_path())
+        driver = webdriver.Chrome(service=service, options=chrome_options)
+        driver.set_window_size(self.width, self.height)
+        return driver
+
+    def _quit_driver(self, driver):
+        with self._lock:
+            self._render_counts.pop(id(driver), None)
+            self._started -= 1
+        try:
+            driver.quit()
+        except Exception as e:
+            print(f"Failed to quit Chrome instance. Reason: {e}")
+
+    # A driver is healthy if its session still answers a trivial script
+    def _is_healthy(self, driver):
+        try:
+            return driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    # Take an idle browser, start a new one while below the pool size, otherwise wait for one to be released
+    def _acquire(self):
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    start_new = self._started < self.size
+                    if start_new:
+                        self._started += 1
+                if not start_new:
+                    # Wake up periodically, a recycled browser frees a slot without being put back
+                    try:
+                        driver = self._idle.get(timeout=0.5)
+                    except queue.Empty:
+                        continue
+                else:
+                    try:
+                        driver = self._start_driver()
+                    except Exception:
+                        with self._lock:
+                            self._started -= 1
+                        raise
+                    with self._lock:
+                        self._render_counts[id(driver)] = 0
+                    return driver
+
+            if self._is_healthy(driver):
+                return driver
+            print("Discarding unresponsive Chrome instance")
+            self._quit_driver(driver)
+
+    def _release(self, driver):
+        with self._lock:
+            self._render_counts[id(driver)] += 1
+            worn_out = self._render_counts[id(driver)] >= self.max_renders
+        if worn_out or self._closed:
+            self._quit_driver(driver)
+        else:
+            self._idle.put(driver)
+
+    # Render one HTML document to a PNG screenshot at output_path, or into the frame store under output_path
+    def render(self, html_code, output_path, store=None):
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.html', delete=False) as f:
+            f.write(html_code)
+            temp_html_path = f.name
+
+        driver = self._acquire()
+        try:
+            driver.get(f"file://{temp_html_path}")
+            screenshot = driver.get_screenshot_as_png()
+        except Exception:
+            # Never hand a browser in an unknown state back to the pool
+            self._quit_driver(driver)
+            raise
+        else:
+            self._release(driver)
+        finally:
+            os.unlink(temp_html_path)
+
+        image = Image.open(io.BytesIO(screenshot))
+        if store is not None:
+            # Decoded once and handed over as RGB, the screenshot is not re-encoded
+            return store.put(output_path, np.asarray(image.convert("RGB")))
+        image.save(output_path)
+        print(f"Image saved successfully: {output_path}")
+        return output_path
+
+    # Render a batch of (html_code, output_path) jobs in parallel, results are returned in submission order.
+    # timings, if given, gets the wall and CPU seconds of every job added to output_path's entry; the CPU is
+    # this process's share only, Chrome's own is not counted.
+    def render_batch(self, jobs, store=None, timings=None):
+        def render_one(html_code, output_path):
+            start, cpu = time.perf_counter(), time.thread_time()
+            try:
+                return self.render(html_code, output_path, store)
+            finally:
+                if timings is not None:
+                    wall, spent = timings.get(output_path, (0.0, 0.0))
+                    timings[output_path] = (wall + time.perf_counter() - start, spent + time.thread_time() - cpu)
+
+        jobs = list(jobs)
+        if not jobs:
+            return []
+        results = []
+        with ThreadPoolExecutor(max_workers=min(self.size, len(jobs))) as executor:
+            futures = [executor.submit(render_one, html_code, output_path) for html_code, output_path in jobs]
+            for (html_code, output_path), future in zip(jobs, futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    print(f"Failed to render {output_path}. Reason: {e}")
+                    results.append(None)
+        return results
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._quit_driver(driver)
+
+
+_pools = {}
+_pool_lock = threading.Lock()
+
+
+# Shared pool per frame size for the whole process, browsers are shut down when the interpreter exits
+def get_renderer_pool(width=1920, height=1080):
+    with _pool_lock:
+        pool = _pools.get((width, height))
+        if pool is None:
+            pool = _pools[(width, height)] = ChromeRendererPool(width=width, height=height)
+            atexit.register(pool.close)
+        return pool
@@ -0,0 +1,53 @@
+import os
+import json
+import hashlib
+import threading
+from disk_lru import DiskLRU
+
+# On-disk cache of encoded video segments (intro, one per vehicle, outro), keyed by a manifest of everything
+# the segment is made from. A re-render after a script edit encodes only the segments whose inputs changed.
+SEGMENT_CACHE_DIR = os.getenv("SEGMENT_CACHE_DIR", os.path.join(".cache", "segments"))
+SEGMENT_CACHE_MAX_BYTES = int(os.getenv("SEGMENT_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+# Bump when the way segments are drawn or encoded changes, so old segments are not reused
+SEGMENT_FORMAT = 2
+
+
+# Content hash of a file, None when it doesn't exist
+def file_digest(path):
+    if not path or not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SegmentCache(DiskLRU):
+    def __init__(self, directory=SEGMENT_CACHE_DIR, max_bytes=SEGMENT_CACHE_MAX_BYTES):
+        DiskLRU.__init__(self, directory, ".mp4", max_bytes, companions=(".json",))
+
+    def key(self, manifest):
+        payload = dict(manifest, format=SEGMENT_FORMAT)
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+    # Copy a freshly encoded segment into the cache next to its manifest, then evict over the limit
+    def put(self, key, segment_path, manifest=None):
+        if manifest is not None:
+            path = self.path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(f"{path[:-4]}.json", "w") as f:
+                json.dump(manifest, f, indent=1, default=str)
+        return DiskLRU.put(self, key, segment_path)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_segment_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SegmentCache()
+        return _cache
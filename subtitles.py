@@ -0,0 +1,82 @@
+import os
+import bisect
+import textwrap
+from functools import lru_cache
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# Captions are a black band with centred white lines at the bottom of the frame. Only the band is drawn,
+# once per text and video size, and it is opaque, so putting it on a frame is a copy of its rows.
+SUBTITLE_FONT = os.getenv("SUBTITLE_FONT", "arial.ttf")
+# Tried in order after SUBTITLE_FONT, Pillow's own font is the last resort
+FONT_FALLBACKS = ("DejaVuSans.ttf", "LiberationSans-Regular.ttf")
+BOTTOM_MARGIN = 10
+
+
+@lru_cache(maxsize=None)
+def load_font(size):
+    for name in (SUBTITLE_FONT,) + FONT_FALLBACKS:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size)
+
+
+# What the captions look like besides their text, for cache keys: the font file used and the margin
+def caption_style():
+    return {"font": getattr(load_font(30), "path", None), "bottom_margin": BOTTOM_MARGIN}
+
+
+# Wrapped lines of a caption and where they go: (font size, band top, band height, ((x, y, line), ...)),
+# y relative to the band. Every line is measured once.
+@lru_cache(maxsize=1024)
+def caption_layout(text, video_size):
+    width, height = video_size
+    # Sized for 1080p, scaled down with smaller (preview) frames
+    font_size = max(12, round(30 * height / 1080))
+    font = load_font(font_size)
+    lines = textwrap.wrap(text, width=int((width - 40) / (font_size * 0.6)))
+    boxes = [font.getbbox(line) for line in lines]
+
+    total_text_height = sum(box[3] for box in boxes)
+    band_height = int(1.5 * total_text_height)
+    band_top = height - band_height - BOTTOM_MARGIN
+
+    placed, y_text = [], (band_height - total_text_height) // 2
+    for line, box in zip(lines, boxes):
+        placed.append(((width - box[2]) // 2, y_text, line))
+        y_text += box[3]
+    return font_size, band_top, band_height, tuple(placed)
+
+
+# The caption band as a read-only RGB array and the row it starts at
+@lru_cache(maxsize=256)
+def caption_band(text, video_size):
+    font_size, band_top, band_height, placed = caption_layout(text, video_size)
+    band = Image.new("RGB", (video_size[0], max(1, band_height)), "black")
+    draw = ImageDraw.Draw(band)
+    font = load_font(font_size)
+    for x, y, line in placed:
+        draw.text((x, y), line, font=font, fill="white")
+    band = np.asarray(band)
+    band.setflags(write=False)
+    return band, band_top
+
+
+# A copy of the frame with the caption drawn in; only the band rows are written
+def burn_caption(frame, text):
+    band, top = caption_band(text, (frame.shape[1], frame.shape[0]))
+    frame = frame.copy()
+    frame[top:top + len(band)] = band
+    return frame
+
+
+# Text of the caption shown at time t, subtitles: [((start, end), text)] sorted by start
+def caption_at(subtitles, t, starts=None):
+    starts = starts or [start for (start, _), _ in subtitles]
+    index = bisect.bisect_right(starts, t) - 1
+    if index < 0:
+        return None
+    (_, end), text = subtitles[index]
+    return text if t < end else None
@@ -0,0 +1,53 @@
+import os
+from disk_lru import DiskLRU
+
+
+def source(folder, name, size):
+    path = os.path.join(folder, name)
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    return path
+
+
+def test_put_evicts_least_recently_used(tmp_path):
+    cache = DiskLRU(str(tmp_path / "cache"), ".bin", 25)
+    for key in ("aa", "bb"):
+        cache.put(key, source(str(tmp_path), key, 10))
+    assert cache.get("aa") is not None
+    cache.put("cc", source(str(tmp_path), "cc", 10))
+    assert cache.get("bb") is None
+    assert cache.get("aa") is not None and cache.get("cc") is not None
+    assert cache.bytes == 20
+    assert cache.evictions == 1
+
+
+def test_entry_larger_than_budget_is_kept_alone(tmp_path):
+    cache = DiskLRU(str(tmp_path / "cache"), ".bin", 25)
+    cache.put("aa", source(str(tmp_path), "aa", 10))
+    cache.put("bb", source(str(tmp_path), "bb", 40))
+    assert cache.get("aa") is None
+    assert cache.get("bb") is not None
+    assert cache.bytes == 40
+
+
+def test_eviction_removes_companions(tmp_path):
+    cache = DiskLRU(str(tmp_path / "cache"), ".bin", 15, companions=(".json",))
+    path = cache.put("aa", source(str(tmp_path), "aa", 10))
+    companion = path[:-len(".bin")] + ".json"
+    with open(companion, "w") as f:
+        f.write("{}")
+    cache.put("bb", source(str(tmp_path), "bb", 10))
+    assert not os.path.exists(path)
+    assert not os.path.exists(companion)
+
+
+def test_reopened_cache_indexes_the_directory(tmp_path):
+    folder = str(tmp_path / "cache")
+    first = DiskLRU(folder, ".bin", 100)
+    for key in ("aa", "bb"):
+        first.put(key, source(str(tmp_path), key, 10))
+    second = DiskLRU(folder, ".bin", 100, expired=lambda path: path.endswith("bb.bin"))
+    assert second.get("aa") is not None
+    assert second.get("bb") is None
+    assert not os.path.exists(first.path("bb"))
+    assert second.bytes == 10
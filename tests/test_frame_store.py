@@ -0,0 +1,65 @@
+import os
+import tracemalloc
+import numpy as np
+from frame_store import FrameStore
+
+SIZE = (64, 48)
+FRAME_BYTES = SIZE[0] * SIZE[1] * 3
+
+
+def frame(i):
+    return np.full((SIZE[1], SIZE[0], 3), i % 256, dtype=np.uint8)
+
+
+# Render count frames into a store with room for 10 of them, then read each one like the encoder does;
+# returns the peak of traced memory and the store
+def render_and_encode(folder, count):
+    store = FrameStore(SIZE, memory_mb=10 * FRAME_BYTES / 1024 ** 2)
+    paths = [os.path.join(folder, f"{i}.png") for i in range(count)]
+    tracemalloc.start()
+    try:
+        for i, path in enumerate(paths):
+            store.put(path, frame(i))
+        store.expect(paths)
+        for i, path in enumerate(paths):
+            assert store.get(path)[0, 0, 0] == i % 256
+            store.release(path)
+        return tracemalloc.get_traced_memory()[1], store
+    finally:
+        tracemalloc.stop()
+
+
+def test_memory_stays_flat_as_frames_grow(tmp_path):
+    small, _ = render_and_encode(str(tmp_path / "small"), 20)
+    large, _ = render_and_encode(str(tmp_path / "large"), 200)
+    assert large < small + 4 * FRAME_BYTES
+
+
+def test_frames_over_budget_spill_to_disk(tmp_path):
+    store = FrameStore(SIZE, memory_mb=10 * FRAME_BYTES / 1024 ** 2)
+    paths = [str(tmp_path / f"{i}.png") for i in range(30)]
+    for i, path in enumerate(paths):
+        store.put(path, frame(i))
+    assert store.memory <= 10 * FRAME_BYTES
+    assert sum(path in store for path in paths) == 10
+    assert all(os.path.exists(path) for path in paths if path not in store)
+
+
+def test_release_drops_frame_after_last_expected_read(tmp_path):
+    store = FrameStore(SIZE)
+    path = str(tmp_path / "1.png")
+    store.put(path, frame(1))
+    store.expect([path, path])
+    store.release(path)
+    assert path in store
+    store.release(path)
+    assert path not in store
+    assert store.memory == 0
+
+
+def test_release_keeps_frames_not_expected(tmp_path):
+    store = FrameStore(SIZE)
+    path = str(tmp_path / "1.png")
+    store.put(path, frame(1))
+    store.release(path)
+    assert path in store
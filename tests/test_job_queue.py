@@ -0,0 +1,54 @@
+from job_queue import JobQueue, QUEUED, RUNNING, DONE, FAILED
+
+
+def test_claim_takes_oldest_queued_job(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    first = queue.submit("video", {"n": 1})
+    second = queue.submit("video", {"n": 2})
+    job = queue.claim("worker-1")
+    assert job["id"] == first
+    assert job["status"] == RUNNING
+    assert job["worker"] == "worker-1"
+    assert job["attempts"] == 1
+    assert job["params"] == {"n": 1}
+    assert queue.claim("worker-2")["id"] == second
+    assert queue.claim("worker-3") is None
+
+
+def test_running_job_is_not_taken_while_its_heartbeat_is_fresh(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), lease=60)
+    job_id = queue.submit("video", {})
+    queue.claim("worker-1")
+    queue.heartbeat(job_id, "tts")
+    assert queue.claim("worker-2") is None
+    assert queue.get(job_id)["stage"] == "tts"
+
+
+def test_stale_job_is_retried_then_failed(tmp_path):
+    # A negative lease makes every running job stale as soon as it is claimed
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), lease=-1, max_attempts=2)
+    job_id = queue.submit("video", {})
+    assert queue.claim("worker-1")["attempts"] == 1
+    retried = queue.claim("worker-2")
+    assert retried["id"] == job_id
+    assert retried["worker"] == "worker-2"
+    assert retried["attempts"] == 2
+    assert queue.claim("worker-3") is None
+    job = queue.get(job_id)
+    assert job["status"] == FAILED
+    assert "2 attempts" in job["error"]
+
+
+def test_finish_and_fail_record_the_outcome(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"))
+    done, failed = queue.submit("video", {}), queue.submit("video", {})
+    assert queue.get(done)["status"] == QUEUED
+    queue.claim("worker-1")
+    queue.claim("worker-1")
+    queue.finish(done, {"video": "output_video.mp4"})
+    queue.fail(failed, "RuntimeError: boom")
+    assert queue.get(done)["status"] == DONE
+    assert queue.get(done)["result"] == {"video": "output_video.mp4"}
+    assert queue.get(failed)["status"] == FAILED
+    assert queue.get(failed)["error"] == "RuntimeError: boom"
+    assert queue.claim("worker-2") is None
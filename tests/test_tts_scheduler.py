@@ -0,0 +1,86 @@
+import threading
+from concurrent.futures import Future
+import pytest
+import tts_scheduler
+from tts_scheduler import TTSScheduler
+
+
+class Speech:
+    def __init__(self, fail=0):
+        self.calls = 0
+        self.fail = fail
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, text):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        if self.calls <= self.fail:
+            raise RuntimeError("synthesis failed")
+        return f"audio of {text}"
+
+
+# Future that tells when a caller starts waiting on it
+class WatchedFuture(Future):
+    waiting = None
+
+    def result(self, timeout=None):
+        WatchedFuture.waiting.set()
+        return Future.result(self, timeout)
+
+
+@pytest.fixture
+def waiting(monkeypatch):
+    monkeypatch.setattr(tts_scheduler, "Future", WatchedFuture)
+    monkeypatch.setattr(WatchedFuture, "waiting", threading.Event())
+    return WatchedFuture.waiting
+
+
+# Call once(key, speech, text) on another thread
+def waiter(scheduler, speech, results):
+    def wait():
+        try:
+            results.append(scheduler.once("line", speech, "hello"))
+        except Exception as e:
+            results.append(e)
+
+    thread = threading.Thread(target=wait)
+    thread.start()
+    return thread
+
+
+def test_once_shares_the_running_call(waiting):
+    scheduler, speech, results = TTSScheduler("test-key"), Speech(), []
+    owner = waiter(scheduler, speech, results)
+    speech.started.wait(5)
+    other = waiter(scheduler, speech, results)
+    waiting.wait(5)
+    speech.release.set()
+    owner.join(5)
+    other.join(5)
+    assert results == ["audio of hello", "audio of hello"]
+    assert speech.calls == 1
+
+
+def test_once_runs_again_when_the_owner_fails(waiting):
+    scheduler, speech, results = TTSScheduler("test-key"), Speech(fail=1), []
+    owner = waiter(scheduler, speech, results)
+    speech.started.wait(5)
+    other = waiter(scheduler, speech, results)
+    waiting.wait(5)
+    speech.release.set()
+    owner.join(5)
+    other.join(5)
+    assert sum(isinstance(result, RuntimeError) for result in results) == 1
+    assert results.count("audio of hello") == 1
+    assert speech.calls == 2
+
+
+def test_once_forgets_the_key_after_the_call():
+    scheduler, speech = TTSScheduler("test-key"), Speech(fail=1)
+    speech.release.set()
+    with pytest.raises(RuntimeError):
+        scheduler.once("line", speech, "hello")
+    assert scheduler.once("line", speech, "hello") == "audio of hello"
+    assert speech.calls == 2
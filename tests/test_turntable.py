@@ -0,0 +1,54 @@
+import numpy as np
+import turntable
+from frame_store import FrameStore
+from turntable import Blend, RotationCache, TurntableLoader, frame_uses, turntable_shots
+
+SIZE = (64, 48)
+
+
+def frame(i):
+    return np.full((SIZE[1], SIZE[0], 3), i % 256, dtype=np.uint8)
+
+
+# Views of a vehicle held in memory only, like rendered frames that were never written to disk
+def vehicle_views(store, folder, values):
+    paths = [str(folder / f"{value}.png") for value in values]
+    for value, path in zip(values, paths):
+        store.put(path, frame(value))
+    return paths
+
+
+def test_rotation_outlives_other_vehicles_until_last_blend(tmp_path, monkeypatch):
+    monkeypatch.setattr(turntable, "_rotations", RotationCache(0))
+    store = FrameStore(SIZE, persist=False)
+    shots_a = turntable_shots(vehicle_views(store, tmp_path / "a", [10, 20, 30]), 4, fps=10)
+    shots_b = turntable_shots(vehicle_views(store, tmp_path / "b", [40, 50, 60]), 4, fps=10)
+    loader = TurntableLoader(store.get, 3, store.release)
+    for shots in (shots_a, shots_b):
+        store.expect(frame_uses(shots))
+        loader.expect(shots)
+
+    # A is past the stills of its views when B's turntable pushes it out of every cache
+    middle = max(i for i, (key, _) in enumerate(shots_a) if not isinstance(key, Blend) and i < len(shots_a) - 1)
+    frames = [loader.get(key) for key, _ in shots_a[:middle + 2] + shots_b + shots_a[middle + 2:]]
+    loader.close()
+
+    blend = shots_a[-2][0]
+    assert isinstance(blend, Blend)
+    assert frames[-2][0, 0, 0] == round(30 * (1 - blend.weight) + 10 * blend.weight)
+    assert store.memory == 0
+    assert turntable.get_rotation_cache().stats()["pinned"] == 0
+
+
+def test_unannounced_rotations_keep_only_the_latest(tmp_path, monkeypatch):
+    monkeypatch.setattr(turntable, "_rotations", RotationCache(0))
+    store = FrameStore(SIZE, persist=False)
+    shots_a = turntable_shots(vehicle_views(store, tmp_path / "a", [10, 20, 30]), 4, fps=10)
+    shots_b = turntable_shots(vehicle_views(store, tmp_path / "b", [40, 50, 60]), 4, fps=10)
+    loader = TurntableLoader(store.get)
+    for key, _ in shots_a + shots_b:
+        loader.get(key)
+    cache = turntable.get_rotation_cache()
+    assert cache.stats()["pinned"] == 1
+    loader.close()
+    assert cache.stats() == {"rotations": 0, "pinned": 0, "bytes": 0, "hits": 0, "misses": 2}
@@ -0,0 +1,241 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Stage-level tracing of a video job. Spans record wall time, CPU time (this process plus finished
+# child processes such as ffmpeg) and the peak RSS of the process. A trace is written as JSON per job,
+# and the traces on disk are summed into Prometheus text counters. Pools that outlive the job, like the
+# rembg workers, never count as finished children: their CPU time is only in the spans they report.
+#
+# Stages are top-level span names (fetch, download, rembg, render, tts, audio_decode, clip_build,
+# subtitles, encode); per-vehicle or per-segment spans use a dotted name such as "tts.segment" or
+# "rembg.vehicle".
+# One job is traced at a time per process, which is how the job workers and the batch CLI run.
+TRACE_DIR = os.getenv("TRACE_DIR", os.path.join(".cache", "traces"))
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+
+
+def cpu_time():
+    total = time.process_time()
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        total += usage.ru_utime + usage.ru_stime
+    return total
+
+
+# Peak resident set size of this process in bytes, None when it can't be measured
+def peak_rss():
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss)
+    return None
+
+
+class Tracer:
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.started = time.time()
+        self.spans = []
+        self._start = time.perf_counter()
+        self._cpu = cpu_time()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, **attrs):
+        start, cpu = time.perf_counter(), cpu_time()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start, cpu_time() - cpu, start=start - self._start, **attrs)
+
+    # Record a span timed elsewhere, such as a download measured by the downloader
+    def add(self, name, wall, cpu=None, start=None, **attrs):
+        record = {"name": name, "start": start, "wall": wall, "cpu": cpu, "peak_rss": peak_rss()}
+        if attrs:
+            record["attrs"] = attrs
+        with self._lock:
+            self.spans.append(record)
+
+    # Totals per span name: count, wall and CPU seconds, peak RSS
+    def summary(self):
+        totals = {}
+        with self._lock:
+            spans = list(self.spans)
+        for record in spans:
+            total = totals.setdefault(record["name"], {"count": 0, "wall": 0.0, "cpu": 0.0, "peak_rss": 0})
+            total["count"] += 1
+            total["wall"] += record["wall"]
+            total["cpu"] += record["cpu"] or 0.0
+            total["peak_rss"] = max(total["peak_rss"], record["peak_rss"] or 0)
+        return totals
+
+    def to_dict(self, status=None):
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            "job_id": self.job_id,
+            "status": status,
+            "started": self.started,
+            "wall": time.perf_counter() - self._start,
+            "cpu": cpu_time() - self._cpu,
+            "peak_rss": peak_rss(),
+            "summary": self.summary(),
+            "spans": spans,
+        }
+
+    def write(self, status=None, directory=TRACE_DIR):
+        if not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.job_id}.json")
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.to_dict(status), f, indent=1)
+        os.replace(temp_path, path)
+        return path
+
+
+_tracer = None
+
+
+def current_tracer():
+    return _tracer
+
+
+# Trace the job run inside the block; the trace is written even when the job fails
+@contextmanager
+def trace_job(job_id, directory=TRACE_DIR):
+    global _tracer
+    previous, _tracer = _tracer, Tracer(job_id)
+    tracer, status = _tracer, "failed"
+    try:
+        yield tracer
+        status = "ok"
+    finally:
+        _tracer = previous
+        tracer.write(status, directory)
+
+
+# Span of the current job, a no-op outside trace_job
+@contextmanager
+def span(name, **attrs):
+    tracer = _tracer
+    if tracer is None:
+        yield
+        return
+    with tracer.span(name, **attrs):
+        yield
+
+
+def add_span(name, wall, cpu=None, **attrs):
+    tracer = _tracer
+    if tracer is not None:
+        tracer.add(name, wall, cpu, **attrs)
+
+
+def load_trace(job_id, directory=TRACE_DIR):
+    try:
+        with open(os.path.join(directory, f"{job_id}.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# Counters over every trace in the directory, so the workers of all processes are included
+def prometheus_text(directory=TRACE_DIR):
+    stages, jobs = {}, {}
+    job_seconds, peak = 0.0, 0
+    if os.path.isdir(directory):
+        for file in os.listdir(directory):
+            if not file.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(directory, file)) as f:
+                    trace = json.load(f)
+            except (OSError, ValueError):
+                continue
+            jobs[trace.get("status")] = jobs.get(trace.get("status"), 0) + 1
+            job_seconds += trace["wall"]
+            peak = max(peak, trace.get("peak_rss") or 0)
+            for name, total in trace["summary"].items():
+                stage = stages.setdefault(name, {"count": 0, "wall": 0.0, "cpu": 0.0})
+                for field in stage:
+                    stage[field] += total[field]
+
+    lines = [
+        "# HELP video_jobs_total Traced video jobs by final status.",
+        "# TYPE video_jobs_total counter",
+    ]
+    lines += [f'video_jobs_total{{status="{status}"}} {count}' for status, count in sorted(jobs.items(), key=str)]
+    lines += [
+        "# HELP video_job_seconds_total Wall time of all traced jobs.",
+        "# TYPE video_job_seconds_total counter",
+        f"video_job_seconds_total {job_seconds:.6f}",
+        "# HELP video_job_peak_rss_bytes Highest peak RSS of a job process.",
+        "# TYPE video_job_peak_rss_bytes gauge",
+        f"video_job_peak_rss_bytes {peak}",
+    ]
+    for metric, field, help_text in (
+        ("video_stage_calls_total", "count", "Spans recorded per stage."),
+        ("video_stage_seconds_total", "wall", "Wall time per stage."),
+        ("video_stage_cpu_seconds_total", "cpu", "CPU time per stage."),
+    ):
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+        for name, stage in sorted(stages.items()):
+            value = stage[field] if field == "count" else f"{stage[field]:.6f}"
+            lines.append(f'{metric}{{stage="{name}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve_metrics(port=METRICS_PORT):
+    server = ThreadingHTTPServer(("", port), _MetricsHandler)
+    print(f"Serving metrics on http://localhost:{port}/metrics")
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print or serve the pipeline metrics")
+    parser.add_argument("--serve", action="store_true", help="Serve /metrics over HTTP")
+    parser.add_argument("--port", type=int, default=METRICS_PORT)
+    args = parser.parse_args()
+    if args.serve:
+        serve_metrics(args.port)
+    else:
+        print(prometheus_text(), end="")
+
+
+if __name__ == "__main__":
+    main()
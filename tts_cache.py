@@ -0,0 +1,145 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from disk_lru import DiskLRU
+
+# Persistent cache of synthesized speech keyed by normalized text, voice, model, output format and voice settings
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(".cache", "tts"))
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(1024 ** 3)))
+TTS_CACHE_MAX_AGE = float(os.getenv("TTS_CACHE_MAX_AGE", str(30 * 24 * 3600)))
+# Seconds a .pending marker (see TTSCache.reserve) holds off other processes before it counts as abandoned
+TTS_PENDING_TIMEOUT = float(os.getenv("TTS_PENDING_TIMEOUT", "120"))
+
+
+# Whitespace differences don't change the speech, so they don't change the key either
+def normalize_text(text):
+    return " ".join(text.split())
+
+
+def _settings_dict(voice_settings):
+    if voice_settings is None:
+        return None
+    if hasattr(voice_settings, "model_dump"):
+        return voice_settings.model_dump()
+    if hasattr(voice_settings, "dict"):
+        return voice_settings.dict()
+    return dict(voice_settings)
+
+
+# Duration of an audio file in seconds, decoded with moviepy when available, otherwise
+# estimated from the constant bitrate in an ElevenLabs output format such as mp3_22050_32
+def audio_duration(path, output_format=None):
+    try:
+        import moviepy.editor as mp
+    except ImportError:
+        mp = None
+    if mp is not None:
+        clip = mp.AudioFileClip(path)
+        try:
+            return clip.duration
+        finally:
+            clip.close()
+    bitrate = int(output_format.rsplit("_", 1)[-1]) * 1000 if output_format else 32000
+    return os.path.getsize(path) * 8 / bitrate
+
+
+class TTSCache(DiskLRU):
+    def __init__(self, directory=TTS_CACHE_DIR, max_bytes=TTS_CACHE_MAX_BYTES, max_age=TTS_CACHE_MAX_AGE):
+        self.max_age = max_age
+        DiskLRU.__init__(self, directory, ".mp3", max_bytes, companions=(".json",), expired=self._expired)
+
+    def key(self, text, voice_id, model_id, output_format, voice_settings):
+        payload = {
+            "text": normalize_text(text),
+            "voice_id": voice_id,
+            "model_id": model_id,
+            "output_format": output_format,
+            "voice_settings": _settings_dict(voice_settings),
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def _paths(self, key):
+        audio_path = self.path(key)
+        return audio_path, f"{audio_path[:-4]}.json"
+
+    # Entries past max_age are dropped when the cache directory is walked
+    def _expired(self, audio_path):
+        try:
+            with open(f"{audio_path[:-4]}.json") as f:
+                return time.time() - json.load(f)["created"] > self.max_age
+        except (OSError, ValueError, KeyError):
+            return False
+
+    # (mp3 path, duration) of a cached segment, or None
+    def get(self, key):
+        _, meta_path = self._paths(key)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            expired = time.time() - meta["created"] > self.max_age
+        except (OSError, ValueError, KeyError):
+            meta, expired = None, False
+        if meta is None or expired:
+            if expired:
+                self.discard(key)
+            with self._lock:
+                self.misses += 1
+            return None
+        audio_path = DiskLRU.get(self, key)
+        if audio_path is None:
+            return None
+        return audio_path, meta["duration"]
+
+    # Mark key as being synthesized with a .pending file next to the entry, so other processes (the UI's
+    # speculative requests, the job workers) wait for it instead of paying for the same speech. False when
+    # another process holds a marker younger than TTS_PENDING_TIMEOUT.
+    def reserve(self, key):
+        marker = f"{self.path(key)[:-4]}.pending"
+        os.makedirs(os.path.dirname(marker), exist_ok=True)
+        for _ in range(2):
+            try:
+                os.close(os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return True
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(marker) < TTS_PENDING_TIMEOUT:
+                        return False
+                    os.remove(marker)
+                except FileNotFoundError:
+                    pass
+        return False
+
+    def release(self, key):
+        try:
+            os.remove(f"{self.path(key)[:-4]}.pending")
+        except FileNotFoundError:
+            pass
+
+    # Block while another process holds the marker of key, at most TTS_PENDING_TIMEOUT seconds
+    def wait(self, key, poll_interval=0.2):
+        marker = f"{self.path(key)[:-4]}.pending"
+        deadline = time.time() + TTS_PENDING_TIMEOUT
+        while os.path.exists(marker) and time.time() < deadline:
+            time.sleep(poll_interval)
+
+    # Store a synthesized file, returns its cached (mp3 path, duration)
+    def put(self, key, source_path, output_format=None):
+        duration = audio_duration(source_path, output_format)
+        audio_path = DiskLRU.put(self, key, source_path)
+        with open(self._paths(key)[1], "w") as f:
+            json.dump({"created": time.time(), "duration": duration, "bytes": os.path.getsize(audio_path)}, f)
+        return audio_path, duration
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_tts_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TTSCache()
+        return _cache
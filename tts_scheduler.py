@@ -0,0 +1,142 @@
+import os
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from elevenlabs.client import ElevenLabs
+
+try:
+    import httpx
+    TRANSIENT_ERRORS = (httpx.TransportError,)
+except ImportError:
+    TRANSIENT_ERRORS = ()
+
+# Synthesis of all segments of a job over one shared ElevenLabs client, with a cap on concurrent
+# requests, a token-bucket rate limit and retries with backoff on 429/5xx
+TTS_CONCURRENCY = int(os.getenv("TTS_CONCURRENCY", "4"))
+TTS_RATE = float(os.getenv("TTS_RATE", "2"))  # requests per second, refilled continuously
+TTS_BURST = int(os.getenv("TTS_BURST", "4"))
+TTS_RETRIES = int(os.getenv("TTS_RETRIES", "5"))
+ELEVENLABS_BASE_URL = os.getenv("ELEVENLABS_BASE_URL")  # unset uses the production API
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    # Block until a token is available, then take it
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def _retry_delay(error, attempt):
+    headers = getattr(error, "headers", None) or {}
+    retry_after = headers.get("retry-after") or headers.get("Retry-After")
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return min(30, 0.5 * 2 ** attempt) + random.uniform(0, 0.5)
+
+
+def _is_retryable(error):
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(error, TRANSIENT_ERRORS)
+
+
+class TTSScheduler:
+    def __init__(self, api_key, concurrency=TTS_CONCURRENCY, rate=TTS_RATE, burst=TTS_BURST, retries=TTS_RETRIES):
+        self.client = ElevenLabs(api_key=api_key, base_url=ELEVENLABS_BASE_URL)
+        self.concurrency = max(1, concurrency)
+        self.retries = retries
+        self._bucket = TokenBucket(rate, burst)
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._background = None
+        self._background_lock = threading.Lock()
+        self._inflight = {}  # key -> Future of the call running for it
+        self._inflight_lock = threading.Lock()
+
+    # One text_to_speech.convert call, rate limited and retried; returns the complete audio bytes
+    def convert(self, **kwargs):
+        for attempt in range(self.retries + 1):
+            self._bucket.acquire()
+            try:
+                with self._slots:
+                    # The response is a stream, errors can surface while reading it
+                    return b"".join(chunk for chunk in self.client.text_to_speech.convert(**kwargs) if chunk)
+            except Exception as e:
+                if attempt == self.retries or not _is_retryable(e):
+                    raise
+                delay = _retry_delay(e, attempt)
+                print(f"TTS request failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    # Apply fn to every item concurrently (up to the concurrency cap), results are returned in order
+    def map(self, fn, items):
+        items = list(items)
+        if not items:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(items))) as executor:
+            return list(executor.map(fn, items))
+
+    # Run fn(*args) for key, or wait for the call already running for the same key (e.g. the speculative
+    # request for a line) and return its result. If that call fails, fn runs again here.
+    def once(self, key, fn, *args):
+        while True:
+            with self._inflight_lock:
+                future = self._inflight.get(key)
+                owner = future is None
+                if owner:
+                    future = self._inflight[key] = Future()
+            if not owner:
+                try:
+                    return future.result()
+                except Exception:
+                    continue
+            try:
+                result = fn(*args)
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            else:
+                future.set_result(result)
+                return result
+            finally:
+                with self._inflight_lock:
+                    del self._inflight[key]
+
+    # Run fn(*args) in the background on threads kept for the life of the process; returns a Future
+    def submit(self, fn, *args):
+        with self._background_lock:
+            if self._background is None:
+                self._background = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="tts")
+        return self._background.submit(fn, *args)
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+# Shared scheduler (and client) per API key for the whole process
+def get_tts_scheduler(api_key):
+    with _schedulers_lock:
+        scheduler = _schedulers.get(api_key)
+        if scheduler is None:
+            scheduler = _schedulers[api_key] = TTSScheduler(api_key)
+        return scheduler
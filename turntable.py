@@ -0,0 +1,224 @@
+import os
+import hashlib
+import threading
+from collections import namedtuple, OrderedDict
+import cv2
+import numpy as np
+from frame_source import FrameLRU
+
+# Smooth 360° turntable from a vehicle's views: each view is held, then cross-faded into the next with an
+# eased (smoothstep) weight, one blended frame per video frame, and the loop closes on the first view.
+# Blended frames are shots like any still, keyed by Blend(view, next view, weight, rotation), so both
+# video backends and the segment cache handle them unchanged. TurntableLoader computes all blended frames
+# of a vehicle in one batched pass and holds them until the vehicle's last blend, keyed by its views.
+# Fraction of every view's time spent cross-fading into the next one, 0 gives the old hard cuts
+TURNTABLE_BLEND = float(os.getenv("TURNTABLE_BLEND", "0.6"))
+# Decoded views kept per loader, enough for all views of a vehicle so the first one is still there when
+# the loop closes on it
+TURNTABLE_VIEW_CACHE = int(os.getenv("TURNTABLE_VIEW_CACHE", "12"))
+# Memory for the blended frames kept in the process, a rerun with the same views reuses them. The vehicles
+# being encoded are always kept, whatever their size; reuse across processes comes from the segment cache.
+TURNTABLE_CACHE_MB = int(os.getenv("TURNTABLE_CACHE_MB", "512"))
+
+# rotation: the Rotation the blend belongs to, all blends of one turntable share it
+Blend = namedtuple("Blend", ["source", "target", "weight", "rotation"])
+# stations: the views in order with the first one again at the end; weights: the blends between two views
+Rotation = namedtuple("Rotation", ["stations", "weights"])
+
+
+def smoothstep(x):
+    return x * x * (3 - 2 * x)
+
+
+# (key, duration) shots of a turntable over the views lasting duration seconds at fps: every view and the
+# first one again get an equal share of the time, the last blend fraction of each share fades to the next
+def turntable_shots(views, duration, fps=30, blend=TURNTABLE_BLEND):
+    stations = list(views) + list(views[:1])
+    step = duration / len(stations)
+    blend_frames = min(round(step * blend * fps), int(step * fps + 1e-9)) if len(views) > 1 else 0
+    if blend_frames < 1:
+        return [(view, step) for view in stations]
+
+    fade = blend_frames / fps
+    rotation = Rotation(tuple(stations),
+                        tuple(round(smoothstep((k + 1) / (blend_frames + 1)), 4) for k in range(blend_frames)))
+    shots = []
+    for source, target in zip(stations, stations[1:]):
+        shots.append((source, step - fade))
+        shots += [(Blend(source, target, weight, rotation), 1 / fps) for weight in rotation.weights]
+    shots.append((stations[-1], step))
+    return shots
+
+
+# Paths a TurntableLoader releases for the shots: every still, and the views of every turntable once.
+# frame_store.FrameStore.expect takes them, so frames are dropped once they are consumed.
+def frame_uses(shots):
+    uses, rotations = [], set()
+    for key, _ in shots:
+        if not isinstance(key, Blend):
+            uses.append(key)
+        elif key.rotation not in rotations:
+            rotations.add(key.rotation)
+            uses += list(dict.fromkeys(key.rotation.stations))
+    return uses
+
+
+# Every cross-fade frame of a rotation in one pass, written in place into out, shaped
+# (pairs * weights, height, width, 3)
+def blend_rotation(views, weights, out):
+    index = 0
+    for source, target in zip(views, views[1:]):
+        for weight in weights:
+            cv2.addWeighted(source, 1 - weight, target, weight, 0, dst=out[index])
+            index += 1
+    return out
+
+
+class RotationCache:
+    def __init__(self, memory_mb=TURNTABLE_CACHE_MB):
+        self.max_bytes = memory_mb * 1024 * 1024
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._rotations = OrderedDict()  # digest of the views and weights -> blended frames
+        self._pins = {}  # digest -> loaders holding the frames, pinned rotations are never evicted
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(views, weights):
+        digest = hashlib.blake2b(repr(weights).encode())
+        for view in views:
+            digest.update(repr(view.shape).encode())
+            digest.update(memoryview(np.ascontiguousarray(view)).cast("B"))
+        return digest.hexdigest()
+
+    # Blended frames of the views (RGB arrays of one size, first view repeated at the end), pinned until
+    # unpin(key); returns (key, frames). Every rotation counts against the memory budget, only those in use
+    # can take it over.
+    def pin(self, views, weights):
+        key = self.key(views, weights)
+        with self._lock:
+            frames = self._rotations.get(key)
+            if frames is not None:
+                self._rotations.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+                frames = np.empty(((len(views) - 1) * len(weights),) + views[0].shape, np.uint8)
+                blend_rotation(views, weights, frames)
+                frames.setflags(write=False)
+                self._rotations[key] = frames
+                self.bytes += frames.nbytes
+            self._pins[key] = self._pins.get(key, 0) + 1
+            self._evict()
+        return key, frames
+
+    def unpin(self, key):
+        with self._lock:
+            if self._pins[key] > 1:
+                self._pins[key] -= 1
+            else:
+                del self._pins[key]
+            self._evict()
+
+    # Drop the least recently used rotations nobody holds until the cache fits its budget, under the lock
+    def _evict(self):
+        for key in list(self._rotations):
+            if self.bytes <= self.max_bytes:
+                break
+            if key not in self._pins:
+                self.bytes -= self._rotations.pop(key).nbytes
+
+    def stats(self):
+        with self._lock:
+            return {"rotations": len(self._rotations), "pinned": len(self._pins), "bytes": self.bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+
+_rotations = None
+_rotations_lock = threading.Lock()
+
+
+def get_rotation_cache():
+    global _rotations
+    with _rotations_lock:
+        if _rotations is None:
+            _rotations = RotationCache()
+        return _rotations
+
+
+class TurntableLoader:
+    # load_frame(path) returns the RGB array of a view; every view is loaded once while it is in use.
+    # release(path), if given, is called after every still is handed out and after a turntable is retired
+    # for each of its views (see frame_uses). The blended frames are held as pins in the shared
+    # RotationCache: a turntable announced with expect() until its last blend is handed out, any other
+    # one until the next unannounced turntable is blended.
+    def __init__(self, load_frame, cache_size=TURNTABLE_VIEW_CACHE, release=None):
+        self.views = FrameLRU(load_frame, cache_size)
+        self.release = release
+        self._pinned = OrderedDict()  # Rotation -> (cache key, blended frames)
+        self._remaining = {}  # Rotation -> blends still to be handed out, for announced turntables
+        self._lock = threading.Lock()
+
+    # Announce shots that will be asked for, each blend once
+    def expect(self, shots):
+        with self._lock:
+            for key, _ in shots:
+                if isinstance(key, Blend):
+                    self._remaining[key.rotation] = self._remaining.get(key.rotation, 0) + 1
+
+    def _rotation(self, rotation):
+        with self._lock:
+            pinned = self._pinned.get(rotation)
+            if pinned is not None:
+                return pinned[1]
+        key, frames = get_rotation_cache().pin([self.views.get(path) for path in rotation.stations],
+                                               rotation.weights)
+        with self._lock:
+            if rotation in self._pinned:
+                stale = [(rotation, (key, frames))]
+                frames = self._pinned[rotation][1]
+            else:
+                self._pinned[rotation] = (key, frames)
+                stale = [] if rotation in self._remaining else \
+                    [(old, self._pinned.pop(old)) for old in list(self._pinned)
+                     if old != rotation and old not in self._remaining]
+        for old, (old_key, _) in stale:
+            self._retire(old, old_key, release=old != rotation)
+        return frames
+
+    # Give a turntable's frames back to the cache, then its views to the caller
+    def _retire(self, rotation, key, release=True):
+        get_rotation_cache().unpin(key)
+        if release and self.release is not None:
+            for path in dict.fromkeys(rotation.stations):
+                self.release(path)
+
+    # RGB array of a shot key: a still's path or a Blend of two views
+    def get(self, key):
+        if not isinstance(key, Blend):
+            frame = self.views.get(key)
+            if self.release is not None:
+                self.release(key)
+            return frame
+        rotation = key.rotation
+        frames = self._rotation(rotation)
+        frame = frames[rotation.stations.index(key.source) * len(rotation.weights) + rotation.weights.index(key.weight)]
+        with self._lock:
+            retired = None
+            if rotation in self._remaining:
+                self._remaining[rotation] -= 1
+                if self._remaining[rotation] <= 0:
+                    del self._remaining[rotation]
+                    retired = self._pinned.pop(rotation, None)
+        if retired is not None:
+            self._retire(rotation, retired[0])
+        return frame
+
+    # Retire every turntable the loader still holds
+    def close(self):
+        with self._lock:
+            pinned, self._pinned = list(self._pinned.items()), OrderedDict()
+            self._remaining = {}
+        for rotation, (key, _) in pinned:
+            self._retire(rotation, key)
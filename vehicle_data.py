@@ -0,0 +1,143 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+import requests
+
+# Single access layer for the crm.nxcar.in vehicle endpoints: concurrent requests for the same vehicle
+# are merged into one call and successful responses are kept in a TTL cache (memory, optionally disk)
+CRM_BASE_URL = os.getenv("CRM_BASE_URL", "https://crm.nxcar.in")
+VEHICLE_DATA_TTL = float(os.getenv("VEHICLE_DATA_TTL", "900"))
+VEHICLE_DATA_CACHE_DIR = os.getenv("VEHICLE_DATA_CACHE_DIR")  # unset keeps the cache in memory only
+VEHICLE_DATA_WORKERS = int(os.getenv("VEHICLE_DATA_WORKERS", "8"))
+VEHICLE_DATA_TIMEOUT = float(os.getenv("VEHICLE_DATA_TIMEOUT", "30"))
+
+
+class VehicleDataClient:
+    def __init__(self, base_url=CRM_BASE_URL, ttl=VEHICLE_DATA_TTL, cache_dir=VEHICLE_DATA_CACHE_DIR,
+                 timeout=VEHICLE_DATA_TIMEOUT):
+        self.base_url = base_url.rstrip("/")
+        self.ttl = ttl
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+        self._session = requests.Session()
+        self._memory = {}    # key -> (expires_at, value)
+        self._inflight = {}  # key -> Future shared by every caller waiting on the same request
+        self._lock = threading.Lock()
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+    def _post(self, endpoint, vehicle_number):
+        return self._session.post(
+            f"{self.base_url}/api/{endpoint}",
+            json={"vehiclenumber": vehicle_number},
+            headers={"Content-Type": "application/json"},
+            timeout=self.timeout,
+        )
+
+    def _disk_path(self, endpoint, vehicle_number, binary):
+        name = hashlib.sha256(f"{endpoint}:{vehicle_number}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{name}.{'bin' if binary else 'json'}")
+
+    def _read_disk(self, path, binary):
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        return data if binary else json.loads(data)
+
+    def _write_disk(self, path, value, binary):
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(value if binary else json.dumps(value).encode())
+        os.replace(temp_path, path)
+
+    def _load(self, endpoint, vehicle_number, binary):
+        disk_path = self._disk_path(endpoint, vehicle_number, binary) if self.cache_dir else None
+        if disk_path:
+            value = self._read_disk(disk_path, binary)
+            if value is not None:
+                return value
+        response = self._post(endpoint, vehicle_number)
+        if response.status_code != 200:
+            print(f"Error: {endpoint} returned {response.status_code} for {vehicle_number}")
+            return None
+        value = response.content if binary else response.json()
+        if disk_path and value:
+            self._write_disk(disk_path, value, binary)
+        return value
+
+    # Cached, coalesced call of one endpoint; failures (None) are not cached
+    def get(self, endpoint, vehicle_number, binary=False):
+        key = (endpoint, vehicle_number)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and entry[0] > time.monotonic():
+                return entry[1]
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            value = self._load(endpoint, vehicle_number, binary)
+        except Exception as e:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._inflight[key]
+            if value is not None:
+                self._memory[key] = (time.monotonic() + self.ttl, value)
+        future.set_result(value)
+        return value
+
+    def invalidate(self, vehicle_number=None):
+        with self._lock:
+            for key in list(self._memory):
+                if vehicle_number is None or key[1] == vehicle_number:
+                    del self._memory[key]
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_vehicle_data_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = VehicleDataClient()
+        return _client
+
+
+# RC and listing details of a vehicle (driveaway_data), None if the CRM returned an error
+def get_driveaway_data(vehicle_number):
+    return get_vehicle_data_client().get("driveaway_data", vehicle_number)
+
+
+# Image download links of a vehicle (fetchCarVideoImages)
+def get_video_images(vehicle_number):
+    return get_vehicle_data_client().get("fetchCarVideoImages", vehicle_number)
+
+
+# Raw bytes of the dealer banner image of a vehicle (fetchBannerImage)
+def get_banner_image(vehicle_number):
+    return get_vehicle_data_client().get("fetchBannerImage", vehicle_number, binary=True)
+
+
+# Run a fetch function for all vehicles of a job in parallel, results come back in input order
+def fetch_many(fetch, vehicle_numbers):
+    vehicle_numbers = list(vehicle_numbers)
+    if not vehicle_numbers:
+        return []
+    with ThreadPoolExecutor(max_workers=min(VEHICLE_DATA_WORKERS, len(vehicle_numbers))) as executor:
+        return list(executor.map(fetch, vehicle_numbers))
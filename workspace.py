@@ -0,0 +1,85 @@
+import os
+import time
+import uuid
+import shutil
+import weakref
+
+# Every run (job) works in its own directory under WORKSPACE_ROOT, so concurrent sessions never share
+# downloaded images, frames, audio or outputs. The directory is removed when the job is closed or
+# garbage collected; directories left behind by crashed processes are swept after WORKSPACE_MAX_AGE.
+WORKSPACE_ROOT = os.getenv("WORKSPACE_ROOT", "jobs")
+WORKSPACE_MAX_AGE = float(os.getenv("WORKSPACE_MAX_AGE", str(24 * 3600)))
+
+
+class JobWorkspace:
+    def __init__(self, root=WORKSPACE_ROOT, job_id=None, keep=False):
+        self.job_id = job_id or f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.root = os.path.abspath(os.path.join(root, self.job_id))
+        os.makedirs(self.root, exist_ok=True)
+        # Runs on close(), when the workspace is garbage collected, or at interpreter exit
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self.root, True)
+        if keep:
+            self._finalizer.detach()
+
+    # Directory inside the workspace, created on first use
+    def folder(self, *parts):
+        path = os.path.join(self.root, *parts)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    # File path inside the workspace, its parent directory is created on first use
+    def path(self, *parts):
+        path = os.path.join(self.root, *parts)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    @property
+    def closed(self):
+        return not os.path.exists(self.root)
+
+    def close(self):
+        if self._finalizer.alive:
+            self._finalizer()
+        else:
+            shutil.rmtree(self.root, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Remove job directories older than max_age, left behind by processes that did not exit cleanly
+def cleanup_stale_workspaces(root=WORKSPACE_ROOT, max_age=WORKSPACE_MAX_AGE):
+    if not os.path.isdir(root):
+        return
+    now = time.time()
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        try:
+            if os.path.isdir(path) and now - os.path.getmtime(path) > max_age:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            pass
+
+
+# Remove the directory of a job's workspace, e.g. once its output was collected
+def remove_workspace(job_id, root=WORKSPACE_ROOT):
+    shutil.rmtree(os.path.join(root, job_id), ignore_errors=True)
+
+
+def new_workspace(root=WORKSPACE_ROOT, keep=False):
+    cleanup_stale_workspaces(root)
+    return JobWorkspace(root, keep=keep)
+
+
+# Workspace of the current job of a Streamlit session; new=True closes it and starts a new job
+def session_workspace(session_state, new=False):
+    workspace = session_state.get("workspace")
+    if workspace is not None and (new or workspace.closed):
+        workspace.close()
+        workspace = None
+    if workspace is None:
+        workspace = session_state["workspace"] = new_workspace()
+    return workspace